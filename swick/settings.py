@@ -26,6 +26,9 @@ DEVELOPMENT = os.environ.get('DEVELOPMENT') == "True"
 
 TESTING = 'test' in sys.argv or 'pytest' in sys.argv[0]
 
+# Skips benchmark tests unless run with --tag benchmark
+TEST_RUNNER = 'swick.test_runner.TestRunner'
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.environ.get('SECRET_KEY')
 
@@ -53,7 +56,6 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'drfpasswordless',
-    'drf_multiple_model',
     'pusher',
 ]
 
@@ -65,7 +67,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'swickapp.middleware.TimezoneMiddleware'
+    'swickapp.middleware.TimezoneMiddleware',
+    'swickapp.middleware.PusherBatchMiddleware'
 ]
 
 ROOT_URLCONF = 'swick.urls'
@@ -143,7 +146,7 @@ REST_FRAMEWORK = {
     # Send times through rest framework in this format
     'DATETIME_FORMAT': "%Y-%m-%dT%H:%M:%SZ",
     'DEFAULT_AUTHENTICATION_CLASSES':
-        ('rest_framework.authentication.TokenAuthentication',)
+        ('swickapp.authentication.CachedTokenAuthentication',)
 }
 
 
@@ -179,6 +182,24 @@ else:
     MEDIA_URL = 'https://%s/%s/' % (AWS_S3_CUSTOM_DOMAIN, MEDIA_LOCATION)
     DEFAULT_FILE_STORAGE = 'swick.storage_backends.MediaStorage'
 
+# Cache configuration
+if DEVELOPMENT:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    # Shared by all processes, table is created by createcachetable on release
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'swick_cache',
+        }
+    }
+# Seconds a menu snapshot is cached
+MENU_SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
 # collectstatic command will collect static files from here to upload to S3
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'swickapp/static')]
 
@@ -201,3 +222,87 @@ PUSHER_APP_ID = os.environ.get('PUSHER_APP_ID')
 PUSHER_KEY = os.environ.get('PUSHER_KEY')
 PUSHER_SECRET = os.environ.get('PUSHER_SECRET')
 PUSHER_CLUSTER = os.environ.get('PUSHER_CLUSTER')
+# Overrides of the cluster's API host, e.g. for a local stand-in
+PUSHER_HOST = os.environ.get('PUSHER_HOST')
+PUSHER_PORT = int(os.environ['PUSHER_PORT']) if os.environ.get('PUSHER_PORT') else None
+PUSHER_SSL = os.environ.get('PUSHER_SSL', 'True') == 'True'
+# Events are not sent while testing
+PUSHER_ENABLED = not TESTING
+# Most events sent in one batch trigger call
+PUSHER_BATCH_SIZE = 10
+
+# Payment pipeline configuration
+# Charge cards on a payment worker instead of in the request thread
+PAYMENT_PIPELINE_ASYNC = os.environ.get('PAYMENT_PIPELINE_ASYNC') == "True"
+# Backend that payment jobs are handed to once they are committed
+PAYMENT_QUEUE_BACKEND = os.environ.get(
+    'PAYMENT_QUEUE_BACKEND', 'swickapp.payment_pipeline.DatabaseQueueBackend')
+# Attempts before a failing Stripe API call is reported to the customer
+PAYMENT_JOB_MAX_ATTEMPTS = 5
+# Seconds before a job left running by a crashed worker is claimed again
+PAYMENT_JOB_TIMEOUT = 120
+# Seconds a payment worker waits when there are no due jobs
+PAYMENT_WORKER_POLL_INTERVAL = 1
+
+# Stripe fee reconciliation
+# Days of orders checked for missing Stripe fees by reconcile_stripe_fees
+STRIPE_FEE_LOOKBACK_DAYS = 7
+
+# Seconds restaurant metadata used by payment helpers is cached per process
+RESTAURANT_CACHE_TTL = 300
+
+# Event dispatcher configuration
+# Threads delivering realtime events in the background
+EVENT_DISPATCHER_WORKERS = 4
+# Events waiting for delivery before new events are dropped
+EVENT_DISPATCHER_MAX_QUEUE = 1000
+# Attempts before an event is written to the dead letter log
+EVENT_DISPATCHER_MAX_ATTEMPTS = 3
+# Seconds before the first retry, doubled on every retry
+EVENT_DISPATCHER_RETRY_DELAY = 0.5
+
+# Backend encoding API responses, swickapp.responses.OrjsonEncoder
+# is faster but requires the orjson package
+JSON_ENCODER = os.environ.get('JSON_ENCODER', 'swickapp.responses.StdlibJsonEncoder')
+
+# Days deleted order items and requests are kept for servers syncing queues
+SYNC_TOMBSTONE_DAYS = 7
+
+# Coalescing event bus configuration
+# Seconds item and order status events are held per channel to be merged,
+# 0 sends every event right away
+EVENT_BUS_WINDOW = 0.1
+# Order items in one merged items-status-updated event
+EVENT_BUS_MAX_ITEMS = 20
+
+# Realtime backend configuration
+# swickapp.realtime.WebSocketBackend sends events through the WebSocket
+# server in swick.asgi instead of Pusher
+REALTIME_BACKEND = os.environ.get('REALTIME_BACKEND', 'swickapp.realtime.PusherBackend')
+# 'postgres' fans events out to every ASGI process with NOTIFY,
+# 'local' only to sockets of the sending process
+REALTIME_FANOUT = os.environ.get('REALTIME_FANOUT', 'postgres')
+REALTIME_NOTIFY_CHANNEL = 'swick_realtime'
+# Messages a WebSocket client may fall behind before it is disconnected
+REALTIME_SOCKET_MAX_QUEUE = 100
+# Seconds of client inactivity before it should ping
+REALTIME_ACTIVITY_TIMEOUT = 120
+
+# Per-process caches are invalidated in every process with NOTIFY on
+# CACHE_INVALIDATION_CHANNEL with 'postgres', only in the current one with 'local'
+CACHE_INVALIDATION = 'local' if TESTING else os.environ.get('CACHE_INVALIDATION', 'postgres')
+CACHE_INVALIDATION_CHANNEL = 'swick_cache_invalidation'
+
+# Seconds channels a customer may subscribe to are cached per process
+CHANNEL_AUTH_CACHE_TTL = 300
+
+# Seconds users of api tokens are cached per process, changes to a user are
+# seen by every process through swickapp.cache_invalidation
+AUTH_TOKEN_CACHE_TTL = 60
+
+# Orders per page of the restaurant's order history
+ORDER_HISTORY_PAGE_SIZE = 50
+# Orders read and rendered at a time when a whole range is streamed
+ORDER_HISTORY_CHUNK_SIZE = 500
+# Orders read at a time when orders are exported
+ORDER_EXPORT_CHUNK_SIZE = 1000
@@ -0,0 +1,15 @@
+from django.test.runner import DiscoverRunner
+
+"""
+TEST RUNNER
+Tests tagged benchmark seed large tables and report timings, so they only run
+when asked for, e.g. python manage.py test --tag benchmark
+"""
+
+
+class TestRunner(DiscoverRunner):
+    def __init__(self, tags=None, exclude_tags=None, **kwargs):
+        exclude_tags = set(exclude_tags or [])
+        if "benchmark" not in (tags or []):
+            exclude_tags.add("benchmark")
+        super().__init__(tags=tags, exclude_tags=exclude_tags, **kwargs)
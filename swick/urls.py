@@ -66,6 +66,8 @@ urlpatterns = [
          name='restaurant_orders'),
     path('restaurant/orders/view/<int:order_id>/', views.restaurant_view_order,
          name='restaurant_view_order'),
+    path('restaurant/orders/export/', views.restaurant_export_orders,
+         name='restaurant_export_orders'),
     # Finances
     path('restaurant/finances/', views.restaurant_finances,
          name='restaurant_finances'),
@@ -117,6 +119,7 @@ urlpatterns = [
 
     ##### CUSTOMER AND SERVER SHARED API URLS #####
     path('api/update_info/', apis.update_info, name='update_info'),
+    path('api/get_metrics/', apis.get_metrics, name='get_metrics'),
 
     ##### CUSTOMER API URLS #####
     path('api/customer/login/', apis_customer.login, name='customer_login'),
@@ -130,10 +133,14 @@ urlpatterns = [
          apis_customer.get_categories, name='customer_get_categories'),
     path('api/customer/get_meals/<int:restaurant_id>/<int:category_id>/',
          apis_customer.get_meals, name='customer_get_meals'),
+    path('api/customer/get_menu/<int:restaurant_id>/',
+         apis_customer.get_menu, name='customer_get_menu'),
     path('api/customer/get_meal/<int:meal_id>/',
          apis_customer.get_meal, name='customer_get_meal'),
     path('api/customer/place_order/', apis_customer.place_order,
          name='customer_place_order'),
+    path('api/customer/get_payment_status/<int:order_id>/',
+         apis_customer.get_payment_status, name='customer_get_payment_status'),
     path('api/customer/add_tip/', apis_customer.add_tip, name='customer_add_tip'),
     path('api/customer/retry_order_payment/',
          apis_customer.retry_order_payment, name='customer_retry_order_payment'),
@@ -167,9 +174,12 @@ urlpatterns = [
     path('api/server/get_order_items_to_cook/',
          apis_server.get_order_items_to_cook, name='server_get_order_items_to_cook'),
     path('api/server/get_items_to_send/',
-         apis_server.ServerGetItemsToSend.as_view(), name='server_get_order_items_to_send'),
+         apis_server.get_items_to_send, name='server_get_order_items_to_send'),
+    path('api/server/sync/', apis_server.sync, name='server_sync'),
     path('api/server/update_order_item_status/',
          apis_server.update_order_item_status, name='server_update_order_item_status'),
+    path('api/server/update_order_item_statuses/', apis_server.update_order_item_statuses,
+         name='server_update_order_item_statuses'),
     path('api/server/delete_request/', apis_server.delete_request,
          name='server_delete_request'),
     path('api/server/get_info/', apis_server.get_info, name='server_get_info'),
@@ -3,8 +3,9 @@ from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from drfpasswordless.models import CallbackToken
 
 from .models import (Category, Customer, Customization, Meal, Order, OrderItem,
-                     OrderItemCustomization, Request, RequestOption,
-                     Restaurant, Server, ServerRequest, TaxCategory, User)
+                     OrderItemCustomization, PaymentJob, Request,
+                     RequestOption, Restaurant, Server, ServerRequest,
+                     TaxCategory, User)
 
 
 @admin.register(User)
@@ -45,3 +46,4 @@ admin.site.register(OrderItemCustomization)
 admin.site.register(TaxCategory)
 admin.site.register(RequestOption)
 admin.site.register(Request)
+admin.site.register(PaymentJob)
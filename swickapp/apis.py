@@ -1,7 +1,10 @@
-from django.http import JsonResponse
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 
+from .authentication import invalidate_user_tokens
+from .metrics import get_metrics as get_process_metrics
 from .models import User
+from .responses import FastJsonResponse
 
 
 @api_view(['POST'])
@@ -25,9 +28,25 @@ def update_info(request):
         try:
             user = User.objects.get(email=email)
             if user != request.user:
-                return JsonResponse({"status": "email_already_taken"})
+                return FastJsonResponse({"status": "email_already_taken"})
         # If email is not taken
         except User.DoesNotExist:
             request.user.email = email
             request.user.save()
-    return JsonResponse({"status": "success"})
+    invalidate_user_tokens(request.user.id)
+    return FastJsonResponse({"status": "success"})
+
+
+@api_view()
+@permission_classes([IsAdminUser])
+def get_metrics(request):
+    """
+    Get metrics of the process serving the request
+    Only available to staff
+    header:
+        Authorization: Token ...
+    return:
+        metrics
+        status
+    """
+    return FastJsonResponse({"metrics": get_process_metrics(), "status": "success"})
@@ -1,27 +1,38 @@
 import json
 from decimal import ROUND_HALF_UP, Decimal, DecimalException
 
-import pusher
 import stripe
-from django.http import JsonResponse, HttpResponseForbidden
+from django.conf import settings
+from django.db import transaction
+from django.http import (HttpResponse, HttpResponseForbidden,
+                         HttpResponseNotModified)
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import api_view
-from swick.settings import (PUSHER_APP_ID, PUSHER_CLUSTER, PUSHER_KEY,
-                            PUSHER_SECRET, STRIPE_API_KEY)
-
-from .apis_helper import (attempt_stripe_payment, get_stripe_fee,
-                          retry_stripe_payment, create_stripe_customer)
-from .models import (Category, Customer, Customization, Meal, Order, OrderItem,
-                     OrderItemCustomization, Request, RequestOption,
-                     Restaurant)
+from swick.settings import STRIPE_API_KEY
+
+from .apis_helper import (activate_order, attempt_stripe_payment,
+                          finalize_order_payment, retry_stripe_payment,
+                          create_stripe_customer)
+from .authentication import invalidate_user_tokens
+from .channel_auth import CUSTOMER, get_allowed_channels
+from .finance import update_daily_summaries
+from .menu_snapshot import get_menu_snapshot, get_menu_version
+from .models import (Category, Customer, Customization, Meal, Order,
+                     PaymentJob, Request, RequestOption, Restaurant)
+from .payment_pipeline import enqueue_order_payment
+from .pricing import PricingError, create_order_items, price_order
 from .pusher_events import (send_event_item_status_updated,
-                            send_event_order_placed,
                             send_event_order_status_updated,
                             send_event_request_made, send_event_tip_added)
+from .realtime import get_realtime_backend
+from .responses import FastJsonResponse
+from .restaurant_cache import get_stripe_acct_id
 from .serializers import (CategorySerializer, CustomizationSerializer,
                           MealSerializer, OrderDetailsSerializer,
                           OrderSerializer, RequestOptionSerializer,
                           RestaurantSerializer)
+from .sync import delete_order, mark_changed
 
 stripe.api_key = STRIPE_API_KEY
 
@@ -37,14 +48,15 @@ def login(request):
         status
     """
     if request.user.is_anonymous:
-        return JsonResponse({"status": "invalid_token"})
+        return FastJsonResponse({"status": "invalid_token"})
     try:
         customer = Customer.objects.get(user=request.user)
     except Customer.DoesNotExist:
         customer = Customer.objects.create(user=request.user, stripe_cust_id=create_stripe_customer(request.user.email))
+        invalidate_user_tokens(request.user.id)
     # Check if user's name is set
     name_set = False if not request.user.name else True
-    return JsonResponse({"id": customer.id, "name_set": name_set, "status": "success"})
+    return FastJsonResponse({"id": customer.id, "name_set": name_set, "status": "success"})
 
 
 @api_view(['POST'])
@@ -56,33 +68,18 @@ def pusher_auth(request):
         channel_name
         socket_id
     return:
-        channel_name
-        socket_id
+        auth
     """
     channel = request.POST['channel_name']
+    if channel not in get_allowed_channels(CUSTOMER, request.user.id):
+        return HttpResponseForbidden()
     try:
-        if not channel.startswith("private-customer-"):
-            raise AssertionError("Unknown channel requested " + channel)
-        split = channel.split('-')
-        if len(split) != 3:
-            raise AssertionError("Unknown channel requested " + channel)
-        customer = Customer.objects.get(user=request.user)
-        channel_id = int(split[2])
-        if customer.id != channel_id:
-            raise AssertionError("Requested unauthorized channnel")
-
-        pusher_client = pusher.Pusher(app_id=PUSHER_APP_ID,
-                                      key=PUSHER_KEY,
-                                      secret=PUSHER_SECRET,
-                                      cluster=PUSHER_CLUSTER)
-
-        payload = pusher_client.authenticate(
-            channel=request.POST['channel_name'],
+        payload = get_realtime_backend().authenticate(
+            channel=channel,
             socket_id=request.POST['socket_id'])
-
-        return JsonResponse(payload)
-    except (Customer.DoesNotExist, ValueError, AssertionError, IndexError) as e:
+    except ValueError:
         return HttpResponseForbidden()
+    return FastJsonResponse(payload)
 
 
 def get_restaurants(request):
@@ -102,7 +99,7 @@ def get_restaurants(request):
         context={"request": request}
     ).data
 
-    return JsonResponse({"restaurants": restaurants, "status": "success"})
+    return FastJsonResponse({"restaurants": restaurants, "status": "success"})
 
 
 def get_restaurant(request, restaurant_id):
@@ -121,7 +118,7 @@ def get_restaurant(request, restaurant_id):
     try:
         restaurant_object = Restaurant.objects.get(id=restaurant_id)
     except Restaurant.DoesNotExist:
-        return JsonResponse({"status": "restaurant_does_not_exist"})
+        return FastJsonResponse({"status": "restaurant_does_not_exist"})
     restaurant = RestaurantSerializer(
         restaurant_object,
         context={"request": request}
@@ -131,7 +128,7 @@ def get_restaurant(request, restaurant_id):
             restaurant=restaurant_object).order_by("id"),
         many=True,
     ).data
-    return JsonResponse({
+    return FastJsonResponse({
         "restaurant": restaurant,
         "request_options": request_options,
         "status": "success"
@@ -149,12 +146,12 @@ def get_categories(request, restaurant_id):
     try:
         restaurant = Restaurant.objects.get(id=restaurant_id)
     except Restaurant.DoesNotExist:
-        return JsonResponse({"status": "restaurant_does_not_exist"})
+        return FastJsonResponse({"status": "restaurant_does_not_exist"})
     categories = CategorySerializer(
         Category.objects.filter(restaurant=restaurant).order_by("name"),
         many=True,
     ).data
-    return JsonResponse({"categories": categories, "status": "success"})
+    return FastJsonResponse({"categories": categories, "status": "success"})
 
 
 def get_meals(request, restaurant_id, category_id):
@@ -172,33 +169,82 @@ def get_meals(request, restaurant_id, category_id):
     try:
         restaurant = Restaurant.objects.get(id=restaurant_id)
     except Restaurant.DoesNotExist:
-        return JsonResponse({"status": "restaurant_does_not_exist"})
+        return FastJsonResponse({"status": "restaurant_does_not_exist"})
     if category_id != 0:
         try:
             category = Category.objects.get(
                 restaurant=restaurant, id=category_id)
         except Category.DoesNotExist:
-            return JsonResponse({"status": "category_does_not_exist"})
+            return FastJsonResponse({"status": "category_does_not_exist"})
     # Get all meals if category_id is 0
     if category_id == 0:
-        meals = MealSerializer(
-            Meal.objects.filter(
-                category__restaurant=restaurant,
-                enabled=True
-            ).order_by("name"),
-            many=True,
-            context={"request": request}
-        ).data
+        meals = Meal.objects.filter(
+            category__restaurant=restaurant,
+            enabled=True
+        )
     else:
-        meals = MealSerializer(
-            Meal.objects.filter(
-                category=category,
-                enabled=True
-            ).order_by("name"),
-            many=True,
-            context={"request": request}
-        ).data
-    return JsonResponse({"meals": meals, "status": "success"})
+        meals = Meal.objects.filter(
+            category=category,
+            enabled=True
+        )
+    meals = MealSerializer(
+        meals.select_related("tax_category").order_by("name"),
+        many=True,
+        context={"request": request}
+    ).data
+    return FastJsonResponse({"meals": meals, "status": "success"})
+
+
+def get_menu(request, restaurant_id):
+    """
+    Get full enabled menu of restaurant in one call
+    Responds 304 if If-None-Match header has ETag of current menu version
+    return:
+        restaurant
+            id
+            name
+            address
+            image
+        [request_options]
+            id
+            name
+        [categories]
+            id
+            name
+            [meals]
+                id
+                name
+                description
+                price
+                tax
+                image
+                [customizations]
+                    id
+                    name
+                    options
+                    price_additions
+                    min
+                    max
+        version
+        status
+    """
+    version = get_menu_version(restaurant_id)
+    if version is None:
+        return FastJsonResponse({"status": "restaurant_does_not_exist"})
+    etag = '"{id}-{version}"'.format(id=restaurant_id, version=version)
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    try:
+        snapshot = get_menu_snapshot(restaurant_id, version, request)
+    except Restaurant.DoesNotExist:
+        return FastJsonResponse({"status": "restaurant_does_not_exist"})
+    response = HttpResponse(snapshot, content_type="application/json")
+    response["ETag"] = etag
+    return response
 
 
 def get_meal(request, meal_id):
@@ -216,17 +262,17 @@ def get_meal(request, meal_id):
     try:
         meal = Meal.objects.get(id=meal_id)
     except Meal.DoesNotExist:
-        return JsonResponse({"status": "meal_does_not_exist"})
+        return FastJsonResponse({"status": "meal_does_not_exist"})
     # Check if meal is disabled
     if not meal.enabled:
-        return JsonResponse({"status": "meal_disabled"})
+        return FastJsonResponse({"status": "meal_disabled"})
 
     customizations = CustomizationSerializer(
         Customization.objects.filter(meal_id=meal_id).order_by("name"),
         many=True,
         context={"request": request}
     ).data
-    return JsonResponse({"customizations": customizations, "status": "success"})
+    return FastJsonResponse({"customizations": customizations, "status": "success"})
 
 
 @api_view(['POST'])
@@ -246,7 +292,8 @@ def place_order(request):
         tip
         payment_method_id
     return:
-        intent_status
+        intent_status (processing if payment pipeline is asynchronous)
+        order_id (if payment pipeline is asynchronous)
         card_error (optional)
         payment_intent_id (optional)
         client_secret (optional)
@@ -255,93 +302,70 @@ def place_order(request):
     """
     order_items = json.loads(request.POST["order_items"])
     restaurant_id = request.POST["restaurant_id"]
-    # Check if any meals are disabled
-    for item in order_items:
-        meal = Meal.objects.get(id=item["meal_id"])
-        if not meal.enabled:
-            return JsonResponse({"meal_name": meal.name, "status": "meal_disabled"})
-
-    # Create order in database
-    order = Order.objects.create(
-        customer=request.user.customer,
-        restaurant_id=restaurant_id,
-        table=request.POST["table"]
-    )
+    # Validate and price whole cart before writing anything
+    try:
+        priced_order = price_order(restaurant_id, order_items)
+    except PricingError as e:
+        return FastJsonResponse(e.content)
 
-    # Variable for calculating order total
-    order_total = 0
-    order_subtotal = 0
-    order_tax = 0
-
-    # Loop through order items
-    for item in order_items:
-        # Create order item in database
-        meal = Meal.objects.get(id=item["meal_id"])
-        order_item = OrderItem.objects.create(
-            order=order,
-            meal_name=meal.name,
-            meal_price=meal.price,
-            quantity=item["quantity"],
-        )
-        # Variable for calculating price of one meal in order item
-        meal_total = order_item.meal_price
-        # Loop through customizations of order items
-        for cust in item["customizations"]:
-            cust_id = cust["customization_id"]
-            cust_object = Customization.objects.get(id=cust_id)
-            # Build options and price_additions arrays with option indices
-            options = []
-            price_additions = []
-            for opt_idx in cust["options"]:
-                options.append(cust_object.options[opt_idx])
-                price_additions.append(cust_object.price_additions[opt_idx])
-                meal_total += cust_object.price_additions[opt_idx]
-
-            # Create order item customization in database
-            order_item_customization = OrderItemCustomization.objects.create(
-                order_item=order_item,
-                customization_name=Customization.objects.get(id=cust_id).name,
-                options=options,
-                price_additions=price_additions
-            )
-        # Calculate order item total and update field
-        order_item.total = meal_total * order_item.quantity
-        order_item.save()
-
-        meal_tax = meal.tax_category.tax
-        order_subtotal += order_item.total
-        order_tax += (meal_tax / 100) * order_item.total
-        order_total += (order_item.total * meal_tax / 100)
-    # Update order total field
-    order.subtotal = order_subtotal
-    order.tax = Decimal(order_tax.quantize(
-        Decimal("0.01"), rounding=ROUND_HALF_UP))
-    order.tip = Decimal(Decimal(request.POST["tip"]).quantize(Decimal(
+    tip = Decimal(Decimal(request.POST["tip"]).quantize(Decimal(
         "0.01"), rounding=ROUND_HALF_UP)) if request.POST["tip"] != "nil" else None
-    order.total = order.subtotal + order.tax + (order.tip or 0)
-
-    response = attempt_stripe_payment(restaurant_id,
-                                      request.user.customer.stripe_cust_id,
-                                      request.user.email,
-                                      request.POST["payment_method_id"],
-                                      int(order.total * 100),
-                                      {'order_id': order.id, 'customer_id': request.user.customer.id})
-
-    content = json.loads(response.content)
-    if content["status"] == "success":
-        intent_status = content["intent_status"]
-        if intent_status == "card_error" or intent_status == "requires_payment_method":
-            order.delete()
-        elif intent_status == "requires_action" or intent_status == "requires_source_action":
-            order.stripe_payment_id = content["payment_intent"]
-            order.save()
-        elif intent_status == "succeeded":
-            order.stripe_payment_id = content["payment_intent"]
-            order.stripe_fee = get_stripe_fee(content["payment_intent"], restaurant_id)
-            order.status = Order.ACTIVE
-            order.save()
-            send_event_order_placed(order)
-    return response
+    # Create order, order items and customizations in database
+    with transaction.atomic():
+        order = Order.objects.create(
+            customer=request.user.customer,
+            restaurant_id=restaurant_id,
+            table=request.POST["table"],
+            subtotal=priced_order.subtotal,
+            tax=priced_order.rounded_tax,
+            tip=tip,
+            total=priced_order.subtotal + priced_order.rounded_tax + (tip or 0)
+        )
+        create_order_items(order, priced_order)
+        # Charge card on a payment worker and let client find out the result
+        # through pusher events or get_payment_status
+        # Job is created with the order so no order is left without one
+        if settings.PAYMENT_PIPELINE_ASYNC:
+            enqueue_order_payment(order, request.POST["payment_method_id"])
+
+    if settings.PAYMENT_PIPELINE_ASYNC:
+        return FastJsonResponse({"order_id": order.id, "intent_status": "processing", "status": "success"})
+
+    result = attempt_stripe_payment(restaurant_id,
+                                    request.user.customer.stripe_cust_id,
+                                    request.user.email,
+                                    request.POST["payment_method_id"],
+                                    int(order.total * 100),
+                                    {'order_id': order.id, 'customer_id': request.user.customer.id})
+    finalize_order_payment(order, result)
+    return FastJsonResponse(result.as_dict())
+
+
+@api_view()
+def get_payment_status(request, order_id):
+    """
+    Get result of payment for order placed through asynchronous payment pipeline
+    header:
+        Authorization: Token ...
+    return:
+        payment_status (PENDING, RUNNING or COMPLETE)
+        status (payment_failed if card could not be charged and order was deleted)
+        once payment_status is COMPLETE, same fields as place_order response:
+            intent_status
+            error (optional)
+            payment_intent (optional)
+            client_secret (optional)
+            connected_acct_id (optional)
+    """
+    try:
+        job = PaymentJob.objects.get(order_id=order_id, customer=request.user.customer)
+    except PaymentJob.DoesNotExist:
+        return FastJsonResponse({"status": "order_does_not_exist"})
+    if job.status != PaymentJob.COMPLETE:
+        return FastJsonResponse({"payment_status": job.status, "status": "success"})
+    content = dict(job.result)
+    content["payment_status"] = job.status
+    return FastJsonResponse(content)
 
 
 @api_view(['POST'])
@@ -361,51 +385,52 @@ def add_tip(request):
     """
     order_object = Order.objects.get(id=request.POST["order_id"])
     if request.user.customer != order_object.customer:
-        return JsonResponse({"status": "invalid_request"})
+        return FastJsonResponse({"status": "invalid_request"})
 
     try:
         tip = Decimal(Decimal(request.POST["tip"]).quantize(
             Decimal("0.01"), rounding=ROUND_HALF_UP))
     except (ValueError, DecimalException):
-        return JsonResponse({"status": "invalid_request"})
+        return FastJsonResponse({"status": "invalid_request"})
 
     try:
         payment_intent = stripe.PaymentIntent.retrieve(order_object.stripe_payment_id,
                                                        expand=['payment_method'],
-                                                       stripe_account=order_object.restaurant.stripe_acct_id)
+                                                       stripe_account=get_stripe_acct_id(order_object.restaurant_id))
         payment_method = stripe.PaymentMethod.retrieve(payment_intent.metadata["payment_method_id"])
     except stripe.error.StripeError as e:
-        return JsonResponse({"status": "stripe_api_error"})
+        return FastJsonResponse({"status": "stripe_api_error"})
 
     # Check if user has deleted card
     if payment_method is not None and request.user.customer.stripe_cust_id != payment_method.customer:
-        return JsonResponse({"intent_status": "card_error",
+        return FastJsonResponse({"intent_status": "card_error",
                              "error": "Card used for this order no longer exists",
                              "status": "success"})
 
-    response = attempt_stripe_payment(order_object.restaurant.id,
-                                      request.user.customer.stripe_cust_id,
-                                      request.user.email,
-                                      payment_method.id,
-                                      int(tip * 100),
-                                      {'order_id': order_object.id, 'customer_id': request.user.customer.id})
+    result = attempt_stripe_payment(order_object.restaurant_id,
+                                    request.user.customer.stripe_cust_id,
+                                    request.user.email,
+                                    payment_method.id,
+                                    int(tip * 100),
+                                    {'order_id': order_object.id, 'customer_id': request.user.customer.id})
 
-    content = json.loads(response.content)
-    if content["status"] == "success":
-        intent_status = content["intent_status"]
+    if result.status == "success":
+        intent_status = result.intent_status
         if intent_status == "requires_action" or intent_status == "requires_source_action":
-            order_object.tip_stripe_payment_id = content["payment_intent"]
+            order_object.tip_stripe_payment_id = result.payment_intent
             order_object.save()
         elif intent_status == "succeeded":
             order_object.tip = Decimal(request.POST["tip"])
-            order_object.tip_stripe_payment_id = content["payment_intent"]
-            order_object.stripe_fee += get_stripe_fee(
-                content["payment_intent"], order_object.restaurant.id)
+            order_object.tip_stripe_payment_id = result.payment_intent
+            # Fee is reconciled again to include tip charge
+            order_object.stripe_fee = None
+            order_object.tip_time = timezone.now()
             order_object.total += order_object.tip
             order_object.save()
+            update_daily_summaries(order_object.restaurant_id, [order_object.order_time])
             send_event_tip_added(order_object)
 
-    return response
+    return FastJsonResponse(result.as_dict())
 
 
 @api_view(['POST'])
@@ -424,21 +449,16 @@ def retry_order_payment(request):
             status
     """
     restaurant_id = request.POST["restaurant_id"]
-    response = retry_stripe_payment(
+    result = retry_stripe_payment(
         request.user.customer, request.POST["payment_intent_id"], restaurant_id)
-    content = json.loads(response.content)
-    if content["status"] == "success":
-        if content["intent_status"] == "card_error" or content["intent_status"] == 'requires_payment_method' or content["intent_status"] == 'requires_source':
-            order = Order.objects.get(id=content["order_id"])
-            order.delete()
-        elif content["intent_status"] == "succeeded":
-            order = Order.objects.get(id=content["order_id"])
-            order.status = Order.ACTIVE
-            order.stripe_fee = get_stripe_fee(order.stripe_payment_id, restaurant_id)
-            order.save()
-            send_event_order_placed(order)
+    if result.status == "success":
+        if result.intent_status == "card_error" or result.intent_status == 'requires_payment_method' or result.intent_status == 'requires_source':
+            order = Order.objects.get(id=result.order_id)
+            delete_order(order)
+        elif result.intent_status == "succeeded":
+            activate_order(Order.objects.get(id=result.order_id))
 
-    return response
+    return FastJsonResponse(result.as_dict())
 
 
 @api_view(['POST'])
@@ -456,31 +476,30 @@ def retry_tip_payment(request):
             status
     """
     restaurant_id = request.POST["restaurant_id"]
-    response = retry_stripe_payment(
+    result = retry_stripe_payment(
         request.user.customer, request.POST["payment_intent_id"], restaurant_id
     )
-    content = json.loads(response.content)
-    if content["status"] == "success":
-        if content["intent_status"] == "succeeded":
+    if result.status == "success":
+        if result.intent_status == "succeeded":
             try:
                 payment_intent = stripe.PaymentIntent.retrieve(
                     request.POST["payment_intent_id"],
-                    stripe_account=Restaurant.objects.get(id=restaurant_id).stripe_acct_id
+                    stripe_account=get_stripe_acct_id(restaurant_id)
                 )
-                order = Order.objects.get(id=content["order_id"])
+                order = Order.objects.get(id=result.order_id)
                 order.tip = Decimal(Decimal(payment_intent.amount / 100).quantize(
                     Decimal("0.01"), rounding=ROUND_HALF_UP)
                 )
                 order.total += order.tip
-                order.stripe_fee += get_stripe_fee(
-                    request.POST["payment_intent_id"],
-                    restaurant_id
-                )
+                # Fee is reconciled again to include tip charge
+                order.stripe_fee = None
+                order.tip_time = timezone.now()
                 order.save()
+                update_daily_summaries(order.restaurant_id, [order.order_time])
                 send_event_tip_added(order)
             except stripe.error.StripeError:
-                return JsonResponse({"status": "stripe_api_error"})
-    return response
+                return FastJsonResponse({"status": "stripe_api_error"})
+    return FastJsonResponse(result.as_dict())
 
 
 @api_view()
@@ -501,11 +520,11 @@ def get_orders(request):
     orders = OrderSerializer(
         Order.objects
         .filter(customer=request.user.customer).exclude(status=Order.PROCESSING)
-        .order_by("-id"),
+        .order_by("-id")[:10],
         many=True
-    ).data[:10]
+    ).data
 
-    return JsonResponse({"orders": orders, "status": "success"})
+    return FastJsonResponse({"orders": orders, "status": "success"})
 
 
 @api_view()
@@ -536,12 +555,13 @@ def get_order_details(request, order_id):
         status
     """
     try:
-        order = Order.objects.get(id=order_id, customer=request.user.customer)
+        order = OrderDetailsSerializer.setup_eager_loading(Order.objects).get(
+            id=order_id, customer=request.user.customer)
     except Order.DoesNotExist:
-        return JsonResponse({"status": "order_does_not_exist"})
-    if order.customer == request.user.customer:
+        return FastJsonResponse({"status": "order_does_not_exist"})
+    if order.customer_id == request.user.customer.id:
         order_details = OrderDetailsSerializer(order).data
-        return JsonResponse({"order_details": order_details, "status": "success"})
+        return FastJsonResponse({"order_details": order_details, "status": "success"})
 
 
 @api_view(['POST'])
@@ -559,7 +579,7 @@ def make_request(request):
         request_option = RequestOption.objects.get(
             id=request.POST["request_option_id"])
     except:
-        return JsonResponse({"status": "request_option_does_not_exist"})
+        return FastJsonResponse({"status": "request_option_does_not_exist"})
 
     # Check if customer already made this request
     try:
@@ -567,17 +587,21 @@ def make_request(request):
             customer=request.user.customer,
             request_option=request_option
         )
-        return JsonResponse({"status": "request_in_progress"})
+        return FastJsonResponse({"status": "request_in_progress"})
     except Request.DoesNotExist:
         pass
 
-    request_obj = Request.objects.create(
+    request_obj = Request(
         customer=request.user.customer,
+        restaurant_id=request_option.restaurant_id,
         request_option=request_option,
         table=request.POST["table"]
     )
+    with transaction.atomic():
+        mark_changed(request_option.restaurant_id, [request_obj])
+        request_obj.save()
     send_event_request_made(request_obj)
-    return JsonResponse({"status": "success"})
+    return FastJsonResponse({"status": "success"})
 
 
 @api_view()
@@ -592,7 +616,7 @@ def get_info(request):
     """
     name = request.user.name
     email = request.user.email
-    return JsonResponse({"name": name, "email": email, "status": "success"})
+    return FastJsonResponse({"name": name, "email": email, "status": "success"})
 
 
 @api_view(['POST'])
@@ -609,9 +633,9 @@ def setup_card(request):
     try:
         setup_intent = stripe.SetupIntent.create(customer=stripe_cust_id)
     except stripe.error.StripeError as e:
-        return JsonResponse({"status": "stripe_api_error"})
+        return FastJsonResponse({"status": "stripe_api_error"})
 
-    return JsonResponse({"client_secret": setup_intent.client_secret, "status": "success"})
+    return FastJsonResponse({"client_secret": setup_intent.client_secret, "status": "success"})
 
 
 @api_view(['POST'])
@@ -629,11 +653,11 @@ def remove_card(request):
         if payment_method.customer == request.user.customer.stripe_cust_id:
             stripe.PaymentMethod.detach(request.POST["payment_method_id"])
         else:
-            return JsonResponse({"status": "invalid_stripe_id"})
+            return FastJsonResponse({"status": "invalid_stripe_id"})
     except stripe.error.StripeError as e:
-        return JsonResponse({"status": "stripe_api_error"})
+        return FastJsonResponse({"status": "stripe_api_error"})
 
-    return JsonResponse({"status": "success"})
+    return FastJsonResponse({"status": "success"})
 
 
 @api_view()
@@ -656,7 +680,7 @@ def get_cards(request):
             customer=stripe_cust_id,
             type="card").data
     except stripe.error.StripeError:
-        return JsonResponse({"status": "stripe_api_error"})
+        return FastJsonResponse({"status": "stripe_api_error"})
 
     cards = []
     for payment_method in payment_methods:
@@ -669,4 +693,4 @@ def get_cards(request):
         }
         cards.append(card)
 
-    return JsonResponse({"cards": cards, "status": "success"})
+    return FastJsonResponse({"cards": cards, "status": "success"})
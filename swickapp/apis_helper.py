@@ -1,14 +1,43 @@
-from decimal import ROUND_HALF_UP, Decimal
 
 import stripe
-from django.http import JsonResponse
+from django.db import transaction
 from swick.settings import STRIPE_API_KEY
 
-from .models import Restaurant
+from .finance import update_daily_summaries
+from .models import Order
+from .pusher_events import send_event_order_placed
+from .restaurant_cache import get_stripe_acct_id
+from .sync import delete_order, mark_order_items_changed
 
 stripe.api_key = STRIPE_API_KEY
 
 
+class PaymentResult:
+    """
+    Outcome of a Stripe payment helper
+    Views return it to the client with as_dict, so it is encoded only once
+    """
+
+    def __init__(self, status, **fields):
+        self.status = status
+        self.fields = fields
+
+    @property
+    def intent_status(self):
+        return self.fields.get("intent_status")
+
+    @property
+    def payment_intent(self):
+        return self.fields.get("payment_intent")
+
+    @property
+    def order_id(self):
+        return self.fields.get("order_id")
+
+    def as_dict(self):
+        return dict(self.fields, status=self.status)
+
+
 def create_stripe_customer(email):
     """
     Create customer in Stripe and return id
@@ -16,24 +45,27 @@ def create_stripe_customer(email):
     return stripe.Customer.create(email=email).id
 
 
-def attempt_stripe_payment(restaurant_id, cust_stripe_id, cust_email, payment_method_id, amount, payment_intent_metadata):
+def attempt_stripe_payment(restaurant_id, cust_stripe_id, cust_email, payment_method_id, amount, payment_intent_metadata,
+                           idempotency_key=None):
     """
     STRIPE PAYMENT PROCESSING
     Note: Return value 'intent_status: String' can be refactored to boolean values
     at the cost of readability
     Note: Seems like stripe API allows payment_method to be either id or object
+    Note: idempotency_key makes retrying an attempt safe if Stripe already
+    processed a request whose response was lost
     """
     if amount < 50:
-        return JsonResponse({"status": "invalid_charge_amount"})
+        return PaymentResult("invalid_charge_amount")
 
     try:
         # Direct payments to stripe connected account
-        stripe_acct_id = Restaurant.objects.get(
-            id=restaurant_id).stripe_acct_id
+        stripe_acct_id = get_stripe_acct_id(restaurant_id)
         payment_method_clone = stripe.PaymentMethod.create(
             customer=cust_stripe_id,
             payment_method=payment_method_id,
-            stripe_account=stripe_acct_id
+            stripe_account=stripe_acct_id,
+            idempotency_key=idempotency_key and idempotency_key + "-payment-method"
         )
         payment_intent_metadata["payment_method_id"] = payment_method_id
         payment_intent = stripe.PaymentIntent.create(amount=amount,
@@ -44,44 +76,74 @@ def attempt_stripe_payment(restaurant_id, cust_stripe_id, cust_email, payment_me
                                                      confirmation_method='manual',
                                                      confirm=True,
                                                      stripe_account=stripe_acct_id,
-                                                     metadata=payment_intent_metadata)
+                                                     metadata=payment_intent_metadata,
+                                                     idempotency_key=idempotency_key and idempotency_key + "-payment-intent")
     except stripe.error.CardError as e:
         error = e.user_message
-        return JsonResponse({"intent_status": "card_error", "error": error, "status": "success"})
+        return PaymentResult("success", intent_status="card_error", error=error)
     except stripe.error.StripeError as e:
-        return JsonResponse({"status": "stripe_api_error"})
+        return PaymentResult("stripe_api_error")
 
     intent_status = payment_intent.status
     # Card requires further action
     if intent_status == 'requires_action' or intent_status == 'requires_source_action':
         # Card requires more action
-        return JsonResponse({"intent_status": intent_status,
-                             "payment_intent": payment_intent.id,
-                             "client_secret": payment_intent.client_secret,
-                             "connected_acct_id": stripe_acct_id,
-                             "status": "success"})
+        return PaymentResult("success",
+                             intent_status=intent_status,
+                             payment_intent=payment_intent.id,
+                             client_secret=payment_intent.client_secret,
+                             connected_acct_id=stripe_acct_id)
 
     # Card is invalid (this 'elif' branch should never occur due to previous card setup validation)
     elif intent_status == 'requires_payment_method':
         error = payment_intent.last_payment_error.message if payment_intent.get(
             'last_payment_error') else None
-        return JsonResponse({"intent_status": intent_status,
-                             "error": error,
-                             "payment_intent": payment_intent.id,
-                             "status": "success"})
+        return PaymentResult("success",
+                             intent_status=intent_status,
+                             error=error,
+                             payment_intent=payment_intent.id)
 
     # Payment is successful
     elif intent_status == 'succeeded':
-        return JsonResponse({"intent_status": intent_status,
-                             "payment_intent": payment_intent.id,
-                             "status": "success"})
+        return PaymentResult("success",
+                             intent_status=intent_status,
+                             payment_intent=payment_intent.id)
 
     # should never reach this return
-    return JsonResponse({"status": "unhandled_status"})
+    return PaymentResult("unhandled_status")
+
+
+def finalize_order_payment(order, result):
+    """
+    Update order with PaymentResult of attempt_stripe_payment
+    """
+    if result.status == "success":
+        intent_status = result.intent_status
+        if intent_status == "card_error" or intent_status == "requires_payment_method":
+            delete_order(order)
+        elif intent_status == "requires_action" or intent_status == "requires_source_action":
+            order.stripe_payment_id = result.payment_intent
+            order.save()
+        elif intent_status == "succeeded":
+            # Stripe fee is filled in later by reconcile_stripe_fees
+            order.stripe_payment_id = result.payment_intent
+            activate_order(order)
+
+
+def activate_order(order):
+    """
+    Mark paid order active and send it to the restaurant
+    """
+    with transaction.atomic():
+        order.status = Order.ACTIVE
+        order.save()
+        mark_order_items_changed(order)
+    update_daily_summaries(order.restaurant_id, [order.order_time])
+    send_event_order_placed(order)
 
 
 def retry_stripe_payment(customer, payment_intent_id, restaurant_id):
-    stripe_acct_id = Restaurant.objects.get(id=restaurant_id).stripe_acct_id
+    stripe_acct_id = get_stripe_acct_id(restaurant_id)
     try:
         payment_intent = stripe.PaymentIntent.retrieve(
             payment_intent_id,
@@ -93,46 +155,20 @@ def retry_stripe_payment(customer, payment_intent_id, restaurant_id):
                 stripe_account=stripe_acct_id
             )
         else:
-            return JsonResponse({"status": "invalid_stripe_id"})
+            return PaymentResult("invalid_stripe_id")
     except stripe.error.CardError as e:
-        return JsonResponse({"intent_status": "card_error", "order_id": payment_intent.metadata["order_id"], "error": e.user_message, "status": "success"})
+        return PaymentResult("success", intent_status="card_error", order_id=payment_intent.metadata["order_id"], error=e.user_message)
     except stripe.error.StripeError:
-        return JsonResponse({"status": "stripe_api_error"})
+        return PaymentResult("stripe_api_error")
     intent_status = payment_intent.status
     # Card is invalid (this 'elif' branch should never occur due to previous card setup validation)
     if intent_status == 'requires_payment_method' or intent_status == 'requires_source':
         error = payment_intent.last_payment_error.message if payment_intent.get(
             'last_payment_error') else None
-        return JsonResponse({"intent_status": intent_status, "order_id": payment_intent.metadata["order_id"], "error": error, "status": "success"})
+        return PaymentResult("success", intent_status=intent_status, order_id=payment_intent.metadata["order_id"], error=error)
     # Payment is successful
     elif intent_status == 'succeeded':
-        return JsonResponse({"intent_status": "succeeded", "order_id": payment_intent.metadata["order_id"], "status": "success"})
+        return PaymentResult("success", intent_status="succeeded", order_id=payment_intent.metadata["order_id"])
 
     # should never reach this return
-    return JsonResponse({"status": "unhandled_status"})
-
-
-def get_stripe_fee(payment_intent_id, restaurant_id):
-    try:
-        stripe_acct_id = Restaurant.objects.get(id=restaurant_id).stripe_acct_id
-        # Try determing stripe fee for order
-        charge_data = stripe.PaymentIntent.retrieve(
-            payment_intent_id,
-            stripe_account=stripe_acct_id).charges.data
-        if not charge_data:
-            # If should never reach since all successful payments must have a charge attached
-            raise AssertionError(
-                "Unable to find charge attached to payment_intent")
-        expanded_charge = stripe.Charge.retrieve(
-            charge_data[0].id, expand=['balance_transaction'], stripe_account=stripe_acct_id)
-        for fee in expanded_charge.balance_transaction.fee_details:
-            if fee.type == 'stripe_fee':
-                return Decimal((Decimal(fee.amount) / 100).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
-
-    except stripe.error.StripeError as e:
-        # Even if there is an error, the payment still has gone through and order should be completed
-        pass
-    except AssertionError as e:
-        # Should never occur yet still should check and pass
-        # TODO: Perhaps create a log for fatal-esque errors
-        pass
+    return PaymentResult("unhandled_status")
@@ -1,19 +1,25 @@
-from django.http import JsonResponse, HttpResponseForbidden
-from drf_multiple_model.mixins import FlatMultipleModelMixin
+import json
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.http import HttpResponseForbidden
 from rest_framework.decorators import api_view
-from rest_framework.generics import GenericAPIView
 
+from .authentication import invalidate_user_tokens
+from .channel_auth import SERVER, get_allowed_channels
 from .models import (Order, OrderItem, Request, Restaurant, Server,
                      ServerRequest)
 from .serializers import (OrderDetailsSerializer, OrderItemToCookSerializer,
-                          OrderItemToSendSerializer, OrderSerializer,
-                          RequestSerializer)
-
-from swick.settings import PUSHER_APP_ID, PUSHER_KEY, PUSHER_SECRET, PUSHER_CLUSTER
+                          OrderSerializer)
+from .realtime import get_realtime_backend
+from .responses import FastJsonResponse
+from .send_queue import get_send_queue
+from .sync import (delete_requests, get_sync_changes, mark_changed,
+                   next_change_seq)
 
 from .pusher_events import send_event_order_placed, send_event_tip_added, \
-    send_event_item_status_updated, send_event_order_status_updated, send_event_request_deleted
-import pusher
+    send_event_item_status_updated, send_event_items_status_updated, send_event_order_status_updated, \
+    send_event_request_deleted
 
 
 @api_view(['POST'])
@@ -28,7 +34,7 @@ def login(request):
         status
     """
     if request.user.is_anonymous:
-        return JsonResponse({"status": "invalid_token"})
+        return FastJsonResponse({"status": "invalid_token"})
     # Create server account if not created
     try:
         server = Server.objects.get(user=request.user)
@@ -46,11 +52,12 @@ def login(request):
             server_request.delete()
         except ServerRequest.DoesNotExist:
             pass
+        invalidate_user_tokens(request.user.id)
 
     restaurant_id = None if server.restaurant is None else server.restaurant.id
     # Check if user's name is set
     name_set = False if not request.user.name else True
-    return JsonResponse({
+    return FastJsonResponse({
         "id": server.id,
         "restaurant_id": restaurant_id,
         "name_set": name_set,
@@ -67,37 +74,19 @@ def pusher_auth(request):
         channel_name
         socket_id
     return:
-        channel_name
-        socket_id
+        auth
     """
     channel = request.POST['channel_name']
+    if channel not in get_allowed_channels(SERVER, request.user.id):
+        return HttpResponseForbidden()
     try:
-        server = Server.objects.get(user=request.user)
-        channel_id = int(channel.split('-')[2])
-        if channel.startswith("private-server"):
-            if server.id != channel_id:
-                raise AssertionError("Requested unauthorized channel")
-        elif channel.startswith("private-restaurant"):
-            if server.restaurant is not None and server.restaurant.id != channel_id:
-                raise AssertionError(
-                    "Server does not have access to restaurant")
-        else:
-            raise AssertionError("Unknown channel requested: " + channel)
-
-        pusher_client = pusher.Pusher(app_id=PUSHER_APP_ID,
-                                      key=PUSHER_KEY,
-                                      secret=PUSHER_SECRET,
-                                      cluster=PUSHER_CLUSTER)
-
-        # We must generate the token with pusher's service
-        payload = pusher_client.authenticate(
-            channel=request.POST['channel_name'],
+        # Signed by the realtime backend the client connects to
+        payload = get_realtime_backend().authenticate(
+            channel=channel,
             socket_id=request.POST['socket_id'])
-
-        return JsonResponse(payload)
-
-    except (Server.DoesNotExist, ValueError, AssertionError, IndexError) as e:
+    except ValueError:
         return HttpResponseForbidden()
+    return FastJsonResponse(payload)
 
 
 @api_view()
@@ -116,13 +105,13 @@ def get_orders(request):
             status
         status
     """
-    restaurant = request.user.server.restaurant
+    restaurant_id = request.user.server.restaurant_id
     orders = OrderSerializer(
-        Order.objects.filter(restaurant=restaurant)
+        Order.objects.filter(restaurant_id=restaurant_id)
         .order_by("-id")[:20],
         many=True
     ).data
-    return JsonResponse({"orders": orders, "status": "success"})
+    return FastJsonResponse({"orders": orders, "status": "success"})
 
 
 @api_view()
@@ -139,13 +128,13 @@ def get_order(request, order_id):
             status
         status
     """
-    restaurant = request.user.server.restaurant
+    restaurant_id = request.user.server.restaurant_id
     try:
-        order_object = Order.objects.get(id=order_id, restaurant=restaurant)
+        order_object = Order.objects.get(id=order_id, restaurant_id=restaurant_id)
     except Order.DoesNotExist:
-        return JsonResponse({"status": "order_does_not_exist"})
+        return FastJsonResponse({"status": "order_does_not_exist"})
     order = OrderSerializer(order_object).data
-    return JsonResponse({"order": order, "status": "success"})
+    return FastJsonResponse({"order": order, "status": "success"})
 
 
 @api_view()
@@ -175,15 +164,16 @@ def get_order_details(request, order_id):
                     [options]
         status
     """
-    restaurant = request.user.server.restaurant
+    restaurant_id = request.user.server.restaurant_id
     try:
-        order = Order.objects.get(id=order_id, restaurant=restaurant)
+        order = OrderDetailsSerializer.setup_eager_loading(Order.objects).get(
+            id=order_id, restaurant_id=restaurant_id)
     except Order.DoesNotExist:
-        return JsonResponse({"status": "order_does_not_exist"})
+        return FastJsonResponse({"status": "order_does_not_exist"})
     order_details = OrderDetailsSerializer(
         order
     ).data
-    return JsonResponse({"order_details": order_details, "status": "success"})
+    return FastJsonResponse({"order_details": order_details, "status": "success"})
 
 
 @api_view()
@@ -203,22 +193,26 @@ def get_order_items_to_cook(request):
                 name
                 [options]
     """
-    restaurant = request.user.server.restaurant
+    restaurant_id = request.user.server.restaurant_id
     order_items = OrderItemToCookSerializer(
         OrderItem.objects.filter(
-            order__restaurant=restaurant, status=OrderItem.COOKING)
-        .order_by("id"),
+            restaurant_id=restaurant_id, status=OrderItem.COOKING)
+        .exclude(order__status=Order.PROCESSING)
+        .prefetch_related("order_item_cust").order_by("id"),
         many=True
     ).data
-    return JsonResponse({"order_items": order_items, "status": "success"})
+    return FastJsonResponse({"order_items": order_items, "status": "success"})
 
 
-class ServerGetItemsToSend(FlatMultipleModelMixin, GenericAPIView):
+@api_view()
+def get_items_to_send(request):
     """
-    Get list of restaurant's order items to send and requests
-    Uses django-rest-multiple-models to sort and send different models together
+    Get list of restaurant's order items to send and requests sorted by time
     header:
         Authorization: Token ...
+    params:
+        offset (optional)
+        limit (optional)
     return:
         [OrderItem or Request]
             id
@@ -229,29 +223,62 @@ class ServerGetItemsToSend(FlatMultipleModelMixin, GenericAPIView):
             time
             type
     """
+    restaurant_id = request.user.server.restaurant_id
+    try:
+        offset = int(request.GET.get("offset", 0))
+        limit = int(request.GET["limit"]) if "limit" in request.GET else None
+    except ValueError:
+        return FastJsonResponse({"status": "invalid_request"})
+    if offset < 0 or (limit is not None and limit < 0):
+        return FastJsonResponse({"status": "invalid_request"})
+    return FastJsonResponse(get_send_queue(restaurant_id, offset, limit))
 
-    # Sort combined query list by time
-    sorting_fields = ['time', 'id']
-
-    # Overrided function to build combined query list
-    def get_querylist(self):
-        restaurant = self.request.user.server.restaurant
-        order_items = OrderItem.objects.filter(
-            order__restaurant=restaurant,
-            status=OrderItem.SENDING
-        )
-        requests = Request.objects.filter(
-            request_option__restaurant=restaurant)
-
-        querylist = [
-            {'queryset': order_items, 'serializer_class': OrderItemToSendSerializer},
-            {'queryset': requests, 'serializer_class': RequestSerializer}
-        ]
-        return querylist
 
-    # GET request
-    def get(self, request, *args, **kwargs):
-        return self.list(request, *args, **kwargs)
+@api_view()
+def sync(request):
+    """
+    Get changes to restaurant's order items and requests since cursor
+    Clients store cursor and send it back on the next sync
+    header:
+        Authorization: Token ...
+    params:
+        since (cursor of last sync, omitted for full queues)
+    return:
+        [order_items] (items cooking or sending on reset, else changed items)
+            id
+            order_id
+            status (COOKING, SENDING or COMPLETE)
+            customer_name
+            table
+            meal_name
+            quantity
+            time
+            [order_item_cust]
+                id
+                customization_name
+                [options]
+            change_seq
+        [requests]
+            id
+            table
+            customer_name
+            request_name
+            time
+            change_seq
+        [deleted_order_items] (ids)
+        [deleted_requests] (ids)
+        cursor
+        reset (true if client must replace its queues)
+        status
+    """
+    restaurant_id = request.user.server.restaurant_id
+    try:
+        since = int(request.GET["since"]) if "since" in request.GET else None
+    except ValueError:
+        return FastJsonResponse({"status": "invalid_cursor"})
+    changes = get_sync_changes(restaurant_id, since)
+    changes["status"] = "success"
+    return FastJsonResponse(changes)
 
 
 @api_view(['POST'])
@@ -265,35 +292,116 @@ def update_order_item_status(request):
     return:
         status
     """
-    restaurant = request.user.server.restaurant
+    restaurant_id = request.user.server.restaurant_id
     order_item_id = request.POST.get("order_item_id")
 
+    new_status = request.POST.get("status")
     try:
-        item = OrderItem.objects.get(
-            id=order_item_id, order__restaurant=restaurant)
+        item = OrderItem.objects.select_related("order__customer__user").get(
+            id=order_item_id, restaurant_id=restaurant_id)
     except OrderItem.DoesNotExist:
-        return JsonResponse({"status": "order_item_does_not_exist"})
+        return FastJsonResponse({"status": "order_item_does_not_exist"})
 
     # Update item with new status
-    new_status = request.POST.get("status")
     item.status = new_status
-    item.save()
-    send_event_item_status_updated(item)
-
-    # Check if order status needs to be updated
+    with transaction.atomic():
+        mark_changed(restaurant_id, [item])
+        item.save(update_fields=["status", "change_seq"])
+
+    # Update order status once the item is committed, with one conditional
+    # UPDATE on the state of all its items. Of concurrent updates to items of
+    # the same order, the last to commit sees every item, so the order is not
+    # locked, and at most one of them changes the row so the event is sent once
     order = item.order
+    has_open_items = Exists(OrderItem.objects.filter(order_id=OuterRef("id")).exclude(
+        status=OrderItem.COMPLETE))
     if new_status == OrderItem.COMPLETE:
-        if not OrderItem.objects.filter(order=order).exclude(status=OrderItem.COMPLETE).exists():
-            order.status = Order.COMPLETE
-            order.save()
-            send_event_order_status_updated(order)
+        new_order_status = Order.COMPLETE
+        condition = ~has_open_items
     else:
-        if order.status != Order.ACTIVE:
-            order.status = Order.ACTIVE
-            order.save()
-            send_event_order_status_updated(order)
+        new_order_status = Order.ACTIVE
+        condition = has_open_items
+    order_updated = Order.objects.filter(condition, id=order.id).exclude(
+        status__in=[new_order_status, Order.PROCESSING]).update(status=new_order_status) == 1
+
+    send_event_item_status_updated(item)
+    if order_updated:
+        order.status = new_order_status
+        send_event_order_status_updated(order)
 
-    return JsonResponse({"status": "success"})
+    return FastJsonResponse({"status": "success"})
+
+
+@api_view(['POST'])
+def update_order_item_statuses(request):
+    """
+    Update status of many order items at once
+    header:
+        Authorization: Token ...
+    params:
+        [order_items]
+            order_item_id
+            status
+    return:
+        status
+    """
+    restaurant_id = request.user.server.restaurant_id
+    try:
+        new_statuses = {int(item["order_item_id"]): item["status"]
+                        for item in json.loads(request.POST["order_items"])}
+    except (KeyError, TypeError, ValueError):
+        return FastJsonResponse({"status": "invalid_request"})
+    valid_statuses = {status for status, _ in OrderItem.STATUS_CHOICES}
+    if not new_statuses or not set(new_statuses.values()) <= valid_statuses:
+        return FastJsonResponse({"status": "invalid_status"})
+
+    with transaction.atomic():
+        # Lock items and their orders so concurrent updates to items of
+        # the same order are applied in turn
+        items = list(OrderItem.objects.select_for_update(of=("self", "order"))
+                     .select_related("order__customer__user")
+                     .prefetch_related("order_item_cust")
+                     .filter(id__in=new_statuses, restaurant_id=restaurant_id)
+                     .order_by("id"))
+        if len(items) != len(new_statuses):
+            return FastJsonResponse({"status": "order_item_does_not_exist"})
+
+        # One UPDATE per status, all sharing one change sequence number
+        change_seq = next_change_seq(restaurant_id)
+        ids_by_status = {}
+        for item in items:
+            ids_by_status.setdefault(new_statuses[item.id], []).append(item.id)
+            item.status = new_statuses[item.id]
+            item.change_seq = change_seq
+        for status, ids in ids_by_status.items():
+            OrderItem.objects.filter(id__in=ids).update(status=status, change_seq=change_seq)
+
+        # Recompute status of affected orders with one aggregate query
+        orders = Order.objects.filter(
+            id__in={item.order_id for item in items}
+        ).exclude(status=Order.PROCESSING).annotate(
+            open_items=Count("order_item", filter=~Q(order_item__status=OrderItem.COMPLETE)))
+        updated_orders = []
+        for order in orders:
+            new_status = Order.ACTIVE if order.open_items else Order.COMPLETE
+            if order.status != new_status:
+                order.status = new_status
+                updated_orders.append(order)
+        for status in (Order.ACTIVE, Order.COMPLETE):
+            ids = [order.id for order in updated_orders if order.status == status]
+            if ids:
+                Order.objects.filter(id__in=ids).update(status=status)
+
+    # One event per order instead of one per item
+    items_by_order = {}
+    for item in items:
+        items_by_order.setdefault(item.order_id, []).append(item)
+    for order_items in items_by_order.values():
+        send_event_items_status_updated(order_items[0].order, order_items)
+    for order in updated_orders:
+        send_event_order_status_updated(order)
+
+    return FastJsonResponse({"status": "success"})
 
 
 @api_view(['POST'])
@@ -306,16 +414,16 @@ def delete_request(request):
     return:
         status
     """
-    restaurant = request.user.server.restaurant
+    restaurant_id = request.user.server.restaurant_id
     request_id = request.POST.get("id")
     try:
         request_object = Request.objects.get(
-            id=request_id, request_option__restaurant=restaurant)
+            id=request_id, restaurant_id=restaurant_id)
     except Request.DoesNotExist:
-        return JsonResponse({"status": "request_does_not_exist"})
-    request_object.delete()
+        return FastJsonResponse({"status": "request_does_not_exist"})
+    delete_requests(restaurant_id, Request.objects.filter(id=request_object.id))
     send_event_request_deleted(request_object)
-    return JsonResponse({"status": "success"})
+    return FastJsonResponse({"status": "success"})
 
 
 @api_view()
@@ -335,7 +443,7 @@ def get_info(request):
     restaurant_name = "none"
     if restaurant is not None:
         restaurant_name = restaurant.name
-    return JsonResponse({
+    return FastJsonResponse({
         "name": name,
         "email": email,
         "restaurant_name": restaurant_name,
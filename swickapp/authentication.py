@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from . import metrics
+from .cache_invalidation import get_sequence, invalidate, is_current
+from .models import Customer, Server, User
+
+"""
+TOKEN AUTHENTICATION CACHE
+Every api call authenticates its token. CachedTokenAuthentication keeps the
+token's user, customer and server rows per process for AUTH_TOKEN_CACHE_TTL
+seconds and builds fresh instances from them for each request, with
+request.user.customer and request.user.server already loaded, so a cached call
+only queries for its own data. Users are invalidated in every process through
+cache_invalidation when a token is deleted and by invalidate_user_tokens,
+called wherever the api changes a user, their customer or server, or a
+server's restaurant. A cached entry is only used while its user was not
+invalidated since it was read, so a change made by one process is seen by all
+of them and checking an entry runs no queries, not even on the shared cache. A
+user without a customer or server account still loads it lazily, so it is
+found as soon as it exists.
+"""
+
+# Kind of cache_invalidation keys, which are user ids
+USER_TOKENS = "user-tokens"
+
+# Field values of a token's user and of their customer and server, None if absent
+AuthEntry = namedtuple("AuthEntry", ["user", "customer", "server"])
+
+_lock = threading.Lock()
+# Map of token key to (AuthEntry, sequence number it was read at, expiry time)
+_cache = {}
+# Map of user id to set of cached token keys
+_keys_by_user = {}
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        now = time.monotonic()
+        with _lock:
+            cached = _cache.get(key)
+        if (cached is not None and cached[2] > now and
+                is_current(USER_TOKENS, cached[0].user["id"], cached[1])):
+            metrics.increment("auth_token_cache.hits")
+            user = build_user(cached[0])
+            return (user, Token(key=key, user=user))
+
+        metrics.increment("auth_token_cache.misses")
+        sequence = get_sequence()
+        try:
+            token = Token.objects.select_related("user__customer", "user__server").get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        user = token.user
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        entry = AuthEntry(
+            user=get_field_values(user),
+            customer=get_field_values(getattr(user, "customer", None)),
+            server=get_field_values(getattr(user, "server", None)),
+        )
+        with _lock:
+            _cache[key] = (entry, sequence, now + settings.AUTH_TOKEN_CACHE_TTL)
+            _keys_by_user.setdefault(user.id, set()).add(key)
+        return (user, token)
+
+
+def get_field_values(instance):
+    if instance is None:
+        return None
+    return {field.attname: getattr(instance, field.attname)
+            for field in instance._meta.concrete_fields}
+
+
+def build_instance(model, values):
+    return model.from_db(DEFAULT_DB_ALIAS, list(values), list(values.values()))
+
+
+def build_user(entry):
+    """
+    Return new user of cached entry with its customer and server loaded
+    """
+    user = build_instance(User, entry.user)
+    for model, values in ((Customer, entry.customer), (Server, entry.server)):
+        if values is None:
+            continue
+        related = build_instance(model, values)
+        model.user.field.set_cached_value(related, user)
+        model.user.field.remote_field.set_cached_value(user, related)
+    return user
+
+
+def invalidate_user_tokens(user_id):
+    """
+    Drop cached tokens of user in every process
+    """
+    invalidate(USER_TOKENS, user_id)
+    with _lock:
+        for key in _keys_by_user.pop(user_id, ()):
+            _cache.pop(key, None)
+
+
+def clear_auth_token_cache():
+    with _lock:
+        _cache.clear()
+        _keys_by_user.clear()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    # Other processes only see the user invalidated
+    invalidate(USER_TOKENS, instance.user_id)
+    with _lock:
+        _cache.pop(instance.key, None)
+        keys = _keys_by_user.get(instance.user_id)
+        if keys is not None:
+            keys.discard(instance.key)
@@ -0,0 +1,149 @@
+import json
+import logging
+import select
+import threading
+
+import psycopg2
+from django.conf import settings
+from django.db import connection, connections
+from psycopg2 import sql
+
+"""
+CACHE INVALIDATION
+Per-process caches of rows that any process can change keep them current by
+push instead of a shared cache lookup on every read. Every invalidation in a
+process advances its sequence number. An entry remembers get_sequence() from
+before its rows were read, and is_current tells without leaving the process
+whether its key was invalidated since. invalidate(kind, key) applies to this
+process right away and, with CACHE_INVALIDATION set to 'postgres', sends the
+key with NOTIFY on CACHE_INVALIDATION_CHANNEL, which Postgres delivers to every
+process once the change is committed. A listener thread in each process
+applies it there. Invalidations sent while the listener is not connected are
+lost, so until it is no entry is current, and every (re)connect outdates all
+entries read before it. With 'local', invalidations only reach the current
+process, which is enough for tests.
+"""
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# Advanced by every invalidation and (re)connect of the listener
+_sequence = 0
+# Sequence number of last (re)connect, entries read before it are outdated
+_epoch_start = 0
+# Map of (kind, key) to sequence number of its last invalidation
+_invalidated = {}
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def get_sequence():
+    """
+    Return sequence number to remember with an entry, read before its rows
+    """
+    with _lock:
+        return _sequence
+
+
+def is_current(kind, key, sequence):
+    """
+    Return whether entry of key of kind read at sequence is still current
+    """
+    if settings.CACHE_INVALIDATION == "postgres" and not start_listener().listening.is_set():
+        return False
+    with _lock:
+        return sequence >= _epoch_start and _invalidated.get((kind, key), 0) <= sequence
+
+
+def invalidate(kind, key):
+    """
+    Outdate entries of key of kind in every process
+    Key must be JSON serializable
+    """
+    apply_invalidation(kind, key)
+    if settings.CACHE_INVALIDATION == "postgres":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)",
+                           [settings.CACHE_INVALIDATION_CHANNEL, json.dumps([kind, key])])
+
+
+def apply_invalidation(kind, key):
+    global _sequence
+    with _lock:
+        _sequence += 1
+        _invalidated[(kind, key)] = _sequence
+
+
+def start_epoch():
+    global _sequence, _epoch_start
+    with _lock:
+        _sequence += 1
+        _epoch_start = _sequence
+        _invalidated.clear()
+
+
+class InvalidationListener:
+    def __init__(self):
+        self.listening = threading.Event()
+        self._stopped = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._listen, name="cache-invalidation-listener",
+                         daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _listen(self):
+        """
+        Apply invalidations sent by any process, reconnecting after
+        database errors
+        """
+        while not self._stopped.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**connections["default"].get_connection_params())
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(sql.SQL("LISTEN {}").format(
+                        sql.Identifier(settings.CACHE_INVALIDATION_CHANNEL)))
+                # Invalidations sent before LISTEN were missed
+                start_epoch()
+                self.listening.set()
+                while not self._stopped.is_set():
+                    if select.select([conn], [], [], 1) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        kind, key = json.loads(conn.notifies.pop(0).payload)
+                        apply_invalidation(kind, key)
+            except psycopg2.Error:
+                self.listening.clear()
+                logger.exception("Cache invalidation listener lost its connection")
+                self._stopped.wait(1)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+def start_listener():
+    """
+    Return listener of this process, starting it on first use
+    """
+    global _listener
+    listener = _listener
+    if listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = InvalidationListener()
+                _listener.start()
+            listener = _listener
+    return listener
+
+
+def stop_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
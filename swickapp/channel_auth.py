@@ -0,0 +1,100 @@
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics
+from .cache_invalidation import get_sequence, invalidate, is_current
+from .models import Customer, Server
+from .pusher_events import (get_customer_channel, get_restaurant_channel,
+                            get_server_channel)
+
+"""
+CHANNEL AUTHORIZATION CACHE
+Apps call the pusher_auth apis on every socket (re)connect. Channels are
+cached per process for CHANNEL_AUTH_CACHE_TTL seconds, so authorizing a cached
+user runs no queries. A customer's channel never changes. A server's
+restaurant can change in any process, so server channels are invalidated in
+every process through cache_invalidation by invalidate_server_channels, and a
+server removed from a restaurant loses its channel right away. Users without
+a customer or server account are not cached, so they can subscribe as soon as
+their account is created.
+"""
+
+CUSTOMER = "customer"
+SERVER = "server"
+
+# Kind of cache_invalidation keys, which are user ids
+SERVER_CHANNELS = "server-channels"
+
+_lock = threading.Lock()
+# Map of customer's user id to (frozenset of channels, expiry time)
+_cache = {}
+# Map of server's user id to (frozenset of channels, sequence number they
+# were read at, expiry time)
+_server_cache = {}
+
+
+def get_allowed_channels(role, user_id):
+    """
+    Return channels user may subscribe to as a customer or a server
+    """
+    if user_id is None:
+        return frozenset()
+    if role == SERVER:
+        return get_server_channels(user_id)
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(user_id)
+    if entry is not None and entry[1] > now:
+        metrics.increment("channel_auth_cache.hits")
+        return entry[0]
+
+    metrics.increment("channel_auth_cache.misses")
+    try:
+        customer_id = Customer.objects.values_list("id", flat=True).get(user_id=user_id)
+    except Customer.DoesNotExist:
+        return frozenset()
+    channels = frozenset([get_customer_channel(customer_id)])
+    with _lock:
+        _cache[user_id] = (channels, now + settings.CHANNEL_AUTH_CACHE_TTL)
+    return channels
+
+
+def get_server_channels(user_id):
+    now = time.monotonic()
+    with _lock:
+        entry = _server_cache.get(user_id)
+    if entry is not None and entry[2] > now and is_current(SERVER_CHANNELS, user_id, entry[1]):
+        metrics.increment("channel_auth_cache.hits")
+        return entry[0]
+
+    metrics.increment("channel_auth_cache.misses")
+    sequence = get_sequence()
+    try:
+        server_id, restaurant_id = Server.objects.values_list(
+            "id", "restaurant_id").get(user_id=user_id)
+    except Server.DoesNotExist:
+        return frozenset()
+    channels = {get_server_channel(server_id)}
+    if restaurant_id is not None:
+        channels.add(get_restaurant_channel(restaurant_id))
+    channels = frozenset(channels)
+    with _lock:
+        _server_cache[user_id] = (channels, sequence, now + settings.CHANNEL_AUTH_CACHE_TTL)
+    return channels
+
+
+def invalidate_server_channels(user_id):
+    """
+    Drop cached channels of server in every process
+    """
+    invalidate(SERVER_CHANNELS, user_id)
+    with _lock:
+        _server_cache.pop(user_id, None)
+
+
+def clear_channel_auth_cache():
+    with _lock:
+        _cache.clear()
+        _server_cache.clear()
@@ -0,0 +1,140 @@
+import threading
+import time
+
+from . import metrics
+
+"""
+COALESCING EVENT BUS
+Item and order status events are held per channel for a short window and
+merged before they are sent, so a kitchen marking many items in a few
+seconds costs each channel a handful of Pusher messages instead of one per
+item. A channel is flushed window seconds after its first held event, so a
+long burst is delayed by at most one window. Other events are sent right away.
+Messages saved by merging are counted in the event_bus.messages_saved metric.
+"""
+
+ITEM_STATUS_UPDATED = "item-status-updated"
+ITEMS_STATUS_UPDATED = "items-status-updated"
+ORDER_STATUS_UPDATED = "order-status-updated"
+COALESCED_EVENTS = (ITEM_STATUS_UPDATED, ITEMS_STATUS_UPDATED, ORDER_STATUS_UPDATED)
+
+
+def get_item_entries(event):
+    """
+    Return entries of order items in an item-status-updated or
+    items-status-updated event
+    """
+    if event["name"] == ITEM_STATUS_UPDATED:
+        return [event["data"]]
+    return event["data"]["order_items"]
+
+
+def coalesce_events(events, max_items):
+    """
+    Merge one channel's events into one items-status-updated event per
+    max_items items followed by the latest order-status-updated of each order
+    Only the latest status of each item is kept
+    """
+    channel = events[0]["channel"]
+    item_events = [event for event in events if event["name"] != ORDER_STATUS_UPDATED]
+    items = {}
+    orders = {}
+    for event in events:
+        if event["name"] == ORDER_STATUS_UPDATED:
+            orders.pop(event["data"]["order_id"], None)
+            orders[event["data"]["order_id"]] = event
+        else:
+            for entry in get_item_entries(event):
+                items.pop(entry["id"], None)
+                items[entry["id"]] = entry
+
+    if len(item_events) == 1:
+        # Nothing to merge, client gets the event as it was sent
+        merged = item_events
+    else:
+        entries = list(items.values())
+        merged = [{"channel": channel, "name": ITEMS_STATUS_UPDATED,
+                   "data": {"order_items": entries[i:i + max_items]}}
+                  for i in range(0, len(entries), max_items)]
+    return merged + list(orders.values())
+
+
+class CoalescingEventBus:
+    def __init__(self, window, max_items, send):
+        """
+        send is called with lists of events ready to be delivered
+        """
+        self._window = window
+        self._max_items = max_items
+        self._send = send
+        # Map of channel to held events and to time they are flushed
+        self._held = {}
+        self._deadlines = {}
+        self._changed = threading.Condition()
+        self._thread = None
+
+    def publish(self, events):
+        """
+        Send events, holding the ones that can be merged
+        """
+        if self._window <= 0:
+            self._send(events)
+            return
+        immediate = []
+        with self._changed:
+            for event in events:
+                if event["name"] not in COALESCED_EVENTS:
+                    immediate.append(event)
+                    continue
+                channel = event["channel"]
+                if channel not in self._held:
+                    self._held[channel] = []
+                    self._deadlines[channel] = time.monotonic() + self._window
+                self._held[channel].append(event)
+            if len(immediate) < len(events):
+                metrics.increment("event_bus.events_held", len(events) - len(immediate))
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="event-bus",
+                                                    daemon=True)
+                    self._thread.start()
+                self._changed.notify()
+        if immediate:
+            self._send(immediate)
+
+    def flush(self):
+        """
+        Send all held events now
+        """
+        with self._changed:
+            held = self._take(list(self._held))
+        self._flush(held)
+
+    def _take(self, channels):
+        held = [self._held.pop(channel) for channel in channels]
+        for channel in channels:
+            del self._deadlines[channel]
+        return held
+
+    def _flush(self, held):
+        if not held:
+            return
+        merged = []
+        for events in held:
+            merged.extend(coalesce_events(events, self._max_items))
+        metrics.increment("event_bus.messages_sent", len(merged))
+        metrics.increment("event_bus.messages_saved",
+                          sum(len(events) for events in held) - len(merged))
+        self._send(merged)
+
+    def _run(self):
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._deadlines)
+                now = time.monotonic()
+                next_deadline = min(self._deadlines.values())
+                if next_deadline > now:
+                    self._changed.wait(next_deadline - now)
+                    continue
+                held = self._take([channel for channel, deadline in self._deadlines.items()
+                                   if deadline <= now])
+            self._flush(held)
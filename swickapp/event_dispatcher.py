@@ -0,0 +1,97 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import metrics
+
+"""
+EVENT DISPATCHER
+Realtime events are delivered by a bounded pool of background threads so
+views return as soon as their transaction commits. Failed deliveries are
+retried with exponential backoff. Events that still fail, or that do not fit
+in the queue, are written to the dead letter log. Like a request, a delivery
+closes its thread's database connection once it is done, or keeps it for
+CONN_MAX_AGE, so backends that query the database do not leave connections
+open in idle threads.
+"""
+
+logger = logging.getLogger(__name__)
+dead_letter_logger = logging.getLogger("swickapp.event_dispatcher.dead_letter")
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+class EventDispatcher:
+    def __init__(self, workers):
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="event-dispatcher")
+        self._pending = 0
+        self._idle = threading.Condition()
+
+    def submit(self, deliver, *args):
+        """
+        Run deliver(*args) on a dispatcher thread
+        """
+        with self._idle:
+            full = self._pending >= settings.EVENT_DISPATCHER_MAX_QUEUE
+            if not full:
+                self._pending += 1
+                metrics.set_gauge("event_dispatcher.queue_depth", self._pending)
+        if full:
+            metrics.increment("event_dispatcher.dead_letters")
+            dead_letter_logger.error("Event queue is full, dropped %s%r",
+                                     deliver.__name__, args)
+            return
+        self._executor.submit(self._run, deliver, args, time.monotonic())
+
+    def _run(self, deliver, args, queued_time):
+        close_old_connections()
+        try:
+            max_attempts = settings.EVENT_DISPATCHER_MAX_ATTEMPTS
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    deliver(*args)
+                except Exception:
+                    if attempt == max_attempts:
+                        metrics.increment("event_dispatcher.dead_letters")
+                        dead_letter_logger.exception("Failed to deliver %s%r after %d attempts",
+                                                     deliver.__name__, args, attempt)
+                        return
+                    metrics.increment("event_dispatcher.retries")
+                    logger.warning("Failed to deliver %s, retrying", deliver.__name__)
+                    time.sleep(settings.EVENT_DISPATCHER_RETRY_DELAY * 2 ** (attempt - 1))
+                else:
+                    metrics.increment("event_dispatcher.delivered")
+                    metrics.observe("event_dispatcher.delivery_latency",
+                                    time.monotonic() - queued_time)
+                    return
+        finally:
+            close_old_connections()
+            with self._idle:
+                self._pending -= 1
+                metrics.set_gauge("event_dispatcher.queue_depth", self._pending)
+                self._idle.notify_all()
+
+    def join(self, timeout=None):
+        """
+        Wait until all submitted events are delivered or dead lettered
+        Return False if timeout expires first
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+
+def get_event_dispatcher():
+    """
+    Return process-wide dispatcher, creating it on first use
+    """
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = EventDispatcher(settings.EVENT_DISPATCHER_WORKERS)
+        return _dispatcher
@@ -0,0 +1,107 @@
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import stripe
+from django.conf import settings
+from django.db.models import Case, DecimalField, Q, Value, When
+from django.utils import timezone
+from swick.settings import STRIPE_API_KEY
+
+from .finance import update_daily_summaries
+from .models import Order
+
+stripe.api_key = STRIPE_API_KEY
+
+"""
+STRIPE FEE RECONCILIATION
+Stripe fees are not looked up while an order or tip is being paid for.
+Paid orders are left with a null stripe_fee (and adding a tip resets it to null
+and sets tip_time) until reconcile_stripe_fees matches them to the balance
+transactions of the restaurant's connected account, listed a page at a time.
+An order is reconciled while its order_time or tip_time is in the lookback
+window, and only once every charge it has is listed.
+"""
+
+# Balance transactions listed per Stripe API call
+PAGE_SIZE = 100
+# Orders updated per UPDATE statement
+UPDATE_BATCH_SIZE = 500
+
+
+def list_stripe_fees(stripe_acct_id, created_since):
+    """
+    Return map of payment intent id to stripe fee in cents for charges
+    on connected account created since created_since
+    """
+    fees = {}
+    starting_after = None
+    while True:
+        page = stripe.BalanceTransaction.list(
+            created={"gte": int(created_since.timestamp())},
+            limit=PAGE_SIZE,
+            starting_after=starting_after,
+            # Charge is needed to find payment intent of transaction
+            expand=["data.source"],
+            stripe_account=stripe_acct_id
+        )
+        for transaction in page.data:
+            payment_intent_id = getattr(transaction.source, "payment_intent", None)
+            if payment_intent_id is None:
+                # Payouts, refunds and other non charge transactions
+                continue
+            fees[payment_intent_id] = fees.get(payment_intent_id, 0) + sum(
+                fee.amount for fee in transaction.fee_details if fee.type == "stripe_fee")
+        if not page.has_more or not page.data:
+            return fees
+        starting_after = page.data[-1].id
+
+
+def reconcile_stripe_fees(restaurant, since=None):
+    """
+    Fill in stripe_fee of restaurant's paid orders placed or tipped after
+    since that are missing fees, and return number of orders updated
+    since defaults to STRIPE_FEE_LOOKBACK_DAYS ago
+    """
+    if since is None:
+        since = timezone.now() - timedelta(days=settings.STRIPE_FEE_LOOKBACK_DAYS)
+    orders = list(Order.objects.filter(
+        Q(order_time__gte=since) | Q(tip_time__gte=since),
+        restaurant=restaurant,
+        stripe_fee__isnull=True,
+        stripe_payment_id__isnull=False
+    ).exclude(status=Order.PROCESSING).only(
+        "id", "order_time", "stripe_payment_id", "tip_stripe_payment_id", "tip_time"))
+    if not orders:
+        return 0
+
+    fees = list_stripe_fees(restaurant.stripe_acct_id,
+                            min(order.order_time for order in orders))
+    order_fees = []
+    order_times = []
+    for order in orders:
+        # Tip payment that never went through has no tip_time and no charge
+        tipped = order.tip_time is not None
+        if (order.stripe_payment_id not in fees or
+                tipped and order.tip_stripe_payment_id not in fees):
+            # Charge is not on Stripe yet, try again next time
+            continue
+        fee = fees[order.stripe_payment_id]
+        if tipped:
+            fee += fees[order.tip_stripe_payment_id]
+        order_fees.append((order.id, Decimal((Decimal(fee) / 100).quantize(
+            Decimal("0.01"), rounding=ROUND_HALF_UP))))
+        order_times.append(order.order_time)
+    # One UPDATE per batch, skipping orders whose fee was filled in meanwhile
+    updated = 0
+    for i in range(0, len(order_fees), UPDATE_BATCH_SIZE):
+        batch = order_fees[i:i + UPDATE_BATCH_SIZE]
+        updated += Order.objects.filter(
+            id__in=[order_id for order_id, _ in batch],
+            stripe_fee__isnull=True
+        ).update(stripe_fee=Case(
+            *[When(id=order_id, then=Value(fee)) for order_id, fee in batch],
+            output_field=DecimalField(max_digits=7, decimal_places=2)
+        ))
+    if updated:
+        update_daily_summaries(restaurant.id, order_times)
+    return updated
@@ -0,0 +1,182 @@
+from datetime import datetime, time, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import pytz
+from django.db import transaction
+from django.db.models import Count, DateTimeField, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Trunc
+
+from .models import DailyRestaurantSummary, Order, OrderItem
+from .restaurant_cache import get_restaurant_metadata
+
+"""
+FINANCE ROLLUPS
+Totals of a restaurant's paid orders are kept per day of the restaurant's
+timezone in DailyRestaurantSummary. Whenever an order becomes ACTIVE, gets a
+tip or has its Stripe fee reconciled, the summary of its day is recomputed
+once the change commits. The summary row is locked while its day is summed,
+so a later recompute always sees every change committed before it.
+
+get_finance_totals answers a range with the summaries of the whole days in it
+plus SQL aggregates over the orders of the partial days at either end, so its
+cost does not grow with the length of the range.
+
+All totals are summed by the database. Missing amounts count as zero, and
+orders whose Stripe fee is not reconciled yet are counted in pending_fee_count
+so the page can say the fees are incomplete. get_tax_by_category breaks the
+tax of a range down by the tax category each item was ordered with, in one
+grouped query over order items.
+"""
+
+TOTAL_FIELDS = ("order_count", "gross_revenue", "total_tax", "total_tip", "stripe_fees",
+                "pending_fee_count")
+
+
+def sum_money(field):
+    return Coalesce(Sum(field), Value(Decimal("0.00")),
+                    output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def get_paid_orders(restaurant_id):
+    return Order.objects.filter(restaurant_id=restaurant_id).exclude(status=Order.PROCESSING)
+
+
+def get_total_aggregates():
+    """
+    Return aggregates of TOTAL_FIELDS over orders
+    """
+    return {
+        "order_count": Count("id"),
+        "gross_revenue": sum_money("total"),
+        "total_tax": sum_money("tax"),
+        "total_tip": sum_money("tip"),
+        "stripe_fees": sum_money("stripe_fee"),
+        "pending_fee_count": Count("id", filter=Q(stripe_fee__isnull=True)),
+    }
+
+
+def aggregate_order_totals(orders):
+    """
+    Return totals of orders queryset
+    """
+    return orders.aggregate(**get_total_aggregates())
+
+
+def get_day_start(tz, day):
+    return tz.localize(datetime.combine(day, time.min))
+
+
+def update_daily_summaries(restaurant_id, order_times):
+    """
+    Recompute summaries of days of order_times once the current
+    transaction commits
+    """
+    tz = pytz.timezone(get_restaurant_metadata(restaurant_id).timezone)
+    days = {order_time.astimezone(tz).date() for order_time in order_times}
+    for day in days:
+        transaction.on_commit(lambda day=day: refresh_daily_summary(restaurant_id, day))
+
+
+def refresh_daily_summary(restaurant_id, day):
+    """
+    Recompute summary of restaurant's orders on day
+    """
+    tz = pytz.timezone(get_restaurant_metadata(restaurant_id).timezone)
+    with transaction.atomic():
+        DailyRestaurantSummary.objects.bulk_create(
+            [DailyRestaurantSummary(restaurant_id=restaurant_id, date=day)],
+            ignore_conflicts=True)
+        summary = DailyRestaurantSummary.objects.select_for_update().get(
+            restaurant_id=restaurant_id, date=day)
+        totals = aggregate_order_totals(get_paid_orders(restaurant_id).filter(
+            order_time__gte=get_day_start(tz, day),
+            order_time__lt=get_day_start(tz, day + timedelta(days=1))))
+        for field in TOTAL_FIELDS:
+            setattr(summary, field, totals[field])
+        summary.save()
+
+
+def rebuild_daily_summaries(restaurant_id):
+    """
+    Replace all summaries of restaurant with ones computed from its orders
+    Return number of days summarized
+    """
+    tz = pytz.timezone(get_restaurant_metadata(restaurant_id).timezone)
+    days = get_paid_orders(restaurant_id).annotate(
+        day=Trunc("order_time", "day", output_field=DateTimeField(), tzinfo=tz)
+    ).values("day").annotate(**get_total_aggregates()).order_by()
+    summaries = [DailyRestaurantSummary(
+        restaurant_id=restaurant_id,
+        date=row.pop("day").astimezone(tz).date(),
+        **row) for row in days]
+    with transaction.atomic():
+        DailyRestaurantSummary.objects.filter(restaurant_id=restaurant_id).delete()
+        DailyRestaurantSummary.objects.bulk_create(summaries, batch_size=1000)
+    return len(summaries)
+
+
+def get_finance_totals(restaurant_id, start_time, end_time):
+    """
+    Return totals of restaurant's paid orders with order_time in the
+    inclusive range start_time to end_time
+    """
+    tz = pytz.timezone(get_restaurant_metadata(restaurant_id).timezone)
+    orders = get_paid_orders(restaurant_id)
+    local_start = start_time.astimezone(tz)
+    first_day = local_start.date()
+    if get_day_start(tz, first_day) < start_time:
+        first_day += timedelta(days=1)
+    # Range is inclusive, day is whole if range ends on its last instant
+    last_day = (end_time + timedelta(microseconds=1)).astimezone(tz).date() - timedelta(days=1)
+
+    if first_day > last_day:
+        return with_revenue(aggregate_order_totals(
+            orders.filter(order_time__range=(start_time, end_time))))
+
+    whole_days_start = get_day_start(tz, first_day)
+    whole_days_end = get_day_start(tz, last_day + timedelta(days=1))
+    edges = aggregate_order_totals(orders.filter(
+        Q(order_time__gte=start_time, order_time__lt=whole_days_start) |
+        Q(order_time__gte=whole_days_end, order_time__lte=end_time)))
+    days = DailyRestaurantSummary.objects.filter(
+        restaurant_id=restaurant_id, date__range=(first_day, last_day)
+    ).aggregate(
+        order_count=Coalesce(Sum("order_count"), 0),
+        gross_revenue=sum_money("gross_revenue"),
+        total_tax=sum_money("total_tax"),
+        total_tip=sum_money("total_tip"),
+        stripe_fees=sum_money("stripe_fees"),
+        pending_fee_count=Coalesce(Sum("pending_fee_count"), 0),
+    )
+    return with_revenue({field: edges[field] + days[field] for field in TOTAL_FIELDS})
+
+
+def with_revenue(totals):
+    totals["revenue"] = (totals["gross_revenue"] - totals["total_tax"] -
+                         totals["total_tip"] - totals["stripe_fees"])
+    return totals
+
+
+def get_tax_by_category(restaurant_id, start_time, end_time):
+    """
+    Return list of name, rate, taxable sales and tax of each tax category of
+    order items of restaurant's paid orders in the inclusive range
+    Items are grouped by the tax category they were ordered with, items whose
+    category is unknown have None as name and rate
+    """
+    # Filtered on order so its range is found with order_rest_time_idx and
+    # its items with their order index
+    rows = OrderItem.objects.filter(
+        order__restaurant_id=restaurant_id,
+        order__order_time__range=(start_time, end_time)
+    ).exclude(order__status=Order.PROCESSING).values(
+        "tax_category_name", "tax_rate"
+    ).annotate(taxable=sum_money("total")).order_by(
+        F("tax_category_name").asc(nulls_last=True), "tax_rate")
+    return [{
+        "name": row["tax_category_name"],
+        "rate": row["tax_rate"],
+        "taxable": row["taxable"],
+        "tax": None if row["tax_rate"] is None else
+        (row["taxable"] * row["tax_rate"] / 100).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
+    } for row in rows]
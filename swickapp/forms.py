@@ -3,9 +3,11 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.core.files import File
 
+from .finance import rebuild_daily_summaries
 from .forms_helper import formatted_image_blob, validate_no_restaurant
 from .models import (Category, Customization, Meal, RequestOption, Restaurant,
                      ServerRequest, TaxCategory, User)
+from .restaurant_cache import invalidate_restaurant_metadata
 from .widgets import DateTimePickerInput
 
 
@@ -53,6 +55,11 @@ class RestaurantForm(forms.ModelForm):
                                     self.cleaned_data.get('height'))
         restaurant.image.save(name=restaurant.image.name,
                               content=File(blob), save=commit)
+        if commit:
+            invalidate_restaurant_metadata(restaurant.id)
+            # Days of finance rollups follow the restaurant's timezone
+            if "timezone" in self.changed_data and restaurant.id is not None:
+                rebuild_daily_summaries(restaurant.id)
 
         return restaurant
 
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+import pytz
+from django.core.management.base import BaseCommand, CommandError
+
+from swickapp.finance import get_day_start
+from swickapp.models import Restaurant
+from swickapp.order_export import CONTENT_TYPES, CSV, export_orders
+
+
+class Command(BaseCommand):
+    help = ("Export a restaurant's paid orders with their items and customizations "
+            "as CSV or NDJSON, streamed so any range fits in constant memory")
+
+    def add_arguments(self, parser):
+        parser.add_argument("restaurant", type=int, help="Restaurant id")
+        parser.add_argument("--start", required=True,
+                            help="First day of orders (YYYY-MM-DD) in the restaurant's timezone")
+        parser.add_argument("--end", required=True,
+                            help="Last day of orders (YYYY-MM-DD) in the restaurant's timezone")
+        parser.add_argument("--format", choices=sorted(CONTENT_TYPES), default=CSV)
+        parser.add_argument("--output", help="File to write to instead of stdout")
+
+    def handle(self, *args, **options):
+        try:
+            restaurant = Restaurant.objects.get(id=options["restaurant"])
+        except Restaurant.DoesNotExist:
+            raise CommandError("Restaurant {id} does not exist".format(id=options["restaurant"]))
+        try:
+            start_day = datetime.strptime(options["start"], "%Y-%m-%d").date()
+            end_day = datetime.strptime(options["end"], "%Y-%m-%d").date()
+        except ValueError:
+            raise CommandError("--start and --end must be dates in YYYY-MM-DD format")
+
+        tz = pytz.timezone(restaurant.timezone)
+        chunks = export_orders(restaurant.id, get_day_start(tz, start_day),
+                               get_day_start(tz, end_day + timedelta(days=1)) -
+                               timedelta(microseconds=1),
+                               options["format"])
+        if options["output"]:
+            with open(options["output"], "w", newline="") as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from swickapp.sync import prune_sync_tombstones
+
+
+class Command(BaseCommand):
+    help = ("Delete tombstones of order items and requests deleted more than "
+            "SYNC_TOMBSTONE_DAYS days ago. Meant to be run periodically, "
+            "e.g. by Heroku Scheduler")
+
+    def handle(self, *args, **options):
+        count = prune_sync_tombstones()
+        self.stdout.write("{count} tombstones pruned".format(count=count))
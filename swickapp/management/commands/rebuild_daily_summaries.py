@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from swickapp.finance import rebuild_daily_summaries
+from swickapp.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = ("Recompute daily finance rollups of every restaurant from its "
+            "orders, e.g. after orders were edited outside the apis")
+
+    def handle(self, *args, **options):
+        for restaurant_id in Restaurant.objects.values_list("id", flat=True):
+            count = rebuild_daily_summaries(restaurant_id)
+            self.stdout.write("Restaurant {id}: {count} days summarized".format(
+                id=restaurant_id, count=count))
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from swickapp.fee_reconciliation import reconcile_stripe_fees
+from swickapp.models import Order, Restaurant
+
+
+class Command(BaseCommand):
+    help = ("Fill in Stripe fees of paid orders that are missing them. "
+            "Meant to be run periodically, e.g. by Heroku Scheduler")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurant", type=int,
+                            help="Only reconcile orders of this restaurant id")
+        parser.add_argument("--since",
+                            help="Backfill orders placed since this date (YYYY-MM-DD) "
+                            "instead of the last STRIPE_FEE_LOOKBACK_DAYS days")
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = timezone.make_aware(
+                    datetime.strptime(options["since"], "%Y-%m-%d"))
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format")
+
+        # Only restaurants with paid orders missing fees, whatever their
+        # other orders are
+        restaurants = Restaurant.objects.filter(Exists(
+            Order.objects.filter(
+                restaurant=OuterRef("pk"),
+                stripe_fee__isnull=True,
+                stripe_payment_id__isnull=False
+            ).exclude(status=Order.PROCESSING)
+        ))
+        if options["restaurant"]:
+            restaurants = restaurants.filter(id=options["restaurant"])
+
+        total = 0
+        for restaurant in restaurants:
+            count = reconcile_stripe_fees(restaurant, since)
+            total += count
+            self.stdout.write("{restaurant}: {count} orders reconciled".format(
+                restaurant=restaurant.name, count=count))
+        self.stdout.write("{total} orders reconciled".format(total=total))
@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from swickapp.payment_pipeline import process_payment_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued payment jobs of the asynchronous payment pipeline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Run due jobs once and exit")
+        parser.add_argument("--batch-size", type=int, default=10,
+                            help="Maximum number of jobs claimed at a time")
+
+    def handle(self, *args, **options):
+        while True:
+            count = process_payment_jobs(options["batch_size"])
+            if count:
+                self.stdout.write("Ran {count} payment jobs".format(count=count))
+            if options["once"]:
+                break
+            # Keep going without sleeping while there is a backlog
+            if count < options["batch_size"]:
+                time.sleep(settings.PAYMENT_WORKER_POLL_INTERVAL)
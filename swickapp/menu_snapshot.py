@@ -0,0 +1,98 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Category, Customization, Meal, RequestOption, Restaurant
+from .responses import encode_json
+from .serializers import (CategorySerializer, CustomizationSerializer,
+                          MealSerializer, RequestOptionSerializer,
+                          RestaurantSerializer)
+
+"""
+MENU SNAPSHOTS
+The full enabled menu of a restaurant is serialized once and cached under the
+restaurant's menu version. Views that edit the menu, tax categories, request
+options or restaurant info call bump_menu_version, so the next request builds
+a new snapshot. Versions start from the current time so they never repeat
+after the cache is cleared, which keeps ETags handed to clients unique.
+"""
+
+
+def get_menu_version(restaurant_id):
+    """
+    Return menu version of restaurant, None if restaurant does not exist
+    """
+    key = "menu-version-{id}".format(id=restaurant_id)
+    version = cache.get(key)
+    if version is None:
+        # Versions are only written for restaurants that exist
+        if not Restaurant.objects.filter(id=restaurant_id).exists():
+            return None
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_menu_version(restaurant_id):
+    key = "menu-version-{id}".format(id=restaurant_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Version is not in cache
+        cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def get_menu_snapshot(restaurant_id, version, request):
+    """
+    Return menu snapshot of restaurant at version as JSON bytes
+    Raises Restaurant.DoesNotExist if restaurant does not exist
+    """
+    # Image urls depend on host when media is served locally
+    key = "menu-snapshot-{id}-{version}-{media}".format(
+        id=restaurant_id, version=version,
+        media=request.build_absolute_uri(settings.MEDIA_URL))
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_menu_snapshot(restaurant_id, version, request)
+        cache.set(key, snapshot, timeout=settings.MENU_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def build_menu_snapshot(restaurant_id, version, request):
+    restaurant = Restaurant.objects.get(id=restaurant_id)
+    request_options = RequestOption.objects.filter(
+        restaurant=restaurant).order_by("id")
+    categories = Category.objects.filter(restaurant=restaurant).order_by("name")
+    meals = Meal.objects.filter(
+        category__restaurant=restaurant,
+        enabled=True
+    ).select_related("tax_category").order_by("name")
+    customizations = Customization.objects.filter(
+        meal__category__restaurant=restaurant,
+        meal__enabled=True
+    ).order_by("name")
+
+    customizations_by_meal = {}
+    for customization in customizations:
+        customizations_by_meal.setdefault(customization.meal_id, []).append(customization)
+    meals_by_category = {}
+    meal_context = {"request": request}
+    for meal in meals:
+        meal_serialized = MealSerializer(meal, context=meal_context).data
+        meal_serialized["customizations"] = CustomizationSerializer(
+            customizations_by_meal.get(meal.id, []), many=True).data
+        meals_by_category.setdefault(meal.category_id, []).append(meal_serialized)
+    categories_serialized = []
+    for category in categories:
+        category_serialized = CategorySerializer(category).data
+        category_serialized["meals"] = meals_by_category.get(category.id, [])
+        categories_serialized.append(category_serialized)
+
+    return encode_json({
+        "restaurant": RestaurantSerializer(restaurant, context={"request": request}).data,
+        "request_options": RequestOptionSerializer(request_options, many=True).data,
+        "categories": categories_serialized,
+        "version": version,
+        "status": "success"
+    })
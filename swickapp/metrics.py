@@ -0,0 +1,57 @@
+import threading
+from collections import defaultdict
+
+"""
+PROCESS METRICS
+Counters, gauges and timings are kept in memory by each process and
+exposed to staff through the get_metrics api
+"""
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+# Map of timing name to [count, total seconds, max seconds]
+_timings = {}
+
+
+def increment(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def set_gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, seconds):
+    """
+    Record duration in seconds of one occurrence of name
+    """
+    with _lock:
+        timing = _timings.setdefault(name, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += seconds
+        timing[2] = max(timing[2], seconds)
+
+
+def get_metrics():
+    """
+    Return snapshot of all metrics
+    """
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": {name: {"count": count,
+                               "avg": total / count,
+                               "max": maximum}
+                        for name, (count, total, maximum) in _timings.items()},
+        }
+
+
+def reset_metrics():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timings.clear()
@@ -1,6 +1,8 @@
 import pytz
 from django.utils import timezone
 
+from .pusher_events import batch_pusher_events
+
 
 class TimezoneMiddleware:
     def __init__(self, get_response):
@@ -13,3 +15,17 @@ class TimezoneMiddleware:
         else:
             timezone.deactivate()
         return self.get_response(request)
+
+
+class PusherBatchMiddleware:
+    """
+    Send pusher events triggered while handling a request together
+    once the response is ready
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with batch_pusher_events():
+            return self.get_response(request)
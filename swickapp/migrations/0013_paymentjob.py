@@ -0,0 +1,37 @@
+# Generated by Django 3.0.7 on 2026-10-17 22:00
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swickapp', '0012_auto_20201123_2210'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.IntegerField(unique=True)),
+                ('payment_method_id', models.CharField(max_length=255)),
+                ('amount', models.IntegerField()),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETE', 'Complete')], default='PENDING', max_length=16)),
+                ('attempts', models.IntegerField(default=0)),
+                ('created_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('available_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_time', models.DateTimeField(blank=True, null=True)),
+                ('result', django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='swickapp.Customer')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='swickapp.Restaurant')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='paymentjob',
+            index=models.Index(condition=models.Q(_negated=True, status='COMPLETE'), fields=['available_time'], name='paymentjob_queue_idx'),
+        ),
+    ]
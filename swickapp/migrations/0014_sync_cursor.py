@@ -0,0 +1,48 @@
+# Generated by Django 3.0.7 on 2026-10-17 22:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swickapp', '0013_paymentjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='change_seq',
+            field=models.BigIntegerField(db_index=True, default=0),
+        ),
+        migrations.CreateModel(
+            name='SyncCursor',
+            fields=[
+                ('restaurant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sync_cursor', serialize=False, to='swickapp.Restaurant')),
+                ('seq', models.BigIntegerField(default=0)),
+                ('pruned_seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('ORDER_ITEM', 'Order item'), ('REQUEST', 'Request')], max_length=16)),
+                ('object_id', models.IntegerField()),
+                ('change_seq', models.BigIntegerField()),
+                ('deleted_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='swickapp.Restaurant')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['restaurant', 'change_seq'], name='synctombstone_seq_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.0.7 on 2026-10-17 22:21
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently, without blocking writes
+    atomic = False
+
+    dependencies = [
+        ('swickapp', '0014_sync_cursor'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(condition=models.Q(_negated=True, status='PROCESSING'), fields=['restaurant', 'order_time'], name='order_rest_time_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['restaurant', '-id'], name='order_rest_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(condition=models.Q(_negated=True, status='PROCESSING'), fields=['customer', '-id'], name='order_cust_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='orderitem',
+            index=models.Index(condition=models.Q(_negated=True, status='COMPLETE'), fields=['status', 'id'], name='orderitem_open_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='request',
+            index=models.Index(fields=['customer', 'request_option'], name='request_cust_option_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='serverrequest',
+            index=models.Index(fields=['email', 'accepted'], name='serverrequest_email_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='serverrequest',
+            index=models.Index(fields=['token'], name='serverrequest_token_idx'),
+        ),
+    ]
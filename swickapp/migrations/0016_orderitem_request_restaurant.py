@@ -0,0 +1,24 @@
+# Generated by Django 3.0.7 on 2026-10-17 22:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swickapp', '0015_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='restaurant',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='swickapp.Restaurant'),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='restaurant',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='swickapp.Restaurant'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+# Rows updated per UPDATE statement, so no statement locks the whole table
+BATCH_SIZE = 5000
+
+
+def backfill_in_batches(queryset, restaurant_id):
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id, restaurant__isnull=True)
+                   .order_by("id").values_list("id", flat=True)[:BATCH_SIZE])
+        if not ids:
+            return
+        queryset.filter(id__in=ids).update(restaurant_id=restaurant_id)
+        last_id = ids[-1]
+
+
+def backfill_restaurant(apps, schema_editor):
+    Order = apps.get_model("swickapp", "Order")
+    OrderItem = apps.get_model("swickapp", "OrderItem")
+    Request = apps.get_model("swickapp", "Request")
+    RequestOption = apps.get_model("swickapp", "RequestOption")
+    backfill_in_batches(OrderItem.objects, Subquery(
+        Order.objects.filter(id=OuterRef("order_id")).values("restaurant_id")[:1]))
+    backfill_in_batches(Request.objects, Subquery(
+        RequestOption.objects.filter(id=OuterRef("request_option_id")).values("restaurant_id")[:1]))
+
+
+class Migration(migrations.Migration):
+    # Batches are committed one at a time
+    atomic = False
+
+    dependencies = [
+        ('swickapp', '0016_orderitem_request_restaurant'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_restaurant, migrations.RunPython.noop),
+    ]
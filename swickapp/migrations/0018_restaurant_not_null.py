@@ -0,0 +1,35 @@
+# Generated by Django 3.0.7 on 2026-10-17 22:30
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently, without blocking writes
+    atomic = False
+
+    dependencies = [
+        ('swickapp', '0017_backfill_restaurant'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderitem',
+            name='restaurant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='swickapp.Restaurant'),
+        ),
+        migrations.AlterField(
+            model_name='request',
+            name='restaurant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='swickapp.Restaurant'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='orderitem',
+            name='orderitem_open_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='orderitem',
+            index=models.Index(condition=models.Q(_negated=True, status='COMPLETE'), fields=['restaurant', 'status', 'id'], name='orderitem_open_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.0.7 on 2026-10-17 22:38
+
+import pytz
+from django.db import migrations, models
+from django.db.models import Count, DateTimeField, Sum
+from django.db.models.functions import Trunc
+import django.db.models.deletion
+
+
+def backfill_summaries(apps, schema_editor):
+    Restaurant = apps.get_model("swickapp", "Restaurant")
+    Order = apps.get_model("swickapp", "Order")
+    DailyRestaurantSummary = apps.get_model("swickapp", "DailyRestaurantSummary")
+    for restaurant_id, timezone in Restaurant.objects.values_list("id", "timezone").iterator():
+        tz = pytz.timezone(timezone)
+        days = Order.objects.filter(restaurant_id=restaurant_id).exclude(
+            status="PROCESSING"
+        ).annotate(
+            day=Trunc("order_time", "day", output_field=DateTimeField(), tzinfo=tz)
+        ).values("day").annotate(
+            order_count=Count("id"),
+            gross_revenue=Sum("total"),
+            total_tax=Sum("tax"),
+            total_tip=Sum("tip"),
+            stripe_fees=Sum("stripe_fee"),
+        ).order_by()
+        DailyRestaurantSummary.objects.bulk_create([
+            DailyRestaurantSummary(
+                restaurant_id=restaurant_id,
+                date=row.pop("day").astimezone(tz).date(),
+                **{field: value or 0 for field, value in row.items()})
+            for row in days
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swickapp', '0018_restaurant_not_null'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRestaurantSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('order_count', models.IntegerField(default=0)),
+                ('gross_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_tax', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_tip', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('stripe_fees', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='swickapp.Restaurant')),
+            ],
+            options={
+                'unique_together': {('restaurant', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
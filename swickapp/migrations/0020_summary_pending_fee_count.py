@@ -0,0 +1,39 @@
+# Generated by Django 3.0.7 on 2026-10-17 22:40
+
+import pytz
+from django.db import migrations, models
+from django.db.models import Count, DateTimeField
+from django.db.models.functions import Trunc
+
+
+def backfill_pending_fee_count(apps, schema_editor):
+    Restaurant = apps.get_model("swickapp", "Restaurant")
+    Order = apps.get_model("swickapp", "Order")
+    DailyRestaurantSummary = apps.get_model("swickapp", "DailyRestaurantSummary")
+    for restaurant_id, timezone in Restaurant.objects.values_list("id", "timezone").iterator():
+        tz = pytz.timezone(timezone)
+        days = Order.objects.filter(
+            restaurant_id=restaurant_id, stripe_fee__isnull=True
+        ).exclude(status="PROCESSING").annotate(
+            day=Trunc("order_time", "day", output_field=DateTimeField(), tzinfo=tz)
+        ).values("day").annotate(pending_fee_count=Count("id")).order_by()
+        for row in days:
+            DailyRestaurantSummary.objects.filter(
+                restaurant_id=restaurant_id, date=row["day"].astimezone(tz).date()
+            ).update(pending_fee_count=row["pending_fee_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swickapp', '0019_daily_restaurant_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyrestaurantsummary',
+            name='pending_fee_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_pending_fee_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.0.7 on 2026-10-17 22:44
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+# Rows updated per UPDATE statement, so no statement locks the whole table
+BATCH_SIZE = 5000
+
+
+def backfill_tax_snapshot(apps, schema_editor):
+    """
+    Best effort: items take the current tax category of the restaurant's
+    meal with their name, items of deleted meals stay without one
+    """
+    Meal = apps.get_model("swickapp", "Meal")
+    OrderItem = apps.get_model("swickapp", "OrderItem")
+    meals = Meal.objects.filter(
+        category__restaurant_id=OuterRef("restaurant_id"), name=OuterRef("meal_name")
+    ).order_by("id")
+    last_id = 0
+    while True:
+        ids = list(OrderItem.objects.filter(id__gt=last_id, tax_rate__isnull=True)
+                   .order_by("id").values_list("id", flat=True)[:BATCH_SIZE])
+        if not ids:
+            return
+        OrderItem.objects.filter(id__in=ids).update(
+            tax_category_name=Subquery(meals.values("tax_category__name")[:1]),
+            tax_rate=Subquery(meals.values("tax_category__tax")[:1]),
+        )
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+    # Batches are committed one at a time
+    atomic = False
+
+    dependencies = [
+        ('swickapp', '0020_summary_pending_fee_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='tax_category_name',
+            field=models.CharField(blank=True, max_length=256, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='tax_rate',
+            field=models.DecimalField(blank=True, decimal_places=3, max_digits=5, null=True),
+        ),
+        migrations.RunPython(backfill_tax_snapshot, migrations.RunPython.noop),
+    ]
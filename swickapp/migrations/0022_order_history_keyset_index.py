@@ -0,0 +1,24 @@
+# Generated by Django 3.0.7 on 2026-10-17 22:47
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Indexes are built concurrently, without blocking writes
+    atomic = False
+
+    dependencies = [
+        ('swickapp', '0021_order_item_tax_snapshot'),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='order',
+            name='order_rest_time_idx',
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(condition=models.Q(_negated=True, status='PROCESSING'), fields=['restaurant', 'order_time', 'id'], name='order_rest_time_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-17 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swickapp', '0022_order_history_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='tip_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
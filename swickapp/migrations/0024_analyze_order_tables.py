@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('swickapp', '0023_order_tip_time'),
+    ]
+
+    operations = [
+        # With id in order_rest_time_idx, joins of orders to their items can be
+        # planned as a nested loop over an index only scan of it, which is only
+        # cheap when item statistics are current, so refresh them
+        migrations.RunSQL("ANALYZE swickapp_order, swickapp_orderitem", migrations.RunSQL.noop),
+    ]
@@ -2,7 +2,7 @@ from decimal import Decimal
 
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser
-from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.fields import ArrayField, JSONField
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models
@@ -117,6 +117,13 @@ class ServerRequest(models.Model):
     created_time = models.DateTimeField(default=timezone.now)
     accepted = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Server login looks up accepted requests by email
+            models.Index(fields=['email', 'accepted'], name='serverrequest_email_idx'),
+            models.Index(fields=['token'], name='serverrequest_token_idx'),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -209,6 +216,21 @@ class Order(models.Model):
     # Need to couple paymentIntent and order together
     stripe_payment_id = models.CharField(max_length=255, null=True)
     tip_stripe_payment_id = models.CharField(max_length=255, null=True)
+    # Time tip payment succeeded, its fee is reconciled again from then on
+    tip_time = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Restaurant's order history and finances by time, id orders
+            # history pages of orders placed at the same time
+            models.Index(fields=['restaurant', 'order_time', 'id'], name='order_rest_time_idx',
+                         condition=~models.Q(status='PROCESSING')),
+            # Restaurant's latest orders
+            models.Index(fields=['restaurant', '-id'], name='order_rest_id_idx'),
+            # Customer's latest orders
+            models.Index(fields=['customer', '-id'], name='order_cust_id_idx',
+                         condition=~models.Q(status='PROCESSING')),
+        ]
 
     def __str__(self):
         return str(self.id)
@@ -226,6 +248,8 @@ class OrderItem(models.Model):
 
     order = models.ForeignKey(Order, on_delete=models.CASCADE,
                               related_name='order_item')
+    # Same as order's restaurant, stored so queues are read without a join
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
     status = models.CharField(max_length=16, choices=STATUS_CHOICES,
                               default=COOKING)
     meal_name = models.CharField(max_length=256)
@@ -233,6 +257,20 @@ class OrderItem(models.Model):
     quantity = models.IntegerField()
     total = models.DecimalField(max_digits=7, decimal_places=2,
                                 blank=True, null=True)
+    # Meal's tax category when ordered, kept as tax categories are edited
+    tax_category_name = models.CharField(max_length=256, blank=True, null=True)
+    tax_rate = models.DecimalField(max_digits=5, decimal_places=3,
+                                   blank=True, null=True)
+    # SyncCursor seq of last insert or status change
+    change_seq = models.BigIntegerField(default=0, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Cook and send queues only read items that are not complete,
+            # a small part of the table
+            models.Index(fields=['restaurant', 'status', 'id'], name='orderitem_open_idx',
+                         condition=~models.Q(status='COMPLETE')),
+        ]
 
     def __str__(self):
         return str(self.id)
@@ -266,9 +304,126 @@ class Request(models.Model):
     Temporary model for request sent by customer
     """
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    # Same as request option's restaurant, stored so queues are read without a join
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
     request_option = models.ForeignKey(RequestOption, on_delete=models.CASCADE)
     request_time = models.DateTimeField(default=timezone.now)
     table = models.IntegerField()
+    # SyncCursor seq of insert
+    change_seq = models.BigIntegerField(default=0, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Customer can only have one open request per option
+            models.Index(fields=['customer', 'request_option'], name='request_cust_option_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.id)
+
+
+class DailyRestaurantSummary(models.Model):
+    """
+    Totals of a restaurant's paid orders on one day of the restaurant's
+    timezone, kept up to date by swickapp.finance
+    """
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
+    date = models.DateField()
+    order_count = models.IntegerField(default=0)
+    gross_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_tax = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_tip = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    stripe_fees = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Orders whose Stripe fee is not reconciled yet and not in stripe_fees
+    pending_fee_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('restaurant', 'date')
+
+    def __str__(self):
+        return str(self.date)
+
+
+class SyncCursor(models.Model):
+    """
+    Change sequence of a restaurant's order items and requests, kept apart
+    from Restaurant so saving a restaurant never writes back an old number
+    """
+    restaurant = models.OneToOneField(Restaurant, on_delete=models.CASCADE,
+                                      primary_key=True, related_name='sync_cursor')
+    # Last change sequence number handed out to order items and requests
+    seq = models.BigIntegerField(default=0)
+    # Tombstones up to this sequence number have been pruned
+    pruned_seq = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.restaurant_id)
+
+
+class SyncTombstone(models.Model):
+    """
+    Order item or request deleted from a restaurant's queues, kept so
+    servers syncing from an older cursor can drop it
+    """
+    ORDER_ITEM = 'ORDER_ITEM'
+    REQUEST = 'REQUEST'
+    KIND_CHOICES = [
+        (ORDER_ITEM, "Order item"),
+        (REQUEST, "Request"),
+    ]
+
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    change_seq = models.BigIntegerField()
+    deleted_time = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['restaurant', 'change_seq'],
+                         name='synctombstone_seq_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.id)
+
+
+class PaymentJob(models.Model):
+    """
+    Queued card payment for an order placed through the asynchronous
+    payment pipeline
+    """
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    COMPLETE = 'COMPLETE'
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (COMPLETE, "Complete"),
+    ]
+
+    # Not a foreign key since order is deleted when payment fails
+    # and the result still needs to be available to the customer
+    order_id = models.IntegerField(unique=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
+    payment_method_id = models.CharField(max_length=255)
+    amount = models.IntegerField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES,
+                              default=PENDING)
+    attempts = models.IntegerField(default=0)
+    created_time = models.DateTimeField(default=timezone.now)
+    # Job is not claimed by a worker before this time
+    available_time = models.DateTimeField(default=timezone.now)
+    claimed_time = models.DateTimeField(blank=True, null=True)
+    # Response content of payment attempt
+    result = JSONField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_time'], name='paymentjob_queue_idx',
+                         condition=~models.Q(status='COMPLETE')),
+        ]
 
     def __str__(self):
         return str(self.id)
@@ -0,0 +1,162 @@
+import csv
+from itertools import islice
+
+import pytz
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+
+from .models import OrderItem, OrderItemCustomization
+from .order_history import get_order_history
+from .responses import encode_json
+from .restaurant_cache import get_restaurant_metadata
+
+"""
+ORDER EXPORT
+Exports a range of a restaurant's paid orders with their items and
+customizations as CSV, one row per order item, or NDJSON, one line per order.
+Orders are read with a server side cursor ORDER_EXPORT_CHUNK_SIZE at a time,
+and the items and customizations of each chunk are loaded with one query each,
+so memory does not grow with the range and a year of orders streams in as
+many chunks as it takes. Times are in the restaurant's timezone. CSV text
+cells a spreadsheet would run as a formula are prefixed with '.
+"""
+
+CSV = "csv"
+NDJSON = "ndjson"
+CONTENT_TYPES = {
+    CSV: "text/csv",
+    NDJSON: "application/x-ndjson",
+}
+
+CSV_HEADER = ["order_id", "order_time", "status", "table", "customer", "subtotal", "tax",
+              "tip", "total", "stripe_fee", "item_id", "meal_name", "meal_price", "quantity",
+              "item_total", "tax_category", "tax_rate", "customizations"]
+
+
+# Text starting with these is run as a formula by spreadsheet apps, which
+# skip a leading tab or carriage return before reading the formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class Echo:
+    """
+    File-like object csv.writer writes to that returns each row
+    """
+
+    def write(self, value):
+        return value
+
+
+def iterate_order_chunks(orders, chunk_size):
+    """
+    Yield lists of up to chunk_size orders with their items and
+    customizations loaded
+    """
+    # prefetch_related is ignored by iterator(), so it is done per chunk
+    items = OrderItem.objects.order_by("id").prefetch_related(
+        Prefetch("order_item_cust", queryset=OrderItemCustomization.objects.order_by("id")))
+    rows = orders.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        prefetch_related_objects(chunk, Prefetch("order_item", queryset=items))
+        yield chunk
+
+
+def get_order_fields(order, tz):
+    return {
+        "id": order.id,
+        "order_time": order.order_time.astimezone(tz).isoformat(),
+        "status": order.status,
+        "table": order.table,
+        "customer": str(order.customer) if order.customer is not None else None,
+        "subtotal": order.subtotal,
+        "tax": order.tax,
+        "tip": order.tip,
+        "total": order.total,
+        "stripe_fee": order.stripe_fee,
+    }
+
+
+def get_item_fields(item):
+    return {
+        "id": item.id,
+        "meal_name": item.meal_name,
+        "meal_price": item.meal_price,
+        "quantity": item.quantity,
+        "total": item.total,
+        "tax_category": item.tax_category_name,
+        "tax_rate": item.tax_rate,
+        "customizations": [{
+            "name": cust.customization_name,
+            "options": [{"name": option, "price_addition": addition}
+                        for option, addition in zip(cust.options, cust.price_additions)],
+        } for cust in item.order_item_cust.all()],
+    }
+
+
+def format_customizations(customizations):
+    """
+    Return customizations as text, e.g. 'Size: 16" (+1.00); Extras: Olives (+0.50)'
+    """
+    return "; ".join("{name}: {options}".format(
+        name=cust["name"],
+        options=", ".join("{name} (+{addition})".format(
+            name=option["name"], addition=option["price_addition"])
+            for option in cust["options"]))
+        for cust in customizations)
+
+
+def escape_cell(value):
+    """
+    Return value with text that would be read as a formula prefixed by '
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def iterate_csv(chunks, tz):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for chunk in chunks:
+        rows = []
+        for order in chunk:
+            # Columns in CSV_HEADER order
+            order_row = list(get_order_fields(order, tz).values())
+            items = [get_item_fields(item) for item in order.order_item.all()]
+            if not items:
+                rows.append(writer.writerow(
+                    [escape_cell(value) for value in order_row] +
+                    [None] * (len(CSV_HEADER) - len(order_row))))
+            for item in items:
+                item["customizations"] = format_customizations(item["customizations"])
+                rows.append(writer.writerow(
+                    [escape_cell(value) for value in order_row + list(item.values())]))
+        yield "".join(rows)
+
+
+def iterate_ndjson(chunks, tz):
+    for chunk in chunks:
+        lines = []
+        for order in chunk:
+            data = get_order_fields(order, tz)
+            data["items"] = [get_item_fields(item) for item in order.order_item.all()]
+            lines.append(encode_json(data).decode() + "\n")
+        yield "".join(lines)
+
+
+def export_orders(restaurant_id, start_time, end_time, export_format):
+    """
+    Return iterator of text chunks of restaurant's paid orders in the
+    inclusive range in export_format
+    """
+    tz = pytz.timezone(get_restaurant_metadata(restaurant_id).timezone)
+    chunks = iterate_order_chunks(get_order_history(restaurant_id, start_time, end_time),
+                                  settings.ORDER_EXPORT_CHUNK_SIZE)
+    if export_format == CSV:
+        return iterate_csv(chunks, tz)
+    if export_format == NDJSON:
+        return iterate_ndjson(chunks, tz)
+    raise ValueError("Unknown export format {format}".format(format=export_format))
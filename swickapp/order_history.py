@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+
+from .models import Order, OrderItem
+
+"""
+ORDER HISTORY
+The restaurant dashboard lists a range's orders by (order_time, id) one page
+at a time. The next page starts after a cursor made of the last order's
+order_time and id, so every page is read from order_rest_time_idx no matter
+how deep into the range it is, and orders placed while paging never shift a
+page. Customers come with their users in the same query and item counts from
+a correlated subquery, so a page is one query and can also be read with
+iterator() when a whole range is streamed.
+"""
+
+
+def get_order_history(restaurant_id, start_time, end_time):
+    """
+    Return restaurant's paid orders in the inclusive range ordered by
+    order_time and id, with customer users loaded and item_count
+    """
+    item_count = OrderItem.objects.filter(order=OuterRef("pk")).order_by().values(
+        "order").annotate(count=Count("id")).values("count")
+    return Order.objects.filter(
+        restaurant_id=restaurant_id,
+        order_time__range=(start_time, end_time)
+    ).exclude(status=Order.PROCESSING).select_related("customer__user").annotate(
+        item_count=Subquery(item_count, output_field=IntegerField())
+    ).order_by("order_time", "id")
+
+
+def encode_cursor(order):
+    return "{time}_{id}".format(time=order.order_time.isoformat(), id=order.id)
+
+
+def decode_cursor(cursor):
+    """
+    Return order_time and id of cursor
+    Raise ValueError if cursor is invalid
+    """
+    order_time, _, order_id = cursor.rpartition("_")
+    order_time = datetime.fromisoformat(order_time)
+    if order_time.tzinfo is None:
+        raise ValueError("cursor time has no timezone")
+    return order_time, int(order_id)
+
+
+def get_order_page(orders, after, page_size):
+    """
+    Return list of up to page_size orders of orders after cursor after,
+    None for the first page, and cursor of the next page, None on the last
+    """
+    if after is not None:
+        order_time, order_id = decode_cursor(after)
+        orders = orders.filter(Q(order_time__gt=order_time) |
+                               Q(order_time=order_time, id__gt=order_id))
+    page = list(orders[:page_size + 1])
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    return page, encode_cursor(page[-1])
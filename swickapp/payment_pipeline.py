@@ -0,0 +1,166 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .apis_helper import (PaymentResult, attempt_stripe_payment,
+                          finalize_order_payment)
+from .models import Order, PaymentJob
+from .sync import delete_order
+
+"""
+ASYNCHRONOUS PAYMENT PIPELINE
+When PAYMENT_PIPELINE_ASYNC is set, place_order persists the order as
+PROCESSING, creates a PaymentJob and returns right away. The job is handed to
+the backend in PAYMENT_QUEUE_BACKEND once the order is committed. Results reach
+the client through the 'order-placed' pusher event or get_payment_status.
+A job that cannot charge the card, e.g. after PAYMENT_JOB_MAX_ATTEMPTS Stripe
+API errors, deletes its order like a declined card and reports payment_failed.
+"""
+
+
+def enqueue_order_payment(order, payment_method_id):
+    """
+    Create payment job for order and hand it to the queue backend
+    once the job is committed
+    Must be called inside the transaction that creates the order
+    """
+    job = PaymentJob.objects.create(
+        order_id=order.id,
+        customer=order.customer,
+        restaurant_id=order.restaurant_id,
+        payment_method_id=payment_method_id,
+        amount=int(order.total * 100)
+    )
+    backend = get_payment_queue_backend()
+    transaction.on_commit(lambda: backend.enqueue(job))
+    return job
+
+
+def get_payment_queue_backend():
+    return import_string(settings.PAYMENT_QUEUE_BACKEND)()
+
+
+class DatabaseQueueBackend:
+    """
+    Jobs stay in the PaymentJob table until they are claimed by the
+    run_payment_worker management command
+    """
+
+    def enqueue(self, job):
+        pass
+
+
+class ImmediateBackend:
+    """
+    Runs jobs in the web process as soon as they are committed
+    Intended for development and tests
+    """
+
+    def enqueue(self, job):
+        for claimed_job in claim_payment_jobs(job_ids=[job.id]):
+            run_payment_job(claimed_job)
+
+
+def claim_payment_jobs(limit=10, job_ids=None):
+    """
+    Claim due jobs, skipping jobs locked by other workers
+    Jobs left running by a crashed worker are claimed again after
+    PAYMENT_JOB_TIMEOUT seconds
+    """
+    now = timezone.now()
+    stale_time = now - timedelta(seconds=settings.PAYMENT_JOB_TIMEOUT)
+    jobs = PaymentJob.objects.select_for_update(skip_locked=True).filter(
+        Q(status=PaymentJob.PENDING, available_time__lte=now) |
+        Q(status=PaymentJob.RUNNING, claimed_time__lt=stale_time)
+    )
+    if job_ids is not None:
+        jobs = jobs.filter(id__in=job_ids)
+    with transaction.atomic():
+        jobs = list(jobs.order_by("available_time")[:limit])
+        PaymentJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            status=PaymentJob.RUNNING,
+            claimed_time=now,
+            attempts=F("attempts") + 1
+        )
+    for job in jobs:
+        job.status = PaymentJob.RUNNING
+        job.claimed_time = now
+        job.attempts += 1
+    return jobs
+
+
+def run_payment_job(job):
+    """
+    Charge card for job and update order with result
+    Failed Stripe API calls are retried with exponential backoff
+    """
+    try:
+        order = Order.objects.select_related("customer__user").get(
+            id=job.order_id, status=Order.PROCESSING)
+    except Order.DoesNotExist:
+        complete_finished_payment_job(job)
+        return
+
+    customer = order.customer
+    result = attempt_stripe_payment(job.restaurant_id,
+                                    customer.stripe_cust_id,
+                                    customer.user.email,
+                                    job.payment_method_id,
+                                    job.amount,
+                                    {'order_id': order.id, 'customer_id': customer.id},
+                                    # Stripe returns the original result if a
+                                    # retried attempt was already processed
+                                    idempotency_key="order-{id}".format(id=order.id))
+    if result.status == "stripe_api_error" and job.attempts < settings.PAYMENT_JOB_MAX_ATTEMPTS:
+        job.status = PaymentJob.PENDING
+        job.available_time = timezone.now() + timedelta(seconds=2 ** job.attempts)
+        job.save(update_fields=["status", "available_time"])
+        return
+
+    if result.status != "success":
+        delete_order(order)
+        complete_payment_job(job, {"status": "payment_failed"})
+        return
+
+    finalize_order_payment(order, result)
+    complete_payment_job(job, result.as_dict())
+
+
+def complete_payment_job(job, content):
+    job.status = PaymentJob.COMPLETE
+    job.result = content
+    job.save(update_fields=["status", "result"])
+
+
+def complete_finished_payment_job(job):
+    """
+    Complete job whose order is no longer processing
+    An earlier run of a reclaimed job may have finalized the order, its
+    result is kept or, if it was not saved, read from the order
+    """
+    with transaction.atomic():
+        job = PaymentJob.objects.select_for_update().get(id=job.id)
+        if job.status == PaymentJob.COMPLETE:
+            return
+        order = Order.objects.filter(id=job.order_id).first()
+        if order is None:
+            # Declined orders are deleted
+            content = {"status": "order_does_not_exist"}
+        else:
+            content = PaymentResult("success", intent_status="succeeded",
+                                    payment_intent=order.stripe_payment_id).as_dict()
+        complete_payment_job(job, content)
+
+
+def process_payment_jobs(limit=10):
+    """
+    Claim and run due jobs and return number of jobs run
+    """
+    jobs = claim_payment_jobs(limit)
+    for job in jobs:
+        run_payment_job(job)
+    return len(jobs)
@@ -0,0 +1,116 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from .models import Customization, Meal, OrderItem, OrderItemCustomization
+
+
+class PricingError(Exception):
+    """
+    Raised when a cart cannot be priced
+    content is returned to the client as the response body
+    """
+
+    def __init__(self, status, **extra):
+        super().__init__(status)
+        self.content = dict(extra, status=status)
+
+
+class PricedOrder:
+    """
+    Cart validated and priced in memory
+    items is a list of (unsaved OrderItem, [unsaved OrderItemCustomization])
+    """
+
+    def __init__(self):
+        self.items = []
+        self.subtotal = Decimal(0)
+        self.tax = Decimal(0)
+
+    def add_item(self, order_item, customizations, tax_rate):
+        self.items.append((order_item, customizations))
+        self.subtotal += order_item.total
+        self.tax += (tax_rate / 100) * order_item.total
+
+    @property
+    def rounded_tax(self):
+        return self.tax.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def price_order(restaurant_id, order_items):
+    """
+    Validate and price a cart from the customer app
+    Every referenced meal and customization is loaded with one query each,
+    so the number of queries does not depend on the size of the cart
+    """
+    meal_ids = set()
+    cust_ids = set()
+    for item in order_items:
+        meal_ids.add(int(item["meal_id"]))
+        for cust in item["customizations"]:
+            cust_ids.add(int(cust["customization_id"]))
+    meals = Meal.objects.select_related(
+        "category", "tax_category").in_bulk(meal_ids)
+    customizations = Customization.objects.in_bulk(cust_ids)
+
+    priced_order = PricedOrder()
+    for item in order_items:
+        meal = meals.get(int(item["meal_id"]))
+        if meal is None or meal.category.restaurant_id != int(restaurant_id):
+            raise PricingError("meal_does_not_exist")
+        if not meal.enabled:
+            raise PricingError("meal_disabled", meal_name=meal.name)
+
+        order_item = OrderItem(
+            meal_name=meal.name,
+            meal_price=meal.price,
+            quantity=item["quantity"],
+            tax_category_name=meal.tax_category.name,
+            tax_rate=meal.tax_category.tax,
+        )
+        # Variable for calculating price of one meal in order item
+        meal_total = meal.price
+        order_item_custs = []
+        for cust in item["customizations"]:
+            cust_object = customizations.get(int(cust["customization_id"]))
+            if cust_object is None or cust_object.meal_id != meal.id:
+                raise PricingError("customization_does_not_exist")
+            # Build options and price_additions arrays with option indices
+            options = []
+            price_additions = []
+            for opt_idx in cust["options"]:
+                if not 0 <= opt_idx < len(cust_object.options):
+                    raise PricingError("invalid_option")
+                options.append(cust_object.options[opt_idx])
+                price_additions.append(cust_object.price_additions[opt_idx])
+                meal_total += cust_object.price_additions[opt_idx]
+            order_item_custs.append(OrderItemCustomization(
+                customization_name=cust_object.name,
+                options=options,
+                price_additions=price_additions
+            ))
+        order_item.total = meal_total * order_item.quantity
+        priced_order.add_item(order_item, order_item_custs,
+                              order_item.tax_rate)
+    return priced_order
+
+
+def create_order_items(order, priced_order):
+    """
+    Write order items and their customizations with one INSERT each
+    Must be called inside the transaction that creates the order
+    Items take change sequence numbers once the order is paid
+    """
+    order_items = []
+    for order_item, _ in priced_order.items:
+        order_item.order = order
+        order_item.restaurant_id = order.restaurant_id
+        order_items.append(order_item)
+    # Primary keys are set on bulk created objects on PostgreSQL
+    OrderItem.objects.bulk_create(order_items)
+
+    order_item_custs = []
+    for order_item, custs in priced_order.items:
+        for cust in custs:
+            cust.order_item = order_item
+            order_item_custs.append(cust)
+    OrderItemCustomization.objects.bulk_create(order_item_custs)
+    return order_items
@@ -1,11 +1,15 @@
+import threading
+from contextlib import contextmanager
 from enum import Enum
 
 import pusher
 from django.conf import settings
-from swick.settings import (TESTING, PUSHER_APP_ID, PUSHER_CLUSTER, PUSHER_KEY,
-                            PUSHER_SECRET)
+from django.db import transaction
 
+from .event_bus import CoalescingEventBus
+from .event_dispatcher import get_event_dispatcher
 from .models import OrderItem, Server
+from .realtime import get_realtime_backend
 from .serializers import (OrderItemSerializer, OrderItemToCookSerializer,
                           OrderItemToSendSerializer, OrderSerializer,
                           RequestSerializer)
@@ -21,6 +25,7 @@ SUBSCRIPTION LAYOUT
 Customer channels can receive following events:
     'order-status-updated'
     'item-status-updated'
+    'items-status-updated'
 
 Server channels can receive following events:
     'restaurant-added'
@@ -28,11 +33,37 @@ Server channels can receive following events:
 Restaurant channels can receive following events:
     'order-placed'
     'order-status-updated'
+    'item-status-updated'
+    'items-status-updated'
     'request-made'
     'request-deleted'
     'tip-added'
+
+==  Delivery ===================================================================
+Events are queued once the current transaction commits, and dropped if it is
+rolled back. Events queued while PusherBatchMiddleware handles a request are
+collected until the response is ready. Queued events are handed to the event
+dispatcher, which sends them in the background with the backend in
+REALTIME_BACKEND (see swickapp.realtime). PusherBackend uses Pusher's batch
+trigger endpoint, PUSHER_BATCH_SIZE events per call, with one process-wide
+client whose HTTP session is kept alive between calls.
+
+Item and order status events pass through the coalescing event bus first, which
+holds them for EVENT_BUS_WINDOW seconds per channel and merges a burst into
+'items-status-updated' events of up to EVENT_BUS_MAX_ITEMS items each, followed
+by the latest 'order-status-updated' of each order. A lone item event is sent
+unchanged. Every 'items-status-updated' event, merged or not, has data
+{"order_items": [...]} with the fields of an 'item-status-updated' event's data
+on each entry, order_id included, since merged entries can span orders.
 """
 
+_pusher_client = None
+_pusher_client_lock = threading.Lock()
+_event_bus = None
+_event_bus_lock = threading.Lock()
+# Events collected by batch_pusher_events in the current thread
+_batch = threading.local()
+
 
 def send_event_order_placed(order):
     order_serialized = OrderSerializer(order).data
@@ -51,7 +82,7 @@ def send_event_order_placed(order):
 
 
 def send_event_order_status_updated(order):
-    trigger_pusher_event([get_customer_channel(order.customer.id), get_restaurant_channel(order.restaurant.id)],
+    trigger_pusher_event([get_customer_channel(order.customer_id), get_restaurant_channel(order.restaurant_id)],
                          "order-status-updated",
                          {"order_id": order.id, "new_status": order.get_status_display()})
 
@@ -64,11 +95,35 @@ def send_event_item_status_updated(item):
     else:
         serialized = OrderItemSerializer(item).data
 
-    trigger_pusher_event([get_customer_channel(item.order.customer.id), get_restaurant_channel(item.order.restaurant.id)],
+    trigger_pusher_event([get_customer_channel(item.order.customer_id), get_restaurant_channel(item.restaurant_id)],
                          "item-status-updated",
                          {"order_item": serialized, "id": item.id, "order_id": item.order.id, "status": item.status})
 
 
+def send_event_items_status_updated(order, items):
+    """
+    One event for all items of order updated together
+    Items need order__customer__user and order_item_cust loaded
+    """
+    order_items = []
+    for item in items:
+        if item.status == OrderItem.COOKING:
+            serialized = OrderItemToCookSerializer(item).data
+        elif item.status == OrderItem.SENDING:
+            serialized = OrderItemToSendSerializer(item).data
+        else:
+            serialized = OrderItemSerializer(item).data
+        order_items.append({"order_item": serialized, "id": item.id, "order_id": order.id,
+                            "status": item.status})
+
+    channels = [get_restaurant_channel(order.restaurant_id)]
+    if order.customer_id is not None:
+        channels.insert(0, get_customer_channel(order.customer_id))
+    trigger_pusher_event(channels,
+                         "items-status-updated",
+                         {"order_items": order_items})
+
+
 def send_event_tip_added(order):
     event = "tip-added-order-{id}".format(id=order.id)
     trigger_pusher_event([get_customer_channel(order.customer.id), get_restaurant_channel(order.restaurant.id)],
@@ -100,15 +155,103 @@ def send_event_restaurant_added(server):
 # HELPER FUNCTIONS
 
 
+def get_pusher_client():
+    """
+    Return process-wide pusher client, creating it on first use
+    """
+    global _pusher_client
+    with _pusher_client_lock:
+        if _pusher_client is None:
+            _pusher_client = pusher.Pusher(
+                app_id=settings.PUSHER_APP_ID,
+                key=settings.PUSHER_KEY,
+                secret=settings.PUSHER_SECRET,
+                cluster=settings.PUSHER_CLUSTER,
+                host=settings.PUSHER_HOST,
+                port=settings.PUSHER_PORT,
+                ssl=settings.PUSHER_SSL
+            )
+        return _pusher_client
+
+
+def reset_pusher_client():
+    """
+    Drop process-wide pusher client so the next call creates a new one
+    """
+    global _pusher_client
+    with _pusher_client_lock:
+        _pusher_client = None
+
+
+@contextmanager
+def batch_pusher_events():
+    """
+    Collect events queued inside the block and dispatch them together on exit
+    Nested blocks are dispatched with the outermost block
+    """
+    if getattr(_batch, "events", None) is not None:
+        yield
+        return
+    _batch.events = []
+    try:
+        yield
+    finally:
+        events = _batch.events
+        _batch.events = None
+        if events:
+            get_event_bus().publish(events)
+
+
+def get_event_bus():
+    """
+    Return process-wide event bus, creating it on first use
+    """
+    global _event_bus
+    with _event_bus_lock:
+        if _event_bus is None:
+            _event_bus = CoalescingEventBus(settings.EVENT_BUS_WINDOW,
+                                            settings.EVENT_BUS_MAX_ITEMS,
+                                            dispatch_pusher_events)
+        return _event_bus
+
+
+def dispatch_pusher_events(events):
+    get_event_dispatcher().submit(get_realtime_backend().send_batch, events)
+
+
+def send_pusher_batch(events):
+    """
+    Send events PUSHER_BATCH_SIZE at a time
+    If a chunk fails, the chunks already sent are removed from events so
+    retrying the delivery only sends the rest
+    """
+    client = get_pusher_client()
+    batch_size = settings.PUSHER_BATCH_SIZE
+    for i in range(0, len(events), batch_size):
+        try:
+            client.trigger_batch(events[i:i + batch_size])
+        except Exception:
+            del events[:i]
+            raise
+
+
 def trigger_pusher_event(channels, event, data):
-    if not TESTING:
-        pusher_client = pusher.Pusher(
-            app_id=PUSHER_APP_ID,
-            key=PUSHER_KEY,
-            secret=PUSHER_SECRET,
-            cluster=PUSHER_CLUSTER
-        )
-        pusher_client.trigger(channels, event, data)
+    if not settings.PUSHER_ENABLED:
+        return
+    if isinstance(channels, str):
+        channels = [channels]
+    # Events are sent to one channel each
+    events = [{"channel": channel, "name": event, "data": data}
+              for channel in channels]
+    transaction.on_commit(lambda: queue_pusher_events(events))
+
+
+def queue_pusher_events(events):
+    batch = getattr(_batch, "events", None)
+    if batch is None:
+        get_event_bus().publish(events)
+    else:
+        batch.extend(events)
 
 
 def get_customer_channel(customer_id):
@@ -0,0 +1,133 @@
+import hashlib
+import hmac
+import json
+import logging
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.utils.module_loading import import_string
+
+"""
+REALTIME BACKENDS
+Events queued by pusher_events are delivered by the backend in
+REALTIME_BACKEND, which also signs channel subscriptions for the pusher_auth
+apis. Backends implement:
+    send_batch(events)
+        Deliver list of {"channel", "name", "data"} events
+    authenticate(channel, socket_id)
+        Return {"auth": ...} allowing socket_id to subscribe to channel
+
+PusherBackend sends events through the hosted Pusher service. Both backends
+sign subscriptions locally with Pusher's HMAC scheme, using an HMAC keyed with
+PUSHER_SECRET that is prepared once per process and copied for each signature.
+
+WebSocketBackend sends events to clients connected to the WebSocket server in
+swickapp.realtime_server, served by swick.asgi. The server speaks the subset
+of the Pusher protocol the apps use, with the same channels and the same
+subscription signatures, so clients only need to point at a different host.
+With REALTIME_FANOUT set to 'postgres', events are published with NOTIFY on
+REALTIME_NOTIFY_CHANNEL and every ASGI worker forwards them to its own
+sockets. With 'local', events go straight to the sockets of the current
+process, which is enough for a single ASGI process such as a load test.
+"""
+
+logger = logging.getLogger(__name__)
+
+# Largest NOTIFY payload accepted by Postgres is 8000 bytes
+NOTIFY_MAX_BYTES = 7999
+SOCKET_ID_PATTERN = re.compile(r"^\d+\.\d+$")
+CHANNEL_PATTERN = re.compile(r"^private-(customer|server|restaurant)-\d+$")
+
+
+@lru_cache(maxsize=None)
+def get_subscription_hmac(secret):
+    """
+    Return HMAC keyed with secret, to be copied before use
+    """
+    return hmac.new(secret.encode(), digestmod=hashlib.sha256)
+
+
+@lru_cache(maxsize=None)
+def load_realtime_backend(path):
+    return import_string(path)()
+
+
+def get_realtime_backend():
+    return load_realtime_backend(settings.REALTIME_BACKEND)
+
+
+def sign_subscription(channel, socket_id):
+    """
+    Return Pusher signature allowing socket_id to subscribe to channel
+    """
+    if not SOCKET_ID_PATTERN.match(socket_id):
+        raise ValueError("Invalid socket id: " + socket_id)
+    if not CHANNEL_PATTERN.match(channel):
+        raise ValueError("Invalid channel: " + channel)
+    signer = get_subscription_hmac(settings.PUSHER_SECRET).copy()
+    signer.update("{socket_id}:{channel}".format(socket_id=socket_id, channel=channel).encode())
+    return "{key}:{signature}".format(key=settings.PUSHER_KEY, signature=signer.hexdigest())
+
+
+def verify_subscription(channel, socket_id, auth):
+    try:
+        return hmac.compare_digest(sign_subscription(channel, socket_id), auth)
+    except (ValueError, TypeError):
+        return False
+
+
+class PusherBackend:
+    def send_batch(self, events):
+        # Imported here since pusher_events hands its events to this module
+        from .pusher_events import send_pusher_batch
+        send_pusher_batch(events)
+
+    def authenticate(self, channel, socket_id):
+        return {"auth": sign_subscription(channel, socket_id)}
+
+
+class WebSocketBackend:
+    def send_batch(self, events):
+        if settings.REALTIME_FANOUT == "local":
+            from .realtime_server import get_hub
+            hub = get_hub()
+            # Process serves no sockets
+            if hub is not None:
+                hub.publish_threadsafe(events)
+            return
+        for payload in get_notify_payloads(events):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)",
+                               [settings.REALTIME_NOTIFY_CHANNEL, payload])
+
+    def authenticate(self, channel, socket_id):
+        return {"auth": sign_subscription(channel, socket_id)}
+
+
+def get_notify_payloads(events):
+    """
+    Split events into JSON arrays that fit in a NOTIFY payload
+    Events too large for a payload on their own are logged and dropped
+    """
+    payloads = []
+    batch = []
+    size = 2
+    for event in events:
+        encoded = json.dumps(event, separators=(",", ":"), cls=DjangoJSONEncoder)
+        length = len(encoded.encode())
+        if length + 2 > NOTIFY_MAX_BYTES:
+            logger.error("Event %s to %s is too large for NOTIFY, dropped",
+                         event["name"], event["channel"])
+            continue
+        if batch and size + length + 1 > NOTIFY_MAX_BYTES:
+            payloads.append("[" + ",".join(batch) + "]")
+            batch = []
+            size = 2
+        batch.append(encoded)
+        size += length + 1
+    if batch:
+        payloads.append("[" + ",".join(batch) + "]")
+    return payloads
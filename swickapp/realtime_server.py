@@ -0,0 +1,232 @@
+import asyncio
+import json
+import logging
+import secrets
+import select
+import threading
+
+import psycopg2
+from django.conf import settings
+from django.db import connections
+from psycopg2 import sql
+
+from . import metrics
+from .realtime import verify_subscription
+
+"""
+WEBSOCKET SERVER
+Serves the WebSocketBackend from swick.asgi. Clients connect to
+/app/<PUSHER_KEY> and exchange Pusher protocol messages:
+    pusher:connection_established   server -> client, carries socket_id
+    pusher:subscribe                client -> server, channel and auth from
+                                    the pusher_auth apis
+    pusher_internal:subscription_succeeded
+    pusher:unsubscribe
+    pusher:ping / pusher:pong
+    pusher:error
+Events are sent as {"event", "channel", "data"} with data encoded as JSON.
+
+Each ASGI process keeps one ChannelHub mapping channels to its sockets. With
+'postgres' fan-out, the hub listens on REALTIME_NOTIFY_CHANNEL in a
+background thread so events sent by any process reach every socket. A socket
+that falls REALTIME_SOCKET_MAX_QUEUE messages behind is closed, and the client
+catches up through the sync api after reconnecting.
+"""
+
+logger = logging.getLogger(__name__)
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+class ChannelHub:
+    """
+    Sockets of this process by channel
+    Methods other than publish_threadsafe must run on loop
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.listening = threading.Event()
+        self._subscribers = {}
+        self._stopped = threading.Event()
+
+    def subscribe(self, channel, socket):
+        self._subscribers.setdefault(channel, set()).add(socket)
+
+    def unsubscribe(self, channel, socket):
+        sockets = self._subscribers.get(channel)
+        if sockets is not None:
+            sockets.discard(socket)
+            if not sockets:
+                del self._subscribers[channel]
+
+    def publish(self, events):
+        for event in events:
+            sockets = self._subscribers.get(event["channel"])
+            if not sockets:
+                continue
+            # Encoded once for all sockets of channel
+            message = encode_message(event["name"], event["data"], event["channel"])
+            for socket in list(sockets):
+                socket.deliver(message)
+            metrics.increment("realtime.messages_delivered", len(sockets))
+
+    def publish_threadsafe(self, events):
+        self.loop.call_soon_threadsafe(self.publish, events)
+
+    def start_listener(self):
+        threading.Thread(target=self._listen, name="realtime-listener", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _listen(self):
+        """
+        Forward events notified by any process to this process's sockets,
+        reconnecting after database errors
+        """
+        while not self._stopped.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**connections["default"].get_connection_params())
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(sql.SQL("LISTEN {}").format(
+                        sql.Identifier(settings.REALTIME_NOTIFY_CHANNEL)))
+                self.listening.set()
+                while not self._stopped.is_set():
+                    if select.select([conn], [], [], 1) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.publish_threadsafe(json.loads(conn.notifies.pop(0).payload))
+            except psycopg2.Error:
+                self.listening.clear()
+                logger.exception("Realtime listener lost its connection")
+                self._stopped.wait(1)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+def get_hub():
+    """
+    Return hub of this process, None if it serves no sockets
+    """
+    return _hub
+
+
+def start_hub(loop):
+    """
+    Return hub of this process, creating it for loop on first use
+    """
+    global _hub
+    with _hub_lock:
+        if _hub is None or _hub.loop is not loop:
+            if _hub is not None:
+                _hub.stop()
+            _hub = ChannelHub(loop)
+            if settings.REALTIME_FANOUT == "postgres":
+                _hub.start_listener()
+        return _hub
+
+
+def encode_message(event, data, channel=None):
+    message = {"event": event, "data": json.dumps(data)}
+    if channel is not None:
+        message["channel"] = channel
+    return json.dumps(message)
+
+
+class Socket:
+    def __init__(self):
+        self.socket_id = "{}.{}".format(secrets.randbelow(10 ** 9), secrets.randbelow(10 ** 9))
+        self.channels = set()
+        self._queue = asyncio.Queue(maxsize=settings.REALTIME_SOCKET_MAX_QUEUE)
+        self._closing = False
+
+    def deliver(self, message):
+        if self._closing:
+            return
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Client is too slow, drop what it has not read and close
+            metrics.increment("realtime.slow_sockets_closed")
+            self._closing = True
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(None)
+
+    async def write(self, send):
+        while True:
+            message = await self._queue.get()
+            if message is None:
+                await send({"type": "websocket.close", "code": 4100})
+                return
+            await send({"type": "websocket.send", "text": message})
+
+
+def handle_client_message(hub, socket, text):
+    """
+    Apply message from client and return reply if any
+    """
+    try:
+        message = json.loads(text)
+        event = message["event"]
+        data = message.get("data") or {}
+        if isinstance(data, str):
+            data = json.loads(data)
+    except (ValueError, TypeError, KeyError):
+        return encode_message("pusher:error", {"code": 4200, "message": "Invalid message"})
+    if not isinstance(data, dict):
+        return encode_message("pusher:error", {"code": 4200, "message": "Invalid message"})
+
+    if event == "pusher:ping":
+        return encode_message("pusher:pong", {})
+    if event == "pusher:subscribe":
+        channel = data.get("channel")
+        if not verify_subscription(channel, socket.socket_id, data.get("auth")):
+            return encode_message("pusher:error", {
+                "code": 4009, "message": "Subscription to {} is not authorized".format(channel)})
+        socket.channels.add(channel)
+        hub.subscribe(channel, socket)
+        return encode_message("pusher_internal:subscription_succeeded", {}, channel)
+    if event == "pusher:unsubscribe":
+        channel = data.get("channel")
+        socket.channels.discard(channel)
+        hub.unsubscribe(channel, socket)
+    return None
+
+
+async def websocket_application(scope, receive, send):
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+    if scope["path"].rstrip("/") != "/app/{key}".format(key=settings.PUSHER_KEY):
+        await send({"type": "websocket.close", "code": 4001})
+        return
+
+    hub = start_hub(asyncio.get_event_loop())
+    socket = Socket()
+    await send({"type": "websocket.accept"})
+    socket.deliver(encode_message("pusher:connection_established", {
+        "socket_id": socket.socket_id,
+        "activity_timeout": settings.REALTIME_ACTIVITY_TIMEOUT}))
+    writer = asyncio.ensure_future(socket.write(send))
+    metrics.increment("realtime.connections")
+    try:
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message["type"] == "websocket.receive":
+                reply = handle_client_message(hub, socket, message.get("text"))
+                if reply is not None:
+                    socket.deliver(reply)
+    finally:
+        for channel in socket.channels:
+            hub.unsubscribe(channel, socket)
+        writer.cancel()
+        metrics.increment("realtime.disconnections")
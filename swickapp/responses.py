@@ -0,0 +1,84 @@
+import datetime
+import json
+import uuid
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.functional import Promise
+from django.utils.module_loading import import_string
+
+"""
+JSON RESPONSES
+API responses are encoded by the backend in JSON_ENCODER. Every backend
+encodes Decimal as a string and datetime in the REST_FRAMEWORK DATETIME_FORMAT
+(in UTC), the same as the serializers, so switching backends does not change
+responses.
+"""
+
+
+def encode_default(value):
+    """
+    Encode values that JSON has no type for
+    """
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        if timezone.is_aware(value):
+            value = value.astimezone(datetime.timezone.utc)
+        datetime_format = settings.REST_FRAMEWORK.get("DATETIME_FORMAT")
+        return value.strftime(datetime_format) if datetime_format else value.isoformat()
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, Promise)):
+        return str(value)
+    raise TypeError("Object of type {type} is not JSON serializable".format(
+        type=type(value).__name__))
+
+
+class StdlibJsonEncoder:
+    def __init__(self):
+        self._encoder = json.JSONEncoder(default=encode_default, separators=(",", ":"))
+
+    def encode(self, data):
+        return self._encoder.encode(data).encode()
+
+
+class OrjsonEncoder:
+    """
+    Requires the orjson package
+    """
+
+    def __init__(self):
+        try:
+            import orjson
+        except ImportError:
+            raise ImproperlyConfigured("OrjsonEncoder requires the orjson package")
+        self._orjson = orjson
+
+    def encode(self, data):
+        # Datetimes are passed to encode_default so they match DATETIME_FORMAT
+        return self._orjson.dumps(data, default=encode_default,
+                                  option=self._orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+@lru_cache(maxsize=None)
+def load_json_encoder(path):
+    return import_string(path)()
+
+
+def encode_json(data):
+    return load_json_encoder(settings.JSON_ENCODER).encode(data)
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    JsonResponse encoded by the JSON_ENCODER backend
+    """
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=encode_json(data), **kwargs)
@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from . import metrics
+from .models import Restaurant
+
+"""
+RESTAURANT METADATA CACHE
+Payment helpers look up a restaurant's Stripe account on every call.
+Metadata is cached per process for RESTAURANT_CACHE_TTL seconds and dropped
+explicitly whenever a restaurant is saved through RestaurantForm or sign up.
+"""
+
+RestaurantMetadata = namedtuple("RestaurantMetadata",
+                                ["id", "name", "stripe_acct_id", "timezone"])
+
+_lock = threading.Lock()
+# Map of restaurant id to (metadata, expiry time)
+_cache = {}
+
+
+def get_restaurant_metadata(restaurant_id):
+    """
+    Return cached metadata of restaurant
+    Raises Restaurant.DoesNotExist if restaurant does not exist
+    """
+    restaurant_id = int(restaurant_id)
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(restaurant_id)
+    if entry is not None and entry[1] > now:
+        metrics.increment("restaurant_cache.hits")
+        return entry[0]
+
+    metrics.increment("restaurant_cache.misses")
+    metadata = RestaurantMetadata(
+        **Restaurant.objects.values(*RestaurantMetadata._fields).get(id=restaurant_id))
+    with _lock:
+        _cache[restaurant_id] = (metadata, now + settings.RESTAURANT_CACHE_TTL)
+    return metadata
+
+
+def get_stripe_acct_id(restaurant_id):
+    return get_restaurant_metadata(restaurant_id).stripe_acct_id
+
+
+def invalidate_restaurant_metadata(restaurant_id):
+    with _lock:
+        _cache.pop(restaurant_id, None)
+
+
+def clear_restaurant_cache():
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,72 @@
+from django.db.models import CharField, F, IntegerField, Value
+from rest_framework import serializers
+
+from .models import Order, OrderItem, Request
+
+"""
+SEND QUEUE
+Order items waiting to be sent and open requests of a restaurant are read
+with one UNION ALL query, sorted and sliced by the database. Both sides
+select the same annotated columns in the same order, so the union lines up
+regardless of which model fields each side has.
+"""
+
+ORDER_ITEM = "OrderItem"
+REQUEST = "Request"
+
+
+def get_send_queue_queryset(restaurant_id):
+    """
+    Return values queryset of restaurant's send queue ordered by time and id
+    """
+    order_items = OrderItem.objects.filter(
+        restaurant_id=restaurant_id,
+        status=OrderItem.SENDING
+    ).exclude(order__status=Order.PROCESSING).annotate(
+        entry_type=Value(ORDER_ITEM, output_field=CharField()),
+        entry_order_id=F("order_id"),
+        entry_customer_name=F("order__customer__user__name"),
+        entry_table=F("order__table"),
+        entry_name=F("meal_name"),
+        entry_time=F("order__order_time"),
+    )
+    requests = Request.objects.filter(
+        restaurant_id=restaurant_id
+    ).annotate(
+        entry_type=Value(REQUEST, output_field=CharField()),
+        entry_order_id=Value(None, output_field=IntegerField()),
+        entry_customer_name=F("customer__user__name"),
+        entry_table=F("table"),
+        entry_name=F("request_option__name"),
+        entry_time=F("request_time"),
+    )
+    fields = ("id", "entry_type", "entry_order_id", "entry_customer_name",
+              "entry_table", "entry_name", "entry_time")
+    return order_items.values(*fields).union(
+        requests.values(*fields), all=True).order_by("entry_time", "id")
+
+
+def get_send_queue(restaurant_id, offset=0, limit=None):
+    """
+    Return restaurant's send queue in the shape of OrderItemToSendSerializer
+    and RequestSerializer, tagged with type
+    """
+    queryset = get_send_queue_queryset(restaurant_id)
+    rows = queryset[offset:offset + limit] if limit is not None else queryset[offset:]
+    time_field = serializers.DateTimeField()
+    queue = []
+    for row in rows:
+        entry = {
+            "id": row["id"],
+            "customer_name": row["entry_customer_name"],
+            "table": row["entry_table"],
+            "time": time_field.to_representation(row["entry_time"]),
+            "type": row["entry_type"],
+        }
+        if row["entry_type"] == ORDER_ITEM:
+            entry["order_id"] = row["entry_order_id"]
+            entry["meal_name"] = row["entry_name"]
+        else:
+            entry["request_name"] = row["entry_name"]
+        queue.append(entry)
+    return queue
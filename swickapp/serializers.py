@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from django.templatetags.static import static
 from rest_framework import serializers
 
@@ -98,8 +99,21 @@ class OrderDetailsSerializer(serializers.ModelSerializer):
         fields = ("id", "customer_name", "table", "order_time", "subtotal", "tax", "tip",
                   "total", "cooking_order_items", "sending_order_items", "complete_order_items")
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Load orders with customer name and items with customizations
+        in a fixed number of queries
+        """
+        return queryset.select_related("customer__user").prefetch_related(
+            Prefetch("order_item", queryset=OrderItem.objects.order_by("id").prefetch_related(
+                Prefetch("order_item_cust",
+                         queryset=OrderItemCustomization.objects.order_by("id")))))
+
     def get_order_items(self, order, status):
-        order_items = order.order_item.filter(status=status).order_by('id')
+        # Partition in Python so prefetched items are reused for every status
+        order_items = sorted((item for item in order.order_item.all() if item.status == status),
+                             key=lambda item: item.id)
         return OrderItemSerializer(order_items, many=True).data
 
     def get_cooking_order_items(self, instance):
@@ -113,7 +127,7 @@ class OrderDetailsSerializer(serializers.ModelSerializer):
 
 
 class OrderItemToCookSerializer(serializers.ModelSerializer):
-    order_id = serializers.ReadOnlyField(source="order.id")
+    order_id = serializers.ReadOnlyField()
     order_item_cust = OrderItemCustomizationSerializer(many=True)
 
     class Meta:
@@ -133,3 +147,27 @@ class OrderItemToSendSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = ("id", "order_id", "customer_name",
                   "table", "meal_name", "time")
+
+
+class OrderItemSyncSerializer(serializers.ModelSerializer):
+    order_id = serializers.ReadOnlyField(source="order.id")
+    customer_name = serializers.ReadOnlyField(
+        source="order.customer.user.name")
+    table = serializers.ReadOnlyField(source="order.table")
+    time = serializers.DateTimeField(source="order.order_time")
+    order_item_cust = OrderItemCustomizationSerializer(many=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ("id", "order_id", "status", "customer_name", "table",
+                  "meal_name", "quantity", "time", "order_item_cust", "change_seq")
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related("order__customer__user").prefetch_related(
+            Prefetch("order_item_cust", queryset=OrderItemCustomization.objects.order_by("id")))
+
+
+class RequestSyncSerializer(RequestSerializer):
+    class Meta(RequestSerializer.Meta):
+        fields = RequestSerializer.Meta.fields + ("change_seq",)
@@ -0,0 +1,161 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Max, Value, When
+from django.utils import timezone
+
+from .models import Order, OrderItem, Request, SyncCursor, SyncTombstone
+from .serializers import OrderItemSyncSerializer, RequestSyncSerializer
+
+"""
+QUEUE SYNC
+Every insert, status change or delete of a restaurant's order items and
+requests takes the next number of the restaurant's SyncCursor. Inserted and
+updated rows store it in change_seq, deleted rows leave a SyncTombstone with
+it. A server that has seen everything up to a cursor only needs the rows and
+tombstones with a larger number, so reconnecting costs as much as the changes
+missed, not the size of the queues.
+
+Numbers are taken with an upsert of the cursor row inside the transaction
+that writes the change, so the row stays locked until commit and changes
+become visible in sequence order. The cursor has its own table so saving a
+Restaurant loaded before a change cannot move it backwards. get_sync_changes reads the cursor before the
+changes, so it can send a change twice but never skip one.
+"""
+
+
+def next_change_seq(restaurant_id, count=1):
+    """
+    Reserve count sequence numbers of restaurant and return the first
+    Must be called inside the transaction that writes the changes
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO {table} (restaurant_id, seq, pruned_seq) VALUES (%s, %s, 0) "
+            "ON CONFLICT (restaurant_id) DO UPDATE SET seq = {table}.seq + EXCLUDED.seq "
+            "RETURNING seq".format(table=connection.ops.quote_name(SyncCursor._meta.db_table)),
+            [restaurant_id, count])
+        return cursor.fetchone()[0] - count + 1
+
+
+def mark_changed(restaurant_id, objects):
+    """
+    Set change_seq of unsaved or about to be saved order items or requests
+    """
+    seq = next_change_seq(restaurant_id, len(objects))
+    for i, obj in enumerate(objects):
+        obj.change_seq = seq + i
+
+
+def mark_order_items_changed(order):
+    """
+    Give order's items new sequence numbers, so servers sync them
+    Items of an order are only marked once it is paid
+    Must be called inside the transaction that activates the order
+    """
+    item_ids = list(OrderItem.objects.filter(order=order).order_by("id").values_list("id", flat=True))
+    if not item_ids:
+        return
+    seq = next_change_seq(order.restaurant_id, len(item_ids))
+    OrderItem.objects.filter(id__in=item_ids).update(change_seq=Case(
+        *[When(id=item_id, then=Value(seq + i)) for i, item_id in enumerate(item_ids)]))
+
+
+def record_deleted(restaurant_id, kind, object_ids):
+    """
+    Leave tombstones for deleted order items or requests
+    """
+    object_ids = list(object_ids)
+    if not object_ids:
+        return
+    seq = next_change_seq(restaurant_id, len(object_ids))
+    SyncTombstone.objects.bulk_create([
+        SyncTombstone(restaurant_id=restaurant_id, kind=kind,
+                      object_id=object_id, change_seq=seq + i)
+        for i, object_id in enumerate(object_ids)
+    ])
+
+
+def delete_order(order):
+    """
+    Delete order and leave tombstones for its order items
+    """
+    with transaction.atomic():
+        record_deleted(order.restaurant_id, SyncTombstone.ORDER_ITEM,
+                       OrderItem.objects.filter(order=order).values_list("id", flat=True))
+        order.delete()
+
+
+def delete_requests(restaurant_id, requests):
+    """
+    Delete queryset of restaurant's requests and leave tombstones for them
+    """
+    with transaction.atomic():
+        record_deleted(restaurant_id, SyncTombstone.REQUEST,
+                       requests.values_list("id", flat=True))
+        requests.delete()
+
+
+def get_sync_changes(restaurant_id, since):
+    """
+    Return order items and requests of restaurant changed after cursor since,
+    ids of those deleted after it and the new cursor
+    No cursor, one older than the pruned tombstones or one the restaurant
+    never handed out gets the full queues instead, with reset set
+    """
+    # Restaurant without changes yet has no cursor row
+    sync_seq, pruned_seq = SyncCursor.objects.filter(restaurant_id=restaurant_id).values_list(
+        "seq", "pruned_seq").first() or (0, 0)
+    reset = since is None or since < pruned_seq or since > sync_seq
+
+    order_items = OrderItem.objects.filter(restaurant_id=restaurant_id)
+    requests = Request.objects.filter(restaurant_id=restaurant_id)
+    deleted_order_items = []
+    deleted_requests = []
+    if reset:
+        # Items of unpaid orders have no sequence number yet
+        order_items = order_items.filter(
+            status__in=[OrderItem.COOKING, OrderItem.SENDING]
+        ).exclude(order__status=Order.PROCESSING)
+    else:
+        # Completed items are included so servers can remove them
+        order_items = order_items.filter(change_seq__gt=since)
+        requests = requests.filter(change_seq__gt=since)
+        for kind, object_id in SyncTombstone.objects.filter(
+                restaurant_id=restaurant_id, change_seq__gt=since).values_list("kind", "object_id"):
+            if kind == SyncTombstone.ORDER_ITEM:
+                deleted_order_items.append(object_id)
+            else:
+                deleted_requests.append(object_id)
+
+    order_items = OrderItemSyncSerializer.setup_eager_loading(order_items).order_by("id")
+    requests = requests.select_related(
+        "customer__user", "request_option").order_by("id")
+    return {
+        "order_items": OrderItemSyncSerializer(order_items, many=True).data,
+        "requests": RequestSyncSerializer(requests, many=True).data,
+        "deleted_order_items": deleted_order_items,
+        "deleted_requests": deleted_requests,
+        "cursor": sync_seq,
+        "reset": reset,
+    }
+
+
+def prune_sync_tombstones(older_than=None):
+    """
+    Delete tombstones older than SYNC_TOMBSTONE_DAYS and return number deleted
+    Servers with a cursor from before the pruned tombstones get a reset
+    """
+    if older_than is None:
+        older_than = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+    tombstones = SyncTombstone.objects.filter(deleted_time__lt=older_than)
+    pruned = 0
+    with transaction.atomic():
+        for restaurant_id, max_seq in tombstones.values_list("restaurant_id").annotate(
+                max_seq=Max("change_seq")).order_by():
+            SyncCursor.objects.filter(restaurant_id=restaurant_id, pruned_seq__lt=max_seq).update(
+                pruned_seq=max_seq)
+            pruned += tombstones.filter(restaurant_id=restaurant_id,
+                                        change_seq__lte=max_seq).delete()[0]
+    return pruned
@@ -0,0 +1,82 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import override_settings
+from swickapp.event_dispatcher import get_event_dispatcher
+from swickapp.pusher_events import get_event_bus, reset_pusher_client
+
+
+class FakePusherServer:
+    """
+    Local HTTP stand-in for the Pusher REST API
+    Records requests and points the pusher client at itself
+    Events still held or being dispatched are delivered before the block exits
+    Usage:
+        with FakePusherServer() as fake_pusher:
+            ...
+            fake_pusher.requests
+    """
+    APP_ID = "12345"
+
+    def __init__(self):
+        # List of (path, json body, client address) of received requests
+        self.requests = []
+        fake_pusher = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections alive between requests
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                fake_pusher.requests.append(
+                    (self.path.split("?")[0], json.loads(body), self.client_address))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._settings = override_settings(
+            PUSHER_ENABLED=True,
+            PUSHER_APP_ID=self.APP_ID,
+            PUSHER_KEY="key",
+            PUSHER_SECRET="secret",
+            PUSHER_CLUSTER=None,
+            PUSHER_HOST="127.0.0.1",
+            PUSHER_PORT=self._server.server_address[1],
+            PUSHER_SSL=False
+        )
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self._settings.enable()
+        reset_pusher_client()
+        return self
+
+    def __exit__(self, *args):
+        get_event_bus().flush()
+        get_event_dispatcher().join(timeout=5)
+        reset_pusher_client()
+        self._settings.disable()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def events(self, path="/apps/{app_id}/batch_events".format(app_id=APP_ID)):
+        """
+        Return (channel, name, data) of events sent through path
+        """
+        events = []
+        for request_path, body, _ in self.requests:
+            if request_path != path:
+                continue
+            for event in body.get("batch", [body]):
+                channels = [event["channel"]] if "channel" in event else event["channels"]
+                for channel in channels:
+                    events.append((channel, event["name"], json.loads(event["data"])))
+        return events
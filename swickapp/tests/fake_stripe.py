@@ -0,0 +1,172 @@
+from unittest.mock import patch
+
+import stripe
+from django.utils import timezone
+
+SUCCEEDS = "pm_card_visa"
+REQUIRES_ACTION = "pm_card_threeDSecureRequired"
+DECLINED = "pm_card_chargeDeclined"
+
+
+class FakeStripe:
+    """
+    In-memory stand-in for the Stripe API calls made by the payment helpers,
+    so payment flows can be tested offline
+    Outcome of a payment depends on the payment method id, following
+    Stripe's test payment methods:
+        pm_card_visa                    payment succeeds
+        pm_card_threeDSecureRequired    payment requires action, succeeds on confirm
+        pm_card_chargeDeclined          card is declined
+    Usage:
+        with FakeStripe() as fake_stripe:
+            fake_stripe.fail_next(1)
+            ...
+    """
+
+    def __init__(self):
+        self.payment_intents = {}
+        self.charges = {}
+        self.balance_transactions = []
+        self._payment_methods = {}
+        self._idempotent_results = {}
+        self._failures = 0
+        self._patches = [
+            patch("stripe.PaymentMethod.create", self.create_payment_method),
+            patch("stripe.PaymentIntent.create", self.create_payment_intent),
+            patch("stripe.PaymentIntent.retrieve", self.retrieve_payment_intent),
+            patch("stripe.PaymentIntent.confirm", self.confirm_payment_intent),
+            patch("stripe.Charge.retrieve", self.retrieve_charge),
+            patch("stripe.BalanceTransaction.list", self.list_balance_transactions),
+        ]
+
+    def __enter__(self):
+        for p in self._patches:
+            p.start()
+        return self
+
+    def __exit__(self, *args):
+        for p in self._patches:
+            p.stop()
+
+    def fail_next(self, count):
+        """
+        Make the next count API calls fail as if Stripe could not be reached
+        """
+        self._failures = count
+
+    def stripe_fee(self, amount):
+        # 2.9% + 30 cents
+        return round(amount * 0.029) + 30
+
+    def _request(self, idempotency_key):
+        if self._failures:
+            self._failures -= 1
+            raise stripe.error.APIConnectionError("Could not connect to Stripe")
+        return self._idempotent_results.get(idempotency_key)
+
+    def create_payment_method(self, customer, payment_method, stripe_account, idempotency_key=None):
+        result = self._request(idempotency_key)
+        if result is None:
+            result = stripe.PaymentMethod.construct_from({
+                "id": "pm_clone_{n}".format(n=len(self._payment_methods) + 1),
+                "customer": customer,
+            }, "fake_key")
+            self._payment_methods[result.id] = payment_method
+            if idempotency_key:
+                self._idempotent_results[idempotency_key] = result
+        return result
+
+    def create_payment_intent(self, amount, payment_method, stripe_account, metadata,
+                              idempotency_key=None, **params):
+        result = self._request(idempotency_key)
+        if result is not None:
+            return result
+        original_payment_method = self._payment_methods[payment_method]
+        if original_payment_method == DECLINED:
+            raise stripe.error.CardError(
+                "Your card was declined.", None, "card_declined")
+
+        intent_id = "pi_fake_{n}".format(n=len(self.payment_intents) + 1)
+        intent = stripe.PaymentIntent.construct_from({
+            "id": intent_id,
+            "amount": amount,
+            "client_secret": intent_id + "_secret",
+            "metadata": dict(metadata),
+            "status": "requires_action",
+            "charges": {"data": []},
+        }, "fake_key")
+        self.payment_intents[intent_id] = intent
+        if original_payment_method == SUCCEEDS:
+            self._succeed(intent)
+        if idempotency_key:
+            self._idempotent_results[idempotency_key] = intent
+        return intent
+
+    def retrieve_payment_intent(self, payment_intent_id, stripe_account=None, **params):
+        self._request(None)
+        return self.payment_intents[payment_intent_id]
+
+    def confirm_payment_intent(self, payment_intent_id, stripe_account=None, **params):
+        self._request(None)
+        intent = self.payment_intents[payment_intent_id]
+        if intent.status == "requires_action":
+            self._succeed(intent)
+        return intent
+
+    def retrieve_charge(self, charge_id, stripe_account=None, **params):
+        self._request(None)
+        return self.charges[charge_id]
+
+    def list_balance_transactions(self, created, limit, starting_after=None,
+                                  expand=None, stripe_account=None):
+        """
+        List balance transactions newest first, with charges expanded
+        """
+        self._request(None)
+        transactions = [t for t in reversed(self.balance_transactions)
+                        if t.created >= created["gte"]]
+        if starting_after is not None:
+            ids = [t.id for t in transactions]
+            transactions = transactions[ids.index(starting_after) + 1:]
+        return stripe.ListObject.construct_from({
+            "data": transactions[:limit],
+            "has_more": len(transactions) > limit,
+        }, "fake_key")
+
+    def add_payout(self):
+        """
+        Add balance transaction that does not belong to a charge
+        """
+        transaction = stripe.BalanceTransaction.construct_from({
+            "id": "txn_fake_{n}".format(n=len(self.balance_transactions) + 1),
+            "created": int(timezone.now().timestamp()),
+            "source": {"id": "po_fake", "object": "payout"},
+            "fee_details": [],
+        }, "fake_key")
+        self.balance_transactions.append(transaction)
+
+    def _succeed(self, intent):
+        charge_id = "ch_fake_{n}".format(n=len(self.charges) + 1)
+        transaction_id = "txn_fake_{n}".format(n=len(self.balance_transactions) + 1)
+        fee_details = [
+            {"type": "stripe_fee", "amount": self.stripe_fee(intent.amount)}
+        ]
+        charge = stripe.Charge.construct_from({
+            "id": charge_id,
+            "amount": intent.amount,
+            "payment_intent": intent.id,
+            "balance_transaction": {
+                "id": transaction_id,
+                "fee_details": fee_details,
+            },
+        }, "fake_key")
+        self.charges[charge_id] = charge
+        self.balance_transactions.append(stripe.BalanceTransaction.construct_from({
+            "id": transaction_id,
+            "created": int(timezone.now().timestamp()),
+            "source": {"id": charge_id, "object": "charge", "payment_intent": intent.id},
+            "fee_details": fee_details,
+        }, "fake_key"))
+        intent.status = "succeeded"
+        intent.charges = stripe.ListObject.construct_from(
+            {"data": [{"id": charge_id}]}, "fake_key")
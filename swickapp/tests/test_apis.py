@@ -2,6 +2,7 @@ import json
 
 from django.urls import reverse
 from rest_framework.test import APITestCase
+from swickapp.metrics import increment
 from swickapp.models import User
 
 
@@ -43,3 +44,19 @@ class APITest(APITestCase):
         self.assertEqual(resp.status_code, 200)
         content = json.loads(resp.content)
         self.assertEqual(content['status'], 'email_already_taken')
+
+    def test_get_metrics(self):
+        increment("test.counter")
+        # GET error: user is not staff
+        resp = self.client.get(reverse('get_metrics'))
+        self.assertEqual(resp.status_code, 403)
+        # GET success
+        user = User.objects.get(email="seanlu99@gmail.com")
+        user.is_staff = True
+        user.save()
+        self.client.force_authenticate(user)
+        resp = self.client.get(reverse('get_metrics'))
+        self.assertEqual(resp.status_code, 200)
+        content = json.loads(resp.content)
+        self.assertEqual(content['status'], 'success')
+        self.assertGreaterEqual(content['metrics']['counters']['test.counter'], 1)
@@ -1,11 +1,18 @@
 import json
+import pusher
 import stripe
 import swickapp.apis_customer
 
 from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.http import JsonResponse
 from rest_framework.test import APITestCase
+from swickapp.apis_helper import PaymentResult
+from swickapp.channel_auth import clear_channel_auth_cache
+from swickapp.menu_snapshot import bump_menu_version
 from swickapp.models import Request, User, Customer, Order, OrderItem, OrderItemCustomization
 from unittest.mock import Mock, patch
 
@@ -43,40 +50,47 @@ class APICustomerTest(APITestCase):
         content = json.loads(resp.content)
         self.assertEqual(content['status'], 'invalid_token')
 
-    @patch('pusher.Pusher')
-    def test_pusher_auth(self, pusher_mock):
-        pusher_mock.return_value.authenticate.return_value = {
-            "pusher_payload": "mock_pusher_payload"}
+    @override_settings(PUSHER_KEY="key", PUSHER_SECRET="secret")
+    def test_pusher_auth(self):
+        clear_channel_auth_cache()
+        client = pusher.Pusher(app_id="1", key="key", secret="secret")
         # POST success
         resp = self.client.post(reverse('customer_pusher_auth'), data={
             "channel_name": "private-customer-11",
-            "socket_id": "1"
+            "socket_id": "123.456"
         })
         self.assertEqual(resp.status_code, 200)
         content = json.loads(resp.content)
-        self.assertEqual(content["pusher_payload"], "mock_pusher_payload")
+        self.assertEqual(content, client.authenticate(
+            channel="private-customer-11", socket_id="123.456"))
+        # POST error: invalid socket id
+        resp = self.client.post(reverse('customer_pusher_auth'), data={
+            "channel_name": "private-customer-11",
+            "socket_id": "1"
+        })
+        self.assertEqual(resp.status_code, 403)
         # POST error: channel does not start with "private-customer-"
         resp = self.client.post(reverse('customer_pusher_auth'), data={
             "channel_name": "private-restaurant-11",
-            "socket_id": "1"
+            "socket_id": "123.456"
         })
         self.assertEqual(resp.status_code, 403)
         # POST error: channel is not of correct format
         resp = self.client.post(reverse('customer_pusher_auth'), data={
             "channel_name": "private-customer-11-35",
-            "socket_id": "1"
+            "socket_id": "123.456"
         })
         self.assertEqual(resp.status_code, 403)
         # POST error: customer channel is not requested by user
         resp = self.client.post(reverse('customer_pusher_auth'), data={
             "channel_name": "private-customer-22",
-            "socket_id": "1"
+            "socket_id": "123.456"
         })
         self.assertEqual(resp.status_code, 403)
         # POST error: channel number is not an integer
         resp = self.client.post(reverse('customer_pusher_auth'), data={
             "channel_name": "private-customer-22.2",
-            "socket_id": "1"
+            "socket_id": "123.456"
         })
         self.assertEqual(resp.status_code, 403)
 
@@ -174,9 +188,51 @@ class APICustomerTest(APITestCase):
         content = json.loads(resp.content)
         self.assertEqual(content['status'], 'meal_disabled')
 
+    def test_get_menu(self):
+        cache.clear()
+        # GET success: restaurant exists and menu is read
+        with self.assertNumQueries(6):
+            resp = self.client.get(reverse('customer_get_menu', args=(26,)))
+        self.assertEqual(resp.status_code, 200)
+        content = json.loads(resp.content)
+        self.assertEqual(content['status'], 'success')
+        self.assertEqual(content['restaurant']['id'], 26)
+        self.assertEqual(len(content['request_options']), 2)
+        categories = {category['name']: category for category in content['categories']}
+        # Disabled meal is left out
+        meals = [meal['name'] for category in content['categories']
+                 for meal in category['meals']]
+        self.assertNotIn('Sandwich', meals)
+        pizza = [meal for meal in categories['Entrees']['meals']
+                 if meal['id'] == 17][0]
+        self.assertEqual(pizza['tax'], '6.000')
+        self.assertEqual([cust['name'] for cust in pizza['customizations']],
+                         ['Size', 'Toppings'])
+        etag = resp['ETag']
+        # GET success: snapshot is cached
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse('customer_get_menu', args=(26,)))
+        self.assertEqual(json.loads(resp.content), content)
+        # GET success: menu is unchanged
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse('customer_get_menu', args=(26,)),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        # GET success: menu changed
+        bump_menu_version(26)
+        resp = self.client.get(reverse('customer_get_menu', args=(26,)),
+                               HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+        # GET error: restaurant does not exist
+        resp = self.client.get(reverse('customer_get_menu', args=(1,)))
+        content = json.loads(resp.content)
+        self.assertEqual(content['status'], 'restaurant_does_not_exist')
+        # No version is cached for it
+        self.assertIsNone(cache.get("menu-version-1"))
+
     @patch('swickapp.apis_customer.attempt_stripe_payment')
-    @patch('swickapp.apis_customer.get_stripe_fee')
-    def test_place_order(self, get_stripe_fee_mock, attempt_stripe_payment_mock):
+    def test_place_order(self, attempt_stripe_payment_mock):
         basic_meal_1 = '{"meal_id": 17, "quantity": 1, "customizations":[]}'
         basic_meal_2 = '{"meal_id": 18, "quantity": 2, "customizations":[]}'
         basic_meal_3 = '{"meal_id": 19, "quantity": 3, "customizations":[]}'
@@ -205,13 +261,11 @@ class APICustomerTest(APITestCase):
         self.assertEqual(content["status"], "meal_disabled")
         self.assertEqual(content["meal_name"], "Sandwich")
         # POST success: Basic meals and successful payment attempt
-        attempt_stripe_payment_mock.return_value = JsonResponse({
-            "intent_status": "succeeded",
-            "payment_intent": "valid_payment_intent_id",
-            "client_secret": "mock_client_secret",
-            "status": "success"
-        })
-        get_stripe_fee_mock.return_value = Decimal("3.50")
+        attempt_stripe_payment_mock.return_value = PaymentResult(
+            "success",
+            intent_status="succeeded",
+            payment_intent="valid_payment_intent_id",
+            client_secret="mock_client_secret")
         resp = self.client.post(reverse('customer_place_order'), data={
             "order_items": "[" + basic_meal_1 + "," + basic_meal_2 + "," + basic_meal_3 + "]",
             "payment_method_id": "mock_payment_method_id",
@@ -225,7 +279,7 @@ class APICustomerTest(APITestCase):
         self.assertEqual(content["intent_status"], "succeeded")
         order = Order.objects.order_by('-id').first()
         self.assertEqual(order.status, Order.ACTIVE)
-        self.assertEqual(order.stripe_fee, Decimal("3.50"))
+        self.assertIsNone(order.stripe_fee)
         self.assertEqual(order.subtotal, Decimal("45.00"))
         self.assertEqual(order.tip, None)
         self.assertEqual(order.tax, Decimal("3.15"))
@@ -233,13 +287,13 @@ class APICustomerTest(APITestCase):
         order_items = OrderItem.objects.order_by('-id')[:3]
         for item in order_items:
             self.assertEqual(item.order.id, order.id)
+            self.assertEqual(item.restaurant_id, 26)
         # POST success: Basic meals and payment_intent requires action
-        attempt_stripe_payment_mock.return_value = JsonResponse({
-            "intent_status": "requires_action",
-            "payment_intent": "valid_payment_intent_id",
-            "client_secret": "mock_client_secret",
-            "status": "success"
-        })
+        attempt_stripe_payment_mock.return_value = PaymentResult(
+            "success",
+            intent_status="requires_action",
+            payment_intent="valid_payment_intent_id",
+            client_secret="mock_client_secret")
         resp = self.client.post(reverse('customer_place_order'), data={
             "order_items": "[" + basic_meal_1 + "," + basic_meal_1 + "," + basic_meal_3 + "]",
             "payment_method_id": "mock_payment_method_id",
@@ -255,12 +309,11 @@ class APICustomerTest(APITestCase):
         self.assertEqual(order.status, Order.PROCESSING)
         self.assertEqual(order.stripe_payment_id, "valid_payment_intent_id")
         # POST success: Basic meals and payment_intent card error
-        attempt_stripe_payment_mock.return_value = JsonResponse({
-            "intent_status": "card_error",
-            "payment_intent": "invalid_payment_intent_id",
-            "client_secret": "mock_client_secret",
-            "status": "success"
-        })
+        attempt_stripe_payment_mock.return_value = PaymentResult(
+            "success",
+            intent_status="card_error",
+            payment_intent="invalid_payment_intent_id",
+            client_secret="mock_client_secret")
         resp = self.client.post(reverse('customer_place_order'), data={
             "order_items": "[" + basic_meal_1 + "," + basic_meal_1 + "," + basic_meal_3 + "]",
             "payment_method_id": "invalid_payment_intent_id",
@@ -276,12 +329,11 @@ class APICustomerTest(APITestCase):
         self.assertNotEqual(order.stripe_payment_id,
                             "invalid_payment_intent_id")
         # POST success: Custom meals and successful payment attempt
-        attempt_stripe_payment_mock.return_value = JsonResponse({
-            "intent_status": "succeeded",
-            "payment_intent": "valid_payment_intent_id",
-            "client_secret": "mock_client_secret",
-            "status": "success"
-        })
+        attempt_stripe_payment_mock.return_value = PaymentResult(
+            "success",
+            intent_status="succeeded",
+            payment_intent="valid_payment_intent_id",
+            client_secret="mock_client_secret")
         resp = self.client.post(reverse('customer_place_order'), data={
             "order_items": "[" + customized_meal_1 + "," + customized_meal_2 + "," + customized_meal_3 + "]",
             "payment_method_id": "mock_payment_method_id",
@@ -322,17 +374,90 @@ class APICustomerTest(APITestCase):
         self.assertEqual(total_cost, Decimal("3.50"))
         # check order properties
         self.assertEqual(order.status, Order.ACTIVE)
-        self.assertEqual(order.stripe_fee, Decimal("3.50"))
+        self.assertIsNone(order.stripe_fee)
         self.assertEqual(order.subtotal, Decimal("37.00"))
         self.assertEqual(order.tip, Decimal("4.00"))
         self.assertEqual(order.tax, Decimal("2.22"))
         self.assertEqual(order.total, Decimal("43.22"))
 
+    @patch('swickapp.apis_customer.attempt_stripe_payment')
+    def test_place_order_invalid_cart(self, attempt_stripe_payment_mock):
+        order_count = Order.objects.count()
+        # POST error: meal does not belong to restaurant
+        resp = self.client.post(reverse('customer_place_order'), data={
+            "order_items": '[{"meal_id": 20, "quantity": 1, "customizations":[]}]',
+            "payment_method_id": "mock_payment_method_id",
+            "restaurant_id": 26,
+            "table": 1,
+            "tip": "nil"
+        })
+        content = json.loads(resp.content)
+        self.assertEqual(content["status"], "meal_does_not_exist")
+        # POST error: customization does not belong to meal
+        resp = self.client.post(reverse('customer_place_order'), data={
+            "order_items": '[{"meal_id": 18, "quantity": 1, "customizations":'
+            '[{"customization_id": 7, "options": [1]}]}]',
+            "payment_method_id": "mock_payment_method_id",
+            "restaurant_id": 26,
+            "table": 1,
+            "tip": "nil"
+        })
+        content = json.loads(resp.content)
+        self.assertEqual(content["status"], "customization_does_not_exist")
+        # POST error: option index out of range
+        resp = self.client.post(reverse('customer_place_order'), data={
+            "order_items": '[{"meal_id": 17, "quantity": 1, "customizations":'
+            '[{"customization_id": 7, "options": [3]}]}]',
+            "payment_method_id": "mock_payment_method_id",
+            "restaurant_id": 26,
+            "table": 1,
+            "tip": "nil"
+        })
+        content = json.loads(resp.content)
+        self.assertEqual(content["status"], "invalid_option")
+        # Nothing is written or charged for an invalid cart
+        self.assertEqual(Order.objects.count(), order_count)
+        attempt_stripe_payment_mock.assert_not_called()
+
+    @patch('swickapp.apis_customer.attempt_stripe_payment')
+    def test_place_order_query_count(self, attempt_stripe_payment_mock):
+        attempt_stripe_payment_mock.return_value = PaymentResult(
+            "success",
+            intent_status="requires_action",
+            payment_intent="valid_payment_intent_id",
+            client_secret="mock_client_secret")
+        customized_meal = '{"meal_id": 17, "quantity": 1, "customizations":[' \
+            '{"customization_id": 7, "options": [1]},' \
+            '{"customization_id": 8, "options": [0, 2]}]}'
+        basic_meal = '{"meal_id": 19, "quantity": 2, "customizations":[]}'
+
+        def place_order(order_items):
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.post(reverse('customer_place_order'), data={
+                    "order_items": "[" + ",".join(order_items) + "]",
+                    "payment_method_id": "mock_payment_method_id",
+                    "restaurant_id": 26,
+                    "table": 1,
+                    "tip": "nil"
+                })
+            content = json.loads(resp.content)
+            self.assertEqual(content["intent_status"], "requires_action")
+            return len(queries)
+
+        # Query count does not depend on number of items or customizations
+        small_cart = place_order([customized_meal, basic_meal])
+        large_cart = place_order([customized_meal, basic_meal] * 6)
+        self.assertEqual(small_cart, large_cart)
+        order = Order.objects.order_by('-id').first()
+        self.assertEqual(order.order_item.count(), 12)
+        self.assertEqual(OrderItemCustomization.objects.filter(
+            order_item__order=order).count(), 12)
+        self.assertEqual(order.subtotal, Decimal("168.00"))
+
     @patch('stripe.PaymentMethod.retrieve')
     @patch('stripe.PaymentIntent.retrieve')
     @patch('swickapp.apis_customer.attempt_stripe_payment')
-    @patch('swickapp.apis_customer.get_stripe_fee')
-    def test_add_tip(self, get_stripe_fee_mock, attempt_stripe_payment_mock, payment_intent_retrieve_mock, payment_method_retrieve_mock):
+    def test_add_tip(self, attempt_stripe_payment_mock, payment_intent_retrieve_mock, payment_method_retrieve_mock):
         # POST error: customer id is not valid
         resp = self.client.post(reverse('customer_add_tip'), data={
             "order_id": 38,
@@ -370,12 +495,11 @@ class APICustomerTest(APITestCase):
         payment_intent_mock.payment_method.customer = self.customer.stripe_cust_id
         payment_intent_mock.metadata = {"order_id": 35, "payment_method_id": "valid_payment_method_id"}
         payment_method_retrieve_mock.return_value.customer = self.customer.stripe_cust_id
-        attempt_stripe_payment_mock.return_value = JsonResponse({
-            "intent_status": "requires_action",
-            "payment_intent": "valid_payment_intent_id",
-            "client_secret": "mock_client_secret",
-            "status": "success"
-        })
+        attempt_stripe_payment_mock.return_value = PaymentResult(
+            "success",
+            intent_status="requires_action",
+            payment_intent="valid_payment_intent_id",
+            client_secret="mock_client_secret")
         resp = self.client.post(reverse('customer_add_tip'), data={
             "order_id": 35,
             "tip": "2.00"
@@ -390,12 +514,10 @@ class APICustomerTest(APITestCase):
                          "valid_payment_intent_id")
         self.assertEqual(order.tip, Decimal("4.88"))
         # POST success: payment successful
-        attempt_stripe_payment_mock.return_value = JsonResponse({
-            "intent_status": "succeeded",
-            "payment_intent": "valid_payment_intent_id",
-            "status": "success"
-        })
-        get_stripe_fee_mock.return_value = Decimal("3.50")
+        attempt_stripe_payment_mock.return_value = PaymentResult(
+            "success",
+            intent_status="succeeded",
+            payment_intent="valid_payment_intent_id")
         resp = self.client.post(reverse('customer_add_tip'), data={
             "order_id": 35,
             "tip": "2.00"
@@ -408,7 +530,9 @@ class APICustomerTest(APITestCase):
         self.assertEqual(order.tip_stripe_payment_id,
                          "valid_payment_intent_id")
         self.assertEqual(order.tip, Decimal("2.00"))
-        self.assertEqual(order.stripe_fee, Decimal("4.94"))
+        # Fee is reconciled again to include tip charge
+        self.assertIsNone(order.stripe_fee)
+        self.assertIsNotNone(order.tip_time)
         self.assertEqual(order.total, Decimal("41.48"))
         # POST error: stripe api error
         payment_intent_retrieve_mock.side_effect = stripe.error.StripeError(
@@ -421,15 +545,12 @@ class APICustomerTest(APITestCase):
         self.assertEqual(content["status"], "stripe_api_error")
 
     @patch('swickapp.apis_customer.retry_stripe_payment')
-    @patch('swickapp.apis_customer.get_stripe_fee')
-    def test_retry_order_payment(self, get_stripe_fee_mock, retry_stripe_payment_mock):
+    def test_retry_order_payment(self, retry_stripe_payment_mock):
         # POST success: payment succeeds
-        retry_stripe_payment_mock.return_value = JsonResponse({
-            "intent_status": "succeeded",
-            "order_id": 35,
-            "status": "success"
-        })
-        get_stripe_fee_mock.return_value = Decimal("2.50")
+        retry_stripe_payment_mock.return_value = PaymentResult(
+            "success",
+            intent_status="succeeded",
+            order_id=35)
         order = Order.objects.get(pk=35)
         order.status = Order.PROCESSING
         order.save()
@@ -443,14 +564,14 @@ class APICustomerTest(APITestCase):
         self.assertEqual(content['intent_status'], 'succeeded')
         order = Order.objects.get(pk=35)
         self.assertEqual(order.status, Order.ACTIVE)
-        self.assertEqual(order.stripe_fee, Decimal("2.50"))
+        # Stripe fee is left for reconcile_stripe_fees
+        self.assertEqual(order.stripe_fee, Decimal("1.44"))
         # POST success: card fails
-        retry_stripe_payment_mock.return_value = JsonResponse({
-            "intent_status": "card_error",
-            "order_id": 35,
-            "error": "mock_card_error_message",
-            "status": "success"
-        })
+        retry_stripe_payment_mock.return_value = PaymentResult(
+            "success",
+            intent_status="card_error",
+            order_id=35,
+            error="mock_card_error_message")
         resp = self.client.post(reverse('customer_retry_order_payment'), data={
             "payment_intent_id": "valid_payment_intent_id",
             "restaurant_id": 26
@@ -463,15 +584,12 @@ class APICustomerTest(APITestCase):
 
     @patch('stripe.PaymentIntent.retrieve')
     @patch('swickapp.apis_customer.retry_stripe_payment')
-    @patch('swickapp.apis_customer.get_stripe_fee')
-    def test_retry_tip_payment(self, get_stripe_fee_mock, retry_stripe_payment_mock, payment_intent_retrieve_mock):
+    def test_retry_tip_payment(self, retry_stripe_payment_mock, payment_intent_retrieve_mock):
         # POST success: payment succeeds
-        retry_stripe_payment_mock.return_value = JsonResponse({
-            "intent_status": "succeeded",
-            "order_id": 35,
-            "status": "success"
-        })
-        get_stripe_fee_mock.return_value = Decimal("0.50")
+        retry_stripe_payment_mock.return_value = PaymentResult(
+            "success",
+            intent_status="succeeded",
+            order_id=35)
         payment_intent_retrieve_mock.return_value.amount = 300
 
         resp = self.client.post(reverse('customer_retry_tip_payment'), data={
@@ -485,13 +603,14 @@ class APICustomerTest(APITestCase):
         order = Order.objects.get(id=35)
         self.assertEqual(order.tip, Decimal("3.00"))
         self.assertEqual(order.total, Decimal("42.48"))
+        self.assertIsNone(order.stripe_fee)
+        self.assertIsNotNone(order.tip_time)
         # POST success: card fails
-        retry_stripe_payment_mock.return_value = JsonResponse({
-            "intent_status": "card_error",
-            "order_id": 36,
-            "error": "mock_card_error_message",
-            "status": "success"
-        })
+        retry_stripe_payment_mock.return_value = PaymentResult(
+            "success",
+            intent_status="card_error",
+            order_id=36,
+            error="mock_card_error_message")
         resp = self.client.post(reverse('customer_retry_tip_payment'), data={
             "payment_intent_id": "valid_payment_intent_id",
             "restaurant_id": 26
@@ -503,11 +622,10 @@ class APICustomerTest(APITestCase):
         order = Order.objects.get(id=36)
         self.assertEqual(order.tip, Decimal("1.13"))
         # POST error: stripe api error
-        retry_stripe_payment_mock.return_value = JsonResponse({
-            "intent_status": "succeeded",
-            "order_id": 35,
-            "status": "success"
-        })
+        retry_stripe_payment_mock.return_value = PaymentResult(
+            "success",
+            intent_status="succeeded",
+            order_id=35)
         payment_intent_retrieve_mock.side_effect = stripe.error.StripeError(
             "mock_stripe_error_message"
         )
@@ -558,7 +676,8 @@ class APICustomerTest(APITestCase):
         self.assertEqual(resp.status_code, 200)
         content = json.loads(resp.content)
         self.assertEqual(content['status'], 'success')
-        Request.objects.get(customer=self.customer, request_option=5)
+        request_object = Request.objects.get(customer=self.customer, request_option=5)
+        self.assertEqual(request_object.restaurant_id, 26)
         # POST error: request option does not exist
         resp = self.client.post(
             reverse('customer_make_request'),
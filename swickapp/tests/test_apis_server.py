@@ -1,7 +1,14 @@
 import json
+import threading
+import time
 
+import pusher
+from django.db import connection, transaction
+from django.test import override_settings
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase, APITransactionTestCase
+from swickapp.channel_auth import (clear_channel_auth_cache,
+                                   invalidate_server_channels)
 from swickapp.models import Order, OrderItem, Request, Server, User
 from unittest.mock import Mock, patch
 
@@ -45,55 +52,77 @@ class APIServerTest(APITestCase):
         content = json.loads(resp.content)
         self.assertEqual(content['status'], 'invalid_token')
 
-    @patch('pusher.Pusher')
-    def test_pusher_auth(self, pusher_mock):
-        pusher_mock.return_value.authenticate.return_value = {
-            "pusher_payload": "mock_pusher_payload"}
+    @override_settings(PUSHER_KEY="key", PUSHER_SECRET="secret")
+    def test_pusher_auth(self):
+        clear_channel_auth_cache()
+        client = pusher.Pusher(app_id="1", key="key", secret="secret")
         # POST success: server with restaurant
         resp = self.client.post(reverse('server_pusher_auth'), data={
             "channel_name": "private-restaurant-26",
-            "socket_id": "1"
+            "socket_id": "123.456"
         })
         self.assertEqual(resp.status_code, 200)
         content = json.loads(resp.content)
-        self.assertEqual(content["pusher_payload"], "mock_pusher_payload")
+        self.assertEqual(content, client.authenticate(
+            channel="private-restaurant-26", socket_id="123.456"))
+        # POST success: server channels are cached
+        with self.assertNumQueries(0):
+            resp = self.client.post(reverse('server_pusher_auth'), data={
+                "channel_name": "private-server-11",
+                "socket_id": "123.456"
+            })
+        self.assertEqual(resp.status_code, 200)
+        # POST error: invalid socket id
+        resp = self.client.post(reverse('server_pusher_auth'), data={
+            "channel_name": "private-restaurant-26",
+            "socket_id": "1"
+        })
+        self.assertEqual(resp.status_code, 403)
         # POST error: server does have access to restaurant
         resp = self.client.post(reverse('server_pusher_auth'), data={
             "channel_name": "private-restaurant-29",
-            "socket_id": "1"
+            "socket_id": "123.456"
         })
         self.assertEqual(resp.status_code, 403)
         # POST success: server without restaurant
-        self.user.server.restaurant = None
+        Server.objects.filter(id=11).update(restaurant=None)
+        invalidate_server_channels(Server.objects.get(id=11).user_id)
         resp = self.client.post(reverse('server_pusher_auth'), data={
             "channel_name": "private-server-11",
-            "socket_id": "1"
+            "socket_id": "123.456"
         })
         self.assertEqual(resp.status_code, 200)
         content = json.loads(resp.content)
-        self.assertEqual(content["pusher_payload"], "mock_pusher_payload")
+        self.assertEqual(content, client.authenticate(
+            channel="private-server-11", socket_id="123.456"))
+        # POST error: server without restaurant has no restaurant channel
+        resp = self.client.post(reverse('server_pusher_auth'), data={
+            "channel_name": "private-restaurant-26",
+            "socket_id": "123.456"
+        })
+        self.assertEqual(resp.status_code, 403)
         # POST error: channel does not start with valid channel type
         resp = self.client.post(reverse('server_pusher_auth'), data={
             "channel_name": "private-customer-11",
-            "socket_id": "1"
+            "socket_id": "123.456"
         })
         self.assertEqual(resp.status_code, 403)
         # POST error: channel is not of correct format
         resp = self.client.post(reverse('server_pusher_auth'), data={
             "channel_name": "private-restaurant_account-11-35",
-            "socket_id": "1"
+            "socket_id": "123.456"
         })
         self.assertEqual(resp.status_code, 403)
         # POST error: server channel is not requested by user
         resp = self.client.post(reverse('server_pusher_auth'), data={
             "channel_name": "private-server-22",
-            "socket_id": "1"
+            "socket_id": "123.456"
         })
         self.assertEqual(resp.status_code, 403)
         # POST error: channel number is not an integer
         resp = self.client.post(reverse('server_pusher_auth'), data={
             "channel_name": "private-server-22.2",
-            "socket_id": "1"
+            "socket_id": "123.456"
         })
         self.assertEqual(resp.status_code, 403)
 
@@ -169,9 +198,65 @@ class APIServerTest(APITestCase):
         self.assertEqual(content[2]['type'], 'Request')
         self.assertEqual(content[3]['id'], 20)
         self.assertEqual(content[3]['type'], 'Request')
+        self.assertEqual(set(content[0]), {'id', 'order_id', 'customer_name', 'table',
+                                           'meal_name', 'time', 'type'})
+        self.assertEqual(set(content[2]), {'id', 'customer_name', 'table',
+                                           'request_name', 'time', 'type'})
+        # GET success: page of queue
+        resp = self.client.get(reverse('server_get_order_items_to_send'),
+                               {'offset': 1, 'limit': 2})
+        content = json.loads(resp.content)
+        self.assertEqual([entry['id'] for entry in content], [52, 18])
+        # GET error: invalid page
+        resp = self.client.get(reverse('server_get_order_items_to_send'), {'limit': -1})
+        self.assertEqual(json.loads(resp.content)['status'], 'invalid_request')
+
+    def test_sync(self):
+        # GET success: full queues without cursor
+        # Server, cursor, order items, customizations and requests
+        with self.assertNumQueries(5):
+            resp = self.client.get(reverse('server_sync'))
+        content = json.loads(resp.content)
+        self.assertEqual(content['status'], 'success')
+        self.assertTrue(content['reset'])
+        self.assertEqual([item['id'] for item in content['order_items']], [49, 50, 52, 54])
+        self.assertEqual([req['id'] for req in content['requests']], [18, 20])
+        cursor = content['cursor']
+        # GET success: nothing changed
+        resp = self.client.get(reverse('server_sync'), {'since': cursor})
+        content = json.loads(resp.content)
+        self.assertFalse(content['reset'])
+        self.assertEqual(content['order_items'], [])
+        self.assertEqual(content['cursor'], cursor)
+        # GET success: only changes since cursor
+        self.client.post(reverse('server_update_order_item_status'),
+                         data={'order_item_id': 49, 'status': OrderItem.COMPLETE})
+        self.client.post(reverse('server_delete_request'), data={'id': 18})
+        resp = self.client.get(reverse('server_sync'), {'since': cursor})
+        content = json.loads(resp.content)
+        self.assertFalse(content['reset'])
+        self.assertEqual(len(content['order_items']), 1)
+        self.assertEqual(content['order_items'][0]['id'], 49)
+        self.assertEqual(content['order_items'][0]['status'], OrderItem.COMPLETE)
+        self.assertEqual(content['requests'], [])
+        self.assertEqual(content['deleted_requests'], [18])
+        self.assertEqual(content['cursor'], cursor + 2)
+        # GET success: cursor restaurant never handed out gets full queues
+        resp = self.client.get(reverse('server_sync'), {'since': cursor + 100})
+        self.assertTrue(json.loads(resp.content)['reset'])
+        # GET error: invalid cursor
+        resp = self.client.get(reverse('server_sync'), {'since': 'abc'})
+        self.assertEqual(json.loads(resp.content)['status'], 'invalid_cursor')
 
     def test_server_update_order_item_status(self):
         # POST success
+        # Server, item with order, sequence number, item, order and savepoint
+        with self.assertNumQueries(7):
+            resp = self.client.post(
+                reverse('server_update_order_item_status'),
+                data={'order_item_id': 50, 'status': OrderItem.SENDING}
+            )
+        self.assertEqual(json.loads(resp.content)['status'], 'success')
         resp = self.client.post(
             reverse('server_update_order_item_status'),
             data={'order_item_id': 49, 'status': OrderItem.SENDING}
@@ -231,6 +316,62 @@ class APIServerTest(APITestCase):
         content = json.loads(resp.content)
         self.assertEqual(content['status'], 'order_item_does_not_exist')
 
+    @patch('swickapp.apis_server.send_event_order_status_updated')
+    def test_server_update_order_item_status_processing_order(self, order_event_mock):
+        # Order still waiting on payment is neither activated nor completed
+        Order.objects.filter(id=35).update(status=Order.PROCESSING)
+        for order_item_id, status in ((49, OrderItem.SENDING), (49, OrderItem.COMPLETE),
+                                      (50, OrderItem.COMPLETE)):
+            resp = self.client.post(reverse('server_update_order_item_status'),
+                                    data={'order_item_id': order_item_id, 'status': status})
+            self.assertEqual(json.loads(resp.content)['status'], 'success')
+        Order.objects.get(id=35, status=Order.PROCESSING)
+        order_event_mock.assert_not_called()
+
+    @patch('swickapp.apis_server.send_event_order_status_updated')
+    @patch('swickapp.apis_server.send_event_items_status_updated')
+    def test_update_order_item_statuses(self, items_event_mock, order_event_mock):
+        # POST success: complete every item of order 35 and send item of order 36
+        order_items = json.dumps([
+            {'order_item_id': 49, 'status': OrderItem.COMPLETE},
+            {'order_item_id': 50, 'status': OrderItem.COMPLETE},
+            {'order_item_id': 52, 'status': OrderItem.COOKING},
+        ])
+        # Server, items, customizations, sequence number, one UPDATE per status,
+        # orders, one UPDATE per order status and savepoint
+        with self.assertNumQueries(11):
+            resp = self.client.post(reverse('server_update_order_item_statuses'),
+                                    data={'order_items': order_items})
+        self.assertEqual(json.loads(resp.content)['status'], 'success')
+        self.assertEqual(OrderItem.objects.get(id=49).status, OrderItem.COMPLETE)
+        self.assertEqual(OrderItem.objects.get(id=52).status, OrderItem.COOKING)
+        self.assertEqual(Order.objects.get(id=35).status, Order.COMPLETE)
+        self.assertEqual(Order.objects.get(id=36).status, Order.ACTIVE)
+        # One event per order
+        self.assertEqual(items_event_mock.call_count, 2)
+        order, items = items_event_mock.call_args_list[0][0]
+        self.assertEqual(order.id, 35)
+        self.assertEqual([item.id for item in items], [49, 50])
+        self.assertEqual(sorted(call[0][0].id for call in order_event_mock.call_args_list),
+                         [35, 36])
+        # Items share one change sequence number
+        self.assertEqual(len({item.change_seq for item in OrderItem.objects.filter(
+            id__in=[49, 50, 52])}), 1)
+        # POST error: order item does not belong to restaurant
+        resp = self.client.post(reverse('server_update_order_item_statuses'), data={
+            'order_items': json.dumps([{'order_item_id': 49, 'status': OrderItem.COOKING},
+                                       {'order_item_id': 53, 'status': OrderItem.COOKING}])})
+        self.assertEqual(json.loads(resp.content)['status'], 'order_item_does_not_exist')
+        self.assertEqual(OrderItem.objects.get(id=49).status, OrderItem.COMPLETE)
+        # POST error: invalid status
+        resp = self.client.post(reverse('server_update_order_item_statuses'), data={
+            'order_items': json.dumps([{'order_item_id': 49, 'status': 'EATEN'}])})
+        self.assertEqual(json.loads(resp.content)['status'], 'invalid_status')
+        # POST error: invalid request
+        resp = self.client.post(reverse('server_update_order_item_statuses'),
+                                data={'order_items': '[49]'})
+        self.assertEqual(json.loads(resp.content)['status'], 'invalid_request')
+
     def test_delete_request(self):
         # POST success
         resp = self.client.post(
@@ -274,3 +415,32 @@ class APIServerTest(APITestCase):
         content = json.loads(resp.content)
         self.assertEqual(content['status'], 'success')
         self.assertEqual(content['restaurant_name'], 'none')
+
+
+class APIServerConcurrencyTest(APITransactionTestCase):
+    fixtures = ['testdata.json']
+
+    @patch('swickapp.apis_server.send_event_order_status_updated')
+    def test_complete_last_items_concurrently(self, order_event_mock):
+        user = User.objects.get(email="seanlu99@gmail.com")
+
+        def complete_item(order_item_id):
+            client = APIClient()
+            client.force_authenticate(user)
+            client.post(reverse('server_update_order_item_status'),
+                        data={'order_item_id': order_item_id, 'status': OrderItem.COMPLETE})
+            connection.close()
+
+        # Both servers wait on the order's lock, then complete order 35's
+        # last two open items at the same time
+        threads = [threading.Thread(target=complete_item, args=(order_item_id,))
+                   for order_item_id in (49, 50)]
+        with transaction.atomic():
+            Order.objects.select_for_update().get(id=35)
+            for thread in threads:
+                thread.start()
+            time.sleep(0.5)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(Order.objects.get(id=35).status, Order.COMPLETE)
+        self.assertEqual(order_event_mock.call_count, 1)
@@ -0,0 +1,165 @@
+import json
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from swickapp import authentication
+from swickapp.authentication import (USER_TOKENS, CachedTokenAuthentication,
+                                     clear_auth_token_cache,
+                                     invalidate_user_tokens)
+from swickapp.cache_invalidation import start_listener, stop_listener
+from swickapp.metrics import get_metrics, reset_metrics
+from swickapp.models import Server, User
+
+# Cache of production settings
+DATABASE_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "swick_cache",
+    }
+}
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+    fixtures = ['testdata.json']
+
+    def setUp(self):
+        clear_auth_token_cache()
+        reset_metrics()
+        self.user = User.objects.get(email="seanlu99@gmail.com")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token.key)
+
+    def get_items_to_cook(self):
+        resp = self.client.get(reverse('server_get_order_items_to_cook'))
+        self.assertEqual(resp.status_code, 200)
+        return json.loads(resp.content)
+
+    def test_cached_call_only_queries_data(self):
+        with CaptureQueriesContext(connection) as uncached:
+            content = self.get_items_to_cook()
+        # Order items and their customizations
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get_items_to_cook(), content)
+        self.assertEqual(len(uncached), 3)
+        counters = get_metrics()["counters"]
+        self.assertEqual(counters["auth_token_cache.misses"], 1)
+        self.assertEqual(counters["auth_token_cache.hits"], 1)
+
+    def test_cached_user(self):
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, token = authentication.authenticate_credentials(self.token.key)
+            # Customer and server are loaded with user
+            self.assertEqual(user.customer.id, 11)
+            self.assertEqual(user.customer.user.email, "seanlu99@gmail.com")
+            self.assertEqual(user.server.restaurant_id, 26)
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.token.key)
+        resp = self.client.get(reverse('server_get_info'))
+        content = json.loads(resp.content)
+        self.assertEqual(content["email"], "seanlu99@gmail.com")
+        self.assertEqual(content["name"], self.user.name)
+
+    @override_settings(CACHES=DATABASE_CACHES)
+    def test_cached_user_with_database_cache(self):
+        call_command("createcachetable", verbosity=0)
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        # Shared cache is not read to check entry
+        with self.assertNumQueries(0):
+            authentication.authenticate_credentials(self.token.key)
+
+    def test_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+        resp = self.client.get(reverse('server_get_order_items_to_cook'))
+        self.assertEqual(resp.status_code, 401)
+
+    def test_inactive_user(self):
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        resp = self.client.get(reverse('server_get_order_items_to_cook'))
+        self.assertEqual(resp.status_code, 401)
+
+    def test_invalidated_by_token_deletion(self):
+        self.get_items_to_cook()
+        self.token.delete()
+        resp = self.client.get(reverse('server_get_order_items_to_cook'))
+        self.assertEqual(resp.status_code, 401)
+
+    def test_invalidated_by_update_info(self):
+        self.get_items_to_cook()
+        self.client.post(reverse('update_info'), data={"name": "Sean", "email": ""})
+        resp = self.client.get(reverse('server_get_info'))
+        self.assertEqual(json.loads(resp.content)["name"], "Sean")
+
+    def test_invalidated_by_restaurant_delete_server(self):
+        self.assertEqual(len(self.get_items_to_cook()["order_items"]), 2)
+        client = self.client_class()
+        client.force_login(User.objects.get(email="john@gmail.com"))
+        client.get(reverse('restaurant_delete_server', args=(11,)))
+        self.assertEqual(self.get_items_to_cook()["order_items"], [])
+
+    def test_invalidated_in_other_processes(self):
+        self.assertEqual(len(self.get_items_to_cook()["order_items"]), 2)
+        # Entries another process keeps after this one changes the server
+        entries = dict(authentication._cache)
+        Server.objects.filter(id=11).update(restaurant=None)
+        invalidate_user_tokens(self.user.id)
+        authentication._cache.update(entries)
+        self.assertEqual(self.get_items_to_cook()["order_items"], [])
+        # Token deleted by another process
+        self.get_items_to_cook()
+        entries = dict(authentication._cache)
+        self.token.delete()
+        authentication._cache.update(entries)
+        resp = self.client.get(reverse('server_get_order_items_to_cook'))
+        self.assertEqual(resp.status_code, 401)
+
+    @override_settings(AUTH_TOKEN_CACHE_TTL=60)
+    def test_ttl(self):
+        with patch("swickapp.authentication.time.monotonic", return_value=0):
+            self.get_items_to_cook()
+        Server.objects.filter(id=11).update(restaurant=None)
+        with patch("swickapp.authentication.time.monotonic", return_value=30):
+            self.assertEqual(len(self.get_items_to_cook()["order_items"]), 2)
+        with patch("swickapp.authentication.time.monotonic", return_value=61):
+            self.assertEqual(self.get_items_to_cook()["order_items"], [])
+
+
+@override_settings(CACHE_INVALIDATION="postgres", CACHES=DATABASE_CACHES)
+class PostgresInvalidationTest(TransactionTestCase):
+    fixtures = ['testdata.json']
+
+    def setUp(self):
+        clear_auth_token_cache()
+        self.token = Token.objects.create(user=User.objects.get(email="seanlu99@gmail.com"))
+
+    def tearDown(self):
+        stop_listener()
+
+    def test_invalidated_by_other_process(self):
+        self.assertTrue(start_listener().listening.wait(5))
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, token = authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(user.server.restaurant_id, 26)
+        # Another process removes server from restaurant
+        Server.objects.filter(id=11).update(restaurant=None)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [settings.CACHE_INVALIDATION_CHANNEL,
+                                                        json.dumps([USER_TOKENS, user.id])])
+        for _ in range(50):
+            user, token = authentication.authenticate_credentials(self.token.key)
+            if user.server.restaurant_id is None:
+                break
+            time.sleep(0.1)
+        self.assertIsNone(user.server.restaurant_id)
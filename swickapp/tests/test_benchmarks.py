@@ -0,0 +1,265 @@
+import json
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import connection
+from django.http import JsonResponse
+from django.test import SimpleTestCase, override_settings, tag
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from swickapp.finance import (aggregate_order_totals, get_finance_totals,
+                              get_paid_orders, get_tax_by_category,
+                              rebuild_daily_summaries)
+from swickapp.models import (Category, Customer, Meal, Order, OrderItem,
+                             Request, RequestOption, TaxCategory, User)
+from swickapp.responses import FastJsonResponse
+from swickapp.restaurant_cache import (clear_restaurant_cache,
+                                       get_restaurant_metadata)
+from swickapp.serializers import MealSerializer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def report(name, seconds, count, unit):
+    sys.stderr.write("\n{name}: {total:.1f} ms total, {each:.1f} us per {unit}\n".format(
+        name=name, total=seconds * 1000, each=seconds / count * 1000000, unit=unit))
+
+
+@tag('benchmark')
+class MenuBenchmarkTest(APITestCase):
+    """
+    Menu of 300 meals spread over three tax categories
+    """
+    fixtures = ['testdata.json']
+    MEAL_COUNT = 300
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(restaurant_id=26, name="Specials")
+        tax_categories = [
+            TaxCategory.objects.create(restaurant_id=26, name="Tax {n}".format(n=n),
+                                       tax=Decimal(n))
+            for n in range(3)
+        ]
+        Meal.objects.bulk_create([
+            Meal(category=category,
+                 name="Meal {n}".format(n=n),
+                 price=Decimal("9.99"),
+                 image="meal{n}.jpg".format(n=n),
+                 tax_category=tax_categories[n % 3])
+            for n in range(cls.MEAL_COUNT)
+        ])
+
+    def test_get_meals(self):
+        # Restaurant and meals with tax categories
+        with self.assertNumQueries(2):
+            start = time.perf_counter()
+            resp = self.client.get(reverse('customer_get_meals', args=(26, 0)))
+            elapsed = time.perf_counter() - start
+        meals = json.loads(resp.content)["meals"]
+        self.assertGreaterEqual(len(meals), self.MEAL_COUNT)
+        report("get_meals", elapsed, len(meals), "meal")
+
+    def test_meal_serializer(self):
+        meals = list(Meal.objects.filter(category__name="Specials")
+                     .select_related("tax_category"))
+        request = self.client.get(reverse('customer_get_meals', args=(26, 0))).wsgi_request
+        with self.assertNumQueries(0):
+            start = time.perf_counter()
+            data = MealSerializer(meals, many=True, context={"request": request}).data
+            elapsed = time.perf_counter() - start
+        self.assertEqual(data[0]["image"], "http://testserver/mediafiles/meal0.jpg")
+        report("MealSerializer", elapsed, len(meals), "meal")
+
+
+@tag('benchmark')
+class SendQueueBenchmarkTest(APITestCase):
+    """
+    Send queue of 250 order items and 250 requests
+    """
+    fixtures = ['testdata.json']
+    ENTRY_COUNT = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.get(id=11)
+        request_option = RequestOption.objects.get(id=1)
+        orders = [Order.objects.create(restaurant_id=26, customer=customer, table=n,
+                                       status=Order.ACTIVE)
+                  for n in range(10)]
+        OrderItem.objects.bulk_create([
+            OrderItem(order=orders[n % 10], restaurant_id=26, status=OrderItem.SENDING,
+                      meal_name="Meal {n}".format(n=n), meal_price=Decimal("9.99"),
+                      quantity=1)
+            for n in range(cls.ENTRY_COUNT // 2)
+        ])
+        Request.objects.bulk_create([
+            Request(customer=customer, restaurant_id=26, request_option=request_option,
+                    table=n)
+            for n in range(cls.ENTRY_COUNT // 2)
+        ])
+
+    def setUp(self):
+        self.client.force_authenticate(User.objects.get(email="seanlu99@gmail.com"))
+
+    def test_get_items_to_send(self):
+        # Server and send queue, whatever the queue size
+        with self.assertNumQueries(2):
+            start = time.perf_counter()
+            resp = self.client.get(reverse('server_get_order_items_to_send'))
+            elapsed = time.perf_counter() - start
+        queue = json.loads(resp.content)
+        self.assertGreaterEqual(len(queue), self.ENTRY_COUNT)
+        times = [entry["time"] for entry in queue]
+        self.assertEqual(times, sorted(times))
+        report("get_items_to_send", elapsed, len(queue), "entry")
+
+
+@tag('benchmark')
+class FinanceBenchmarkTest(APITestCase):
+    """
+    Restaurant with 100k paid orders over a year, one item each
+    """
+    fixtures = ['testdata.json']
+    ORDER_COUNT = 100000
+
+    @classmethod
+    def setUpTestData(cls):
+        # Every tenth order has no reconciled Stripe fee
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO swickapp_order (restaurant_id, order_time, status, "table",
+                                            subtotal, tax, tip, total, stripe_fee)
+                SELECT 29, %s + n * interval '5 minutes', 'COMPLETE', n %% 20,
+                       10.00, 0.60, n %% 5, 10.60 + n %% 5,
+                       CASE WHEN n %% 10 = 0 THEN NULL ELSE 0.61 END
+                FROM generate_series(1, %s) AS n
+            """, [timezone.now() - timedelta(days=365), cls.ORDER_COUNT])
+            cursor.execute("""
+                INSERT INTO swickapp_orderitem (order_id, restaurant_id, status, meal_name,
+                                                meal_price, quantity, total, change_seq,
+                                                tax_category_name, tax_rate)
+                SELECT id, 29, 'COMPLETE', 'French fries', 10.00, 1, 10.00, 0, 'Default', 6.000
+                FROM swickapp_order WHERE restaurant_id = 29 AND order_time > %s
+            """, [timezone.now() - timedelta(days=365)])
+            # Planner statistics as a production database would have them
+            cursor.execute("ANALYZE swickapp_order, swickapp_orderitem")
+        clear_restaurant_cache()
+        rebuild_daily_summaries(29)
+
+    def setUp(self):
+        # Restaurant's timezone is cached as it is for the finances page
+        clear_restaurant_cache()
+        get_restaurant_metadata(29)
+        self.start_time = timezone.now() - timedelta(days=400)
+        self.end_time = timezone.now()
+
+    def sum_in_python(self):
+        """
+        Previous finances page, every order loaded to sum its amounts
+        """
+        totals = {"gross_revenue": 0, "total_tax": 0, "total_tip": 0, "stripe_fees": 0}
+        for order in get_paid_orders(29).filter(
+                order_time__range=(self.start_time, self.end_time)):
+            try:
+                totals["gross_revenue"] += order.total
+                totals["total_tax"] += order.tax
+                totals["total_tip"] += order.tip or 0
+                totals["stripe_fees"] += order.stripe_fee
+            except TypeError:
+                pass
+        return totals
+
+    def test_finance_totals(self):
+        start = time.perf_counter()
+        python_totals = self.sum_in_python()
+        python_elapsed = time.perf_counter() - start
+        report("finance totals in python", python_elapsed, self.ORDER_COUNT, "order")
+
+        with self.assertNumQueries(1):
+            start = time.perf_counter()
+            sql_totals = aggregate_order_totals(get_paid_orders(29).filter(
+                order_time__range=(self.start_time, self.end_time)))
+            sql_elapsed = time.perf_counter() - start
+        report("finance totals in sql", sql_elapsed, self.ORDER_COUNT, "order")
+
+        with self.assertNumQueries(2):
+            start = time.perf_counter()
+            rollup_totals = get_finance_totals(29, self.start_time, self.end_time)
+            rollup_elapsed = time.perf_counter() - start
+        report("finance totals from rollups", rollup_elapsed, self.ORDER_COUNT, "order")
+
+        # Fixture order of restaurant 29 is older than a year
+        self.assertEqual(sql_totals["order_count"], self.ORDER_COUNT)
+        self.assertEqual(sql_totals["pending_fee_count"], self.ORDER_COUNT // 10)
+        self.assertEqual(sql_totals["stripe_fees"],
+                         Decimal("0.61") * (self.ORDER_COUNT - self.ORDER_COUNT // 10))
+        for field in ("order_count", "gross_revenue", "total_tax", "total_tip",
+                      "stripe_fees", "pending_fee_count"):
+            self.assertEqual(rollup_totals[field], sql_totals[field])
+        for field in python_totals:
+            self.assertEqual(python_totals[field], sql_totals[field])
+
+    def test_tax_by_category(self):
+        with self.assertNumQueries(1):
+            start = time.perf_counter()
+            rows = get_tax_by_category(29, self.start_time, self.end_time)
+            elapsed = time.perf_counter() - start
+        report("tax by category", elapsed, self.ORDER_COUNT, "order item")
+        self.assertEqual(rows, [{"name": "Default", "rate": Decimal("6.000"),
+                                 "taxable": Decimal("10.00") * self.ORDER_COUNT,
+                                 "tax": Decimal("0.60") * self.ORDER_COUNT}])
+
+
+@tag('benchmark')
+class JsonResponseBenchmarkTest(SimpleTestCase):
+    """
+    get_orders payload of 200 orders, encoded 50 times per backend
+    """
+    ORDER_COUNT = 200
+    ROUNDS = 50
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        now = timezone.now()
+        cls.payload = {
+            "orders": [{
+                "id": n,
+                "restaurant_name": "Restaurant",
+                "customer_name": "Customer {n}".format(n=n),
+                "order_time": (now - timedelta(minutes=n)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "status": "ACTIVE",
+                "subtotal": "25.98",
+                "tax": "1.56",
+                "tip": "4.00",
+                "total": "31.54",
+            } for n in range(cls.ORDER_COUNT)],
+            "status": "success"
+        }
+
+    def time_response(self, name, response_class):
+        start = time.perf_counter()
+        for _ in range(self.ROUNDS):
+            resp = response_class(self.payload)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(len(json.loads(resp.content)["orders"]), self.ORDER_COUNT)
+        report(name, elapsed, self.ROUNDS, "response")
+
+    def test_json_response(self):
+        self.time_response("JsonResponse", JsonResponse)
+
+    def test_fast_json_response(self):
+        self.time_response("FastJsonResponse", FastJsonResponse)
+
+    @skipUnless(orjson, "orjson is not installed")
+    @override_settings(JSON_ENCODER="swickapp.responses.OrjsonEncoder")
+    def test_orjson_response(self):
+        self.time_response("FastJsonResponse (orjson)", FastJsonResponse)
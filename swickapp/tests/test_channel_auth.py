@@ -0,0 +1,69 @@
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from swickapp import channel_auth
+from swickapp.channel_auth import (CUSTOMER, SERVER, clear_channel_auth_cache,
+                                   get_allowed_channels,
+                                   invalidate_server_channels)
+from swickapp.metrics import get_metrics, reset_metrics
+from swickapp.models import Customer, Server, User
+
+
+class ChannelAuthTest(TestCase):
+    fixtures = ['testdata.json']
+
+    def setUp(self):
+        clear_channel_auth_cache()
+        reset_metrics()
+        self.user = User.objects.get(email="seanlu99@gmail.com")
+
+    def test_get_allowed_channels(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_allowed_channels(CUSTOMER, self.user.id),
+                             {"private-customer-11"})
+            # Cached lookup does not query database
+            get_allowed_channels(CUSTOMER, self.user.id)
+        counters = get_metrics()["counters"]
+        self.assertEqual(counters["channel_auth_cache.misses"], 1)
+        self.assertEqual(counters["channel_auth_cache.hits"], 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_allowed_channels(SERVER, self.user.id),
+                             {"private-server-11", "private-restaurant-26"})
+            get_allowed_channels(SERVER, self.user.id)
+        # User without account is not cached
+        user = User.objects.get(email="simon@gmail.com")
+        self.assertEqual(get_allowed_channels(CUSTOMER, user.id), frozenset())
+        customer = Customer.objects.create(user=user)
+        self.assertEqual(get_allowed_channels(CUSTOMER, user.id),
+                         {"private-customer-{id}".format(id=customer.id)})
+        self.assertEqual(get_allowed_channels(SERVER, user.id), frozenset())
+        # Anonymous user
+        with self.assertNumQueries(0):
+            self.assertEqual(get_allowed_channels(CUSTOMER, None), frozenset())
+
+    @override_settings(CHANNEL_AUTH_CACHE_TTL=60)
+    def test_ttl(self):
+        with patch("swickapp.channel_auth.time.monotonic", return_value=0):
+            get_allowed_channels(CUSTOMER, self.user.id)
+        with patch("swickapp.channel_auth.time.monotonic", return_value=30):
+            with self.assertNumQueries(0):
+                get_allowed_channels(CUSTOMER, self.user.id)
+        with patch("swickapp.channel_auth.time.monotonic", return_value=61):
+            with self.assertNumQueries(1):
+                get_allowed_channels(CUSTOMER, self.user.id)
+
+    def test_server_removed_from_restaurant(self):
+        self.assertIn("private-restaurant-26", get_allowed_channels(SERVER, self.user.id))
+        self.client.force_login(User.objects.get(email="john@gmail.com"))
+        self.client.get(reverse('restaurant_delete_server', args=(11,)))
+        self.assertEqual(get_allowed_channels(SERVER, self.user.id), {"private-server-11"})
+
+    def test_server_invalidated_in_other_processes(self):
+        self.assertIn("private-restaurant-26", get_allowed_channels(SERVER, self.user.id))
+        # Entries another process keeps after this one changes the server
+        entries = dict(channel_auth._server_cache)
+        Server.objects.filter(id=11).update(restaurant=None)
+        invalidate_server_channels(self.user.id)
+        channel_auth._server_cache.update(entries)
+        self.assertEqual(get_allowed_channels(SERVER, self.user.id), {"private-server-11"})
@@ -0,0 +1,101 @@
+import threading
+
+from django.test import SimpleTestCase
+from swickapp.event_bus import CoalescingEventBus, coalesce_events
+from swickapp.metrics import get_metrics, reset_metrics
+
+CHANNEL = "private-restaurant-26"
+
+
+def item_event(item_id, status, order_id=35, channel=CHANNEL):
+    return {"channel": channel, "name": "item-status-updated",
+            "data": {"order_item": {}, "id": item_id, "order_id": order_id, "status": status}}
+
+
+def order_event(order_id, status, channel=CHANNEL):
+    return {"channel": channel, "name": "order-status-updated",
+            "data": {"order_id": order_id, "new_status": status}}
+
+
+class CoalesceEventsTest(SimpleTestCase):
+
+    def test_single_item_is_unchanged(self):
+        events = [item_event(49, "SENDING"), order_event(35, "Complete")]
+        self.assertEqual(coalesce_events(events, 20), events)
+
+    def test_items_are_merged(self):
+        events = [
+            item_event(49, "SENDING"),
+            order_event(35, "Active"),
+            {"channel": CHANNEL, "name": "items-status-updated",
+             "data": {"order_items": [
+                 {"order_item": {}, "id": 54, "order_id": 38, "status": "COMPLETE"}]}},
+            item_event(49, "COMPLETE"),
+            order_event(35, "Complete"),
+        ]
+        merged = coalesce_events(events, 20)
+        self.assertEqual([event["name"] for event in merged],
+                         ["items-status-updated", "order-status-updated"])
+        # Latest status of each item and order is kept
+        self.assertEqual(merged[0]["data"]["order_items"], [
+            {"order_item": {}, "id": 54, "order_id": 38, "status": "COMPLETE"},
+            {"order_item": {}, "id": 49, "order_id": 35, "status": "COMPLETE"},
+        ])
+        self.assertEqual(merged[1]["data"]["new_status"], "Complete")
+        self.assertEqual(merged[0]["channel"], CHANNEL)
+
+    def test_merged_items_are_chunked(self):
+        events = [item_event(item_id, "SENDING") for item_id in range(5)]
+        merged = coalesce_events(events, 2)
+        self.assertEqual([len(event["data"]["order_items"]) for event in merged], [2, 2, 1])
+
+
+class CoalescingEventBusTest(SimpleTestCase):
+
+    def setUp(self):
+        reset_metrics()
+        self.sent = []
+        self.sent_event = threading.Event()
+
+    def send(self, events):
+        self.sent.append(events)
+        self.sent_event.set()
+
+    def test_burst_is_merged(self):
+        bus = CoalescingEventBus(60, 20, self.send)
+        for item_id in range(10):
+            bus.publish([item_event(item_id, "SENDING"),
+                         item_event(item_id, "SENDING", channel="private-customer-11")])
+        self.assertEqual(self.sent, [])
+        bus.flush()
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual([(event["channel"], len(event["data"]["order_items"]))
+                          for event in self.sent[0]],
+                         [(CHANNEL, 10), ("private-customer-11", 10)])
+        counters = get_metrics()["counters"]
+        self.assertEqual(counters["event_bus.events_held"], 20)
+        self.assertEqual(counters["event_bus.messages_sent"], 2)
+        self.assertEqual(counters["event_bus.messages_saved"], 18)
+        # Nothing is left to flush
+        bus.flush()
+        self.assertEqual(len(self.sent), 1)
+
+    def test_other_events_are_not_held(self):
+        bus = CoalescingEventBus(60, 20, self.send)
+        request_made = {"channel": CHANNEL, "name": "request-made", "data": {}}
+        bus.publish([item_event(49, "SENDING"), request_made])
+        self.assertEqual(self.sent, [[request_made]])
+
+    def test_window_elapses(self):
+        bus = CoalescingEventBus(0.05, 20, self.send)
+        bus.publish([item_event(49, "SENDING")])
+        bus.publish([item_event(50, "SENDING")])
+        self.assertTrue(self.sent_event.wait(5))
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sent[0][0]["name"], "items-status-updated")
+
+    def test_no_window(self):
+        bus = CoalescingEventBus(0, 20, self.send)
+        events = [item_event(49, "SENDING"), item_event(50, "SENDING")]
+        bus.publish(events)
+        self.assertEqual(self.sent, [events])
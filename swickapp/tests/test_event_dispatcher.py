@@ -0,0 +1,87 @@
+import threading
+
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from swickapp.event_dispatcher import EventDispatcher
+from swickapp.metrics import get_metrics, reset_metrics
+
+
+@override_settings(EVENT_DISPATCHER_RETRY_DELAY=0)
+class EventDispatcherTest(SimpleTestCase):
+
+    def setUp(self):
+        reset_metrics()
+        self.dispatcher = EventDispatcher(workers=2)
+        self.delivered = []
+
+    def deliver(self, event):
+        self.delivered.append(event)
+
+    def test_submit(self):
+        self.dispatcher.submit(self.deliver, "event")
+        self.assertTrue(self.dispatcher.join(timeout=5))
+        self.assertEqual(self.delivered, ["event"])
+        metrics = get_metrics()
+        self.assertEqual(metrics["counters"]["event_dispatcher.delivered"], 1)
+        self.assertEqual(metrics["gauges"]["event_dispatcher.queue_depth"], 0)
+        self.assertEqual(metrics["timings"]["event_dispatcher.delivery_latency"]["count"], 1)
+
+    def test_retry(self):
+        failures = [ConnectionError("Pusher is down")]
+
+        def deliver(event):
+            if failures:
+                raise failures.pop()
+            self.delivered.append(event)
+
+        with self.assertLogs("swickapp.event_dispatcher", "WARNING"):
+            self.dispatcher.submit(deliver, "event")
+            self.dispatcher.join(timeout=5)
+        self.assertEqual(self.delivered, ["event"])
+        self.assertEqual(get_metrics()["counters"]["event_dispatcher.retries"], 1)
+
+    @override_settings(EVENT_DISPATCHER_MAX_ATTEMPTS=2)
+    def test_dead_letter(self):
+        def deliver(event):
+            raise ConnectionError("Pusher is down")
+
+        with self.assertLogs("swickapp.event_dispatcher") as logs:
+            self.dispatcher.submit(deliver, "event")
+            self.dispatcher.join(timeout=5)
+        self.assertIn("after 2 attempts", logs.output[-1])
+        self.assertEqual(get_metrics()["counters"]["event_dispatcher.dead_letters"], 1)
+
+    @override_settings(EVENT_DISPATCHER_MAX_QUEUE=1)
+    def test_queue_is_bounded(self):
+        release = threading.Event()
+
+        def deliver(event):
+            release.wait(5)
+            self.delivered.append(event)
+
+        self.dispatcher.submit(deliver, "first")
+        self.assertEqual(get_metrics()["gauges"]["event_dispatcher.queue_depth"], 1)
+        with self.assertLogs("swickapp.event_dispatcher.dead_letter") as logs:
+            self.dispatcher.submit(deliver, "second")
+        self.assertIn("queue is full", logs.output[0])
+        release.set()
+        self.dispatcher.join(timeout=5)
+        self.assertEqual(self.delivered, ["first"])
+
+
+class EventDispatcherConnectionTest(TransactionTestCase):
+
+    def test_connection_is_closed(self):
+        wrappers = []
+
+        def deliver():
+            # Connections are per thread
+            wrapper = connections["default"]
+            with wrapper.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            wrappers.append(wrapper)
+
+        dispatcher = EventDispatcher(workers=1)
+        dispatcher.submit(deliver)
+        self.assertTrue(dispatcher.join(timeout=5))
+        self.assertIsNone(wrappers[0].connection)
@@ -0,0 +1,105 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from swickapp.apis_helper import attempt_stripe_payment
+from swickapp.fee_reconciliation import reconcile_stripe_fees
+from swickapp.models import Order, Restaurant
+
+from .fake_stripe import REQUIRES_ACTION, SUCCEEDS, FakeStripe
+
+
+class FeeReconciliationTest(TestCase):
+    fixtures = ['testdata.json']
+
+    def setUp(self):
+        self.restaurant = Restaurant.objects.get(id=26)
+        self.fake_stripe = FakeStripe()
+        self.fake_stripe.__enter__()
+        self.addCleanup(self.fake_stripe.__exit__)
+
+    def pay(self, amount, payment_method_id=SUCCEEDS):
+        result = attempt_stripe_payment(26, "cus_fake", "seanlu99@gmail.com",
+                                        payment_method_id, amount, {})
+        return result.as_dict()
+
+    def create_order(self, amount, payment_method_id=SUCCEEDS):
+        content = self.pay(amount, payment_method_id)
+        return Order.objects.create(restaurant=self.restaurant, table=1,
+                                    status=Order.ACTIVE,
+                                    stripe_payment_id=content["payment_intent"])
+
+    def test_reconcile_stripe_fees(self):
+        order_1 = self.create_order(1000)
+        order_2 = self.create_order(2000)
+        self.fake_stripe.add_payout()
+        # Charge of tip is added to order fee
+        order_2.tip_stripe_payment_id = "pi_fake_3"
+        order_2.tip_time = timezone.now()
+        order_2.save()
+        self.pay(500)
+        # Payment that has not gone through has no charge yet
+        order_3 = self.create_order(3000, REQUIRES_ACTION)
+        # Balance transactions are listed one page at a time
+        with patch("swickapp.fee_reconciliation.PAGE_SIZE", 2):
+            self.assertEqual(reconcile_stripe_fees(self.restaurant), 2)
+        self.assertEqual(Order.objects.get(id=order_1.id).stripe_fee, Decimal("0.59"))
+        self.assertEqual(Order.objects.get(id=order_2.id).stripe_fee, Decimal("1.32"))
+        self.assertIsNone(Order.objects.get(id=order_3.id).stripe_fee)
+        # Orders with fees are left alone
+        self.assertEqual(reconcile_stripe_fees(self.restaurant), 0)
+
+    def test_reconcile_stripe_fees_lookback(self):
+        order = self.create_order(1000)
+        Order.objects.filter(id=order.id).update(
+            order_time=timezone.now() - timedelta(days=30))
+        self.assertEqual(reconcile_stripe_fees(self.restaurant), 0)
+        self.assertEqual(reconcile_stripe_fees(
+            self.restaurant, since=timezone.now() - timedelta(days=31)), 1)
+
+    def test_reconcile_stripe_fees_tipped_order(self):
+        order = self.create_order(1000)
+        # Tip paid today for an order placed before the lookback window
+        Order.objects.filter(id=order.id).update(
+            order_time=timezone.now() - timedelta(days=30),
+            tip_stripe_payment_id=self.pay(500)["payment_intent"],
+            tip_time=timezone.now())
+        self.assertEqual(reconcile_stripe_fees(self.restaurant), 1)
+        self.assertEqual(Order.objects.get(id=order.id).stripe_fee, Decimal("1.03"))
+
+    def test_reconcile_stripe_fees_missing_tip_charge(self):
+        order = self.create_order(1000)
+        Order.objects.filter(id=order.id).update(tip_stripe_payment_id="pi_not_listed",
+                                                 tip_time=timezone.now())
+        # Order stays pending until tip charge is listed
+        self.assertEqual(reconcile_stripe_fees(self.restaurant), 0)
+        self.assertIsNone(Order.objects.get(id=order.id).stripe_fee)
+        # Tip payment that never went through is left out
+        Order.objects.filter(id=order.id).update(tip_time=None)
+        self.assertEqual(reconcile_stripe_fees(self.restaurant), 1)
+        self.assertEqual(Order.objects.get(id=order.id).stripe_fee, Decimal("0.59"))
+
+    def test_reconcile_stripe_fees_command(self):
+        order = self.create_order(1000)
+        Order.objects.filter(id=order.id).update(
+            order_time=timezone.now() - timedelta(days=30))
+        since = (timezone.now() - timedelta(days=31)).strftime("%Y-%m-%d")
+        out = StringIO()
+        call_command("reconcile_stripe_fees", "--since", since,
+                     "--restaurant", "26", stdout=out)
+        self.assertIn("1 orders reconciled", out.getvalue())
+        self.assertEqual(Order.objects.get(id=order.id).stripe_fee, Decimal("0.59"))
+
+    def test_reconcile_stripe_fees_command_with_processing_order(self):
+        order = self.create_order(1000)
+        # Abandoned order waiting for card action does not hide paid orders
+        self.create_order(3000, REQUIRES_ACTION)
+        Order.objects.filter(stripe_payment_id="pi_fake_2").update(status=Order.PROCESSING)
+        out = StringIO()
+        call_command("reconcile_stripe_fees", "--restaurant", "26", stdout=out)
+        self.assertIn("1 orders reconciled", out.getvalue())
+        self.assertEqual(Order.objects.get(id=order.id).stripe_fee, Decimal("0.59"))
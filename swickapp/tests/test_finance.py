@@ -0,0 +1,131 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytz
+from django.test import TestCase, TransactionTestCase
+from swickapp.apis_helper import PaymentResult, finalize_order_payment
+from swickapp.finance import (get_finance_totals, get_tax_by_category,
+                              rebuild_daily_summaries, refresh_daily_summary)
+from swickapp.models import (DailyRestaurantSummary, Meal, Order, OrderItem,
+                             TaxCategory)
+from swickapp.restaurant_cache import clear_restaurant_cache
+
+EASTERN = pytz.timezone("US/Eastern")
+
+
+def local_time(*args):
+    return EASTERN.localize(datetime(*args))
+
+
+class FinanceTest(TestCase):
+    fixtures = ['testdata.json']
+
+    def setUp(self):
+        clear_restaurant_cache()
+
+    def test_rebuild_daily_summaries(self):
+        self.assertEqual(rebuild_daily_summaries(26), 1)
+        summary = DailyRestaurantSummary.objects.get(restaurant_id=26)
+        # Orders are placed after midnight in the restaurant's timezone
+        self.assertEqual(summary.date, date(2020, 11, 14))
+        self.assertEqual(summary.order_count, 3)
+        self.assertEqual(summary.gross_revenue, Decimal("83.78"))
+        self.assertEqual(summary.total_tax, Decimal("4.22"))
+        self.assertEqual(summary.total_tip, Decimal("11.81"))
+        # Order without a reconciled fee counts as no fee and as pending
+        self.assertEqual(summary.stripe_fees, Decimal("1.97"))
+        self.assertEqual(summary.pending_fee_count, 1)
+
+    def test_get_finance_totals(self):
+        rebuild_daily_summaries(26)
+        # Orders changed behind the rollups' back show which path was taken
+        Order.objects.filter(id=38).update(total=Decimal("100.00"))
+        get_finance_totals(26, local_time(2020, 11, 1), local_time(2020, 11, 30))
+        with self.assertNumQueries(2):
+            totals = get_finance_totals(26, local_time(2020, 11, 1),
+                                        local_time(2020, 11, 30, 23, 59, 59, 999999))
+        self.assertEqual(totals["order_count"], 3)
+        self.assertEqual(totals["gross_revenue"], Decimal("83.78"))
+        self.assertEqual(totals["revenue"], Decimal("65.78"))
+        self.assertEqual(totals["pending_fee_count"], 1)
+        # Partial days are summed from orders
+        totals = get_finance_totals(26, local_time(2020, 11, 14, 0, 22), local_time(2020, 11, 15))
+        self.assertEqual(totals["order_count"], 2)
+        self.assertEqual(totals["gross_revenue"], Decimal("107.76"))
+        totals = get_finance_totals(26, local_time(2020, 11, 14), local_time(2020, 11, 14, 0, 30))
+        self.assertEqual(totals["order_count"], 2)
+        self.assertEqual(totals["gross_revenue"], Decimal("47.24"))
+        self.assertEqual(totals["pending_fee_count"], 0)
+        # Whole day starting at midnight uses its rollup
+        totals = get_finance_totals(26, local_time(2020, 11, 14),
+                                    local_time(2020, 11, 14, 23, 59, 59, 999999))
+        self.assertEqual(totals["gross_revenue"], Decimal("83.78"))
+        # No orders in range
+        totals = get_finance_totals(29, local_time(2020, 12, 1), local_time(2020, 12, 31))
+        self.assertEqual(totals["order_count"], 0)
+        self.assertEqual(totals["revenue"], 0)
+        self.assertEqual(totals["pending_fee_count"], 0)
+
+    def test_get_tax_by_category(self):
+        start, end = local_time(2020, 11, 1), local_time(2020, 11, 30)
+        with self.assertNumQueries(1):
+            rows = get_tax_by_category(26, start, end)
+        self.assertEqual(rows, [
+            {"name": "Default", "rate": Decimal("6.000"), "taxable": Decimal("66.50"),
+             "tax": Decimal("3.99")},
+            {"name": "Drinks", "rate": Decimal("8.000"), "taxable": Decimal("7.50"),
+             "tax": Decimal("0.60")},
+        ])
+        # Items keep the rate they were ordered with
+        TaxCategory.objects.filter(restaurant_id=26, name="Drinks").update(tax=Decimal("10"))
+        Meal.objects.filter(name="Wine").delete()
+        self.assertEqual(get_tax_by_category(26, start, end), rows)
+        # Items without a tax category are grouped last
+        OrderItem.objects.filter(id=50).update(tax_category_name=None, tax_rate=None)
+        rows = get_tax_by_category(26, start, end)
+        self.assertEqual(rows[-1], {"name": None, "rate": None,
+                                    "taxable": Decimal("7.50"), "tax": None})
+        # Payment processing orders are not counted
+        Order.objects.filter(id=35).update(status=Order.PROCESSING)
+        rows = get_tax_by_category(26, start, end)
+        self.assertEqual(rows, [{"name": "Default", "rate": Decimal("6.000"),
+                                 "taxable": Decimal("35.25"), "tax": Decimal("2.12")}])
+        self.assertEqual(get_tax_by_category(29, local_time(2020, 12, 1), local_time(2020, 12, 31)), [])
+
+    def test_refresh_daily_summary(self):
+        order = Order.objects.create(restaurant_id=26, table=1, status=Order.ACTIVE,
+                                     order_time=local_time(2020, 11, 15, 23, 30),
+                                     subtotal=Decimal("10.00"), tax=Decimal("0.60"),
+                                     total=Decimal("10.60"))
+        refresh_daily_summary(26, date(2020, 11, 15))
+        summary = DailyRestaurantSummary.objects.get(restaurant_id=26, date=date(2020, 11, 15))
+        self.assertEqual(summary.order_count, 1)
+        self.assertEqual(summary.total_tip, 0)
+        Order.objects.filter(id=order.id).update(tip=Decimal("2.00"))
+        refresh_daily_summary(26, date(2020, 11, 15))
+        summary.refresh_from_db()
+        self.assertEqual(summary.total_tip, Decimal("2.00"))
+        # Payment processing orders are not counted
+        Order.objects.filter(id=order.id).update(status=Order.PROCESSING)
+        refresh_daily_summary(26, date(2020, 11, 15))
+        summary.refresh_from_db()
+        self.assertEqual(summary.order_count, 0)
+
+
+class FinanceRollupUpdateTest(TransactionTestCase):
+    fixtures = ['testdata.json']
+
+    def setUp(self):
+        clear_restaurant_cache()
+
+    def test_paid_order_updates_summary(self):
+        order = Order.objects.create(restaurant_id=26, customer_id=11, table=1,
+                                     order_time=local_time(2020, 11, 20, 12),
+                                     subtotal=Decimal("10.00"), tax=Decimal("0.60"),
+                                     total=Decimal("10.60"))
+        self.assertFalse(DailyRestaurantSummary.objects.exists())
+        finalize_order_payment(order, PaymentResult(
+            "success", intent_status="succeeded", payment_intent="pi_fake_1"))
+        summary = DailyRestaurantSummary.objects.get(restaurant_id=26)
+        self.assertEqual(summary.date, date(2020, 11, 20))
+        self.assertEqual(summary.gross_revenue, Decimal("10.60"))
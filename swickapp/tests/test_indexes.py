@@ -0,0 +1,95 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase
+from django.utils import timezone
+from swickapp.models import Order, OrderItem, Request, ServerRequest
+from swickapp.order_history import get_order_history
+
+
+class IndexTest(TestCase):
+    """
+    Checks hot queries can be answered from their indexes, using EXPLAIN on a
+    seeded dataset with sequential scans disabled, so the planner picks an
+    index whenever one applies
+    """
+    fixtures = ['testdata.json']
+    ORDER_COUNT = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        # Restaurant 26 and customer 11 each have one in 20 orders
+        orders = Order.objects.bulk_create([
+            Order(restaurant_id=26 if n % 20 == 0 else 29,
+                  customer_id=11 if n % 20 == 1 else 22,
+                  table=n, order_time=now - timedelta(hours=n),
+                  status=Order.COMPLETE if n > 10 else Order.ACTIVE)
+            for n in range(cls.ORDER_COUNT)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, restaurant_id=order.restaurant_id, meal_name="Pizza", meal_price=Decimal("10.00"),
+                      quantity=1, status=OrderItem.COMPLETE if n > 10 else OrderItem.COOKING)
+            for n, order in enumerate(orders) for _ in range(3)
+        ])
+        ServerRequest.objects.bulk_create([
+            ServerRequest(restaurant_id=26, name="Server", email="server{n}@gmail.com".format(n=n))
+            for n in range(cls.ORDER_COUNT)
+        ])
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            # Undone when test transaction is rolled back
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_order_indexes(self):
+        self.assertUsesIndex(
+            Order.objects.filter(restaurant_id=26, order_time__range=(
+                timezone.now() - timedelta(days=1), timezone.now())
+            ).exclude(status=Order.PROCESSING).order_by("id"),
+            "order_rest_time_idx")
+        # Order history page after a cursor
+        self.assertUsesIndex(
+            get_order_history(26, timezone.now() - timedelta(days=30), timezone.now())
+            .filter(order_time__gt=timezone.now() - timedelta(days=1))[:50],
+            "order_rest_time_idx")
+        self.assertUsesIndex(
+            Order.objects.filter(restaurant_id=26).order_by("-id")[:20],
+            "order_rest_id_idx")
+        self.assertUsesIndex(
+            Order.objects.filter(customer_id=11).exclude(status=Order.PROCESSING)
+            .order_by("-id")[:10],
+            "order_cust_id_idx")
+
+    def test_order_item_indexes(self):
+        self.assertUsesIndex(
+            OrderItem.objects.filter(restaurant_id=26, status=OrderItem.COOKING)
+            .order_by("id"),
+            "orderitem_open_idx")
+        # Tax report finds the range's orders by time and their items by order
+        self.assertUsesIndex(
+            OrderItem.objects.filter(order__restaurant_id=26, order__order_time__range=(
+                timezone.now() - timedelta(days=1), timezone.now())
+            ).exclude(order__status=Order.PROCESSING)
+            .values("tax_category_name", "tax_rate").annotate(Sum("total")).order_by(),
+            "order_rest_time_idx")
+
+    def test_request_indexes(self):
+        self.assertUsesIndex(
+            Request.objects.filter(customer_id=11, request_option_id=1),
+            "request_cust_option_idx")
+
+    def test_server_request_indexes(self):
+        self.assertUsesIndex(
+            ServerRequest.objects.filter(email="server1@gmail.com", accepted=True),
+            "serverrequest_email_idx")
+        self.assertUsesIndex(
+            ServerRequest.objects.filter(token="token"),
+            "serverrequest_token_idx")
@@ -0,0 +1,135 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+
+import pytz
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from swickapp.models import Order, OrderItem, OrderItemCustomization, User
+from swickapp.order_export import CSV, CSV_HEADER, NDJSON, export_orders
+from swickapp.restaurant_cache import clear_restaurant_cache
+
+START_TIME = pytz.utc.localize(datetime(2020, 11, 14))
+END_TIME = pytz.utc.localize(datetime(2020, 11, 15))
+
+
+def read_csv(content):
+    return list(csv.DictReader(io.StringIO(content)))
+
+
+def read_ndjson(content):
+    return [json.loads(line) for line in content.splitlines()]
+
+
+class OrderExportTest(TestCase):
+    fixtures = ['testdata.json']
+
+    def setUp(self):
+        clear_restaurant_cache()
+        self.client.force_login(User.objects.get(email="john@gmail.com"))
+
+    def test_export_csv(self):
+        rows = read_csv("".join(export_orders(26, START_TIME, END_TIME, CSV)))
+        self.assertEqual(list(rows[0]), CSV_HEADER)
+        # One row per order item
+        self.assertEqual([row["item_id"] for row in rows], ["49", "50", "51", "52", "54"])
+        self.assertEqual(rows[0]["order_id"], "35")
+        self.assertEqual(rows[0]["order_time"], "2020-11-14T00:21:47.683000-05:00")
+        self.assertEqual(rows[0]["customer"], "seanlu99@gmail.com")
+        self.assertEqual(rows[0]["total"], "39.48")
+        self.assertEqual(rows[0]["tax_category"], "Default")
+        self.assertEqual(rows[0]["customizations"], 'Size: 14" (+2.00); Toppings: Chicken (+0.50)')
+        self.assertEqual(rows[1]["customizations"], "")
+        # Order without a reconciled fee
+        self.assertEqual(rows[-1]["stripe_fee"], "")
+
+    def test_export_csv_escapes_formulas(self):
+        OrderItem.objects.filter(id=49).update(meal_name="=HYPERLINK(\"http://x\")")
+        OrderItem.objects.filter(id=50).update(meal_name="-Salad")
+        OrderItem.objects.filter(id=51).update(meal_name="\t=1+2")
+        OrderItem.objects.filter(id=52).update(meal_name="\r=1+2")
+        OrderItemCustomization.objects.filter(order_item_id=49).update(
+            customization_name="@SUM(A1)")
+        User.objects.filter(email="seanlu99@gmail.com").update(email="+1@gmail.com")
+        rows = read_csv("".join(export_orders(26, START_TIME, END_TIME, CSV)))
+        self.assertEqual(rows[0]["meal_name"], "'=HYPERLINK(\"http://x\")")
+        self.assertEqual(rows[1]["meal_name"], "'-Salad")
+        self.assertEqual(rows[2]["meal_name"], "'\t=1+2")
+        self.assertEqual(rows[3]["meal_name"], "'\r=1+2")
+        self.assertTrue(rows[0]["customizations"].startswith("'@SUM(A1): "))
+        self.assertEqual(rows[0]["customer"], "'+1@gmail.com")
+        # Numbers are not text
+        self.assertEqual(rows[0]["total"], "39.48")
+        # NDJSON is not read by spreadsheets
+        orders = read_ndjson("".join(export_orders(26, START_TIME, END_TIME, NDJSON)))
+        self.assertEqual(orders[0]["items"][0]["meal_name"], "=HYPERLINK(\"http://x\")")
+
+    def test_export_ndjson(self):
+        orders = read_ndjson("".join(export_orders(26, START_TIME, END_TIME, NDJSON)))
+        self.assertEqual([order["id"] for order in orders], [35, 36, 38])
+        self.assertEqual(orders[0]["subtotal"], "32.50")
+        self.assertEqual(len(orders[0]["items"]), 3)
+        self.assertEqual(orders[0]["items"][0]["customizations"][0], {
+            "name": "Size", "options": [{"name": '14"', "price_addition": "2.00"}]})
+        self.assertEqual(orders[0]["items"][1]["tax_rate"], "8.000")
+        self.assertIsNone(orders[2]["stripe_fee"])
+        with self.assertRaises(ValueError):
+            export_orders(26, START_TIME, END_TIME, "xml")
+
+    @override_settings(ORDER_EXPORT_CHUNK_SIZE=2)
+    def test_export_chunks(self):
+        Order.objects.create(restaurant_id=26, table=1, status=Order.COMPLETE,
+                             order_time=pytz.utc.localize(datetime(2020, 11, 14, 12)))
+        chunks = export_orders(26, START_TIME, END_TIME, NDJSON)
+        # Server side cursor of orders, items and customizations of each chunk
+        with self.assertNumQueries(1 + 2 * 2):
+            chunks = list(chunks)
+        self.assertEqual([len(read_ndjson(chunk)) for chunk in chunks], [2, 2])
+        # Order without items
+        rows = read_csv("".join(export_orders(26, START_TIME, END_TIME, CSV)))
+        self.assertEqual(rows[-1]["item_id"], "")
+
+    def test_export_view(self):
+        data = {'start_time': '11/14/2020 12:00AM', 'end_time': '11/14/2020 5:00AM'}
+        resp = self.client.get(reverse('restaurant_export_orders'), dict(data, format=CSV))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp["Content-Type"], "text/csv")
+        self.assertEqual(resp["Content-Disposition"], 'attachment; filename="orders.csv"')
+        rows = read_csv(b"".join(resp.streaming_content).decode())
+        self.assertEqual(len(rows), 5)
+        resp = self.client.get(reverse('restaurant_export_orders'), dict(data, format=NDJSON))
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson")
+        self.assertEqual(len(read_ndjson(b"".join(resp.streaming_content).decode())), 3)
+        # Invalid range or format
+        resp = self.client.get(reverse('restaurant_export_orders'), dict(data, format="xml"))
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get(reverse('restaurant_export_orders'),
+                               {'start_time': '<invalid_format>', 'format': CSV})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_export_command(self):
+        out = io.StringIO()
+        call_command("export_orders", "26", "--start", "2020-11-14", "--end", "2020-11-14",
+                     "--format", "ndjson", stdout=out)
+        self.assertEqual(len(read_ndjson(out.getvalue())), 3)
+        # Days are in restaurant's timezone
+        out = io.StringIO()
+        call_command("export_orders", "26", "--start", "2020-11-13", "--end", "2020-11-13",
+                     stdout=out)
+        self.assertEqual(read_csv(out.getvalue()), [])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "orders.csv")
+            call_command("export_orders", "26", "--start", "2020-11-01", "--end", "2020-11-30",
+                         "--output", path)
+            with open(path, newline="") as output:
+                self.assertEqual(len(read_csv(output.read())), 5)
+        with self.assertRaises(CommandError):
+            call_command("export_orders", "1000", "--start", "2020-11-01", "--end", "2020-11-30")
+        with self.assertRaises(CommandError):
+            call_command("export_orders", "26", "--start", "11/01/2020", "--end", "2020-11-30")
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytz
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from swickapp.models import Order, User
+from swickapp.order_history import (decode_cursor, encode_cursor,
+                                    get_order_history, get_order_page)
+
+START_TIME = pytz.utc.localize(datetime(2020, 11, 14))
+END_TIME = pytz.utc.localize(datetime(2020, 11, 15))
+RANGE = {'start_time': '11/14/2020 12:00AM', 'end_time': '11/14/2020 5:00AM'}
+
+
+class OrderHistoryTest(TestCase):
+    fixtures = ['testdata.json']
+
+    def setUp(self):
+        self.client.force_login(User.objects.get(email="john@gmail.com"))
+
+    def test_get_order_history(self):
+        # Orders with customers and item counts in one query
+        with self.assertNumQueries(1):
+            orders = list(get_order_history(26, START_TIME, END_TIME))
+            self.assertEqual([str(order.customer) for order in orders],
+                             ["seanlu99@gmail.com", "seanlu99@gmail.com", "seanlu@umich.edu"])
+        self.assertEqual([order.id for order in orders], [35, 36, 38])
+        self.assertEqual([order.item_count for order in orders], [3, 1, 1])
+        Order.objects.filter(id=36).update(status=Order.PROCESSING)
+        self.assertEqual(get_order_history(26, START_TIME, END_TIME).count(), 2)
+
+    def test_get_order_page(self):
+        # Orders placed at the same time are ordered by id
+        Order.objects.filter(id=38).update(order_time=Order.objects.get(id=35).order_time)
+        orders = get_order_history(26, START_TIME, END_TIME)
+        page, cursor = get_order_page(orders, None, 2)
+        self.assertEqual([order.id for order in page], [35, 38])
+        self.assertEqual(decode_cursor(cursor), (page[-1].order_time, 38))
+        with self.assertNumQueries(1):
+            page, cursor = get_order_page(orders, cursor, 2)
+        self.assertEqual([order.id for order in page], [36])
+        self.assertIsNone(cursor)
+        # Page that exactly fills the range
+        page, cursor = get_order_page(orders, None, 3)
+        self.assertEqual(len(page), 3)
+        self.assertIsNone(cursor)
+
+    def test_decode_cursor(self):
+        order = Order.objects.get(id=35)
+        self.assertEqual(decode_cursor(encode_cursor(order)), (order.order_time, 35))
+        for cursor in ("", "35", "2020-11-14_35", "2020-11-14T05:21:47_35",
+                       "2020-11-14T05:21:47+00:00_id"):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    @override_settings(ORDER_HISTORY_PAGE_SIZE=2)
+    def test_orders_pages(self):
+        resp = self.client.get(reverse('restaurant_orders'), data=RANGE)
+        self.assertEqual([order.id for order in resp.context["orders"]], [35, 36])
+        self.assertTrue(resp.context["is_first_page"])
+        self.assertContains(resp, "Next page")
+        resp = self.client.get(reverse('restaurant_orders'),
+                               data=dict(RANGE, after=resp.context["next_cursor"]))
+        self.assertEqual([order.id for order in resp.context["orders"]], [38])
+        self.assertFalse(resp.context["is_first_page"])
+        self.assertNotContains(resp, "Next page")
+        # Invalid cursor shows first page
+        resp = self.client.get(reverse('restaurant_orders'), data=dict(RANGE, after="invalid"))
+        self.assertEqual([order.id for order in resp.context["orders"]], [35, 36])
+
+    @override_settings(ORDER_HISTORY_PAGE_SIZE=1, ORDER_HISTORY_CHUNK_SIZE=2)
+    def test_orders_streamed(self):
+        resp = self.client.get(reverse('restaurant_orders'), data=dict(RANGE, all="1"))
+        self.assertTrue(resp.streaming)
+        content = b"".join(resp.streaming_content).decode()
+        for order_id in (35, 36, 38):
+            self.assertIn(reverse('restaurant_view_order', args=(order_id,)), content)
+        self.assertNotIn("Streamed order rows", content)
+        self.assertNotIn("Next page", content)
+        self.assertTrue(content.rstrip().endswith("</html>"))
@@ -0,0 +1,196 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+from swickapp.models import Order, OrderItem, PaymentJob, User
+from swickapp.payment_pipeline import (ImmediateBackend, claim_payment_jobs,
+                                       process_payment_jobs, run_payment_job)
+from swickapp.sync import get_sync_changes
+
+from .fake_stripe import DECLINED, REQUIRES_ACTION, SUCCEEDS, FakeStripe
+
+
+@override_settings(PAYMENT_PIPELINE_ASYNC=True)
+class PaymentPipelineTest(APITestCase):
+    fixtures = ['testdata.json']
+
+    def setUp(self):
+        user = User.objects.get(email="seanlu99@gmail.com")
+        self.client.force_authenticate(user)
+
+    def place_order(self, payment_method_id):
+        resp = self.client.post(reverse('customer_place_order'), data={
+            "order_items": '[{"meal_id": 18, "quantity": 2, "customizations":[]}]',
+            "payment_method_id": payment_method_id,
+            "restaurant_id": 26,
+            "table": 1,
+            "tip": "nil"
+        })
+        self.assertEqual(resp.status_code, 200)
+        return json.loads(resp.content)
+
+    def get_payment_status(self, order_id):
+        resp = self.client.get(
+            reverse('customer_get_payment_status', args=(order_id,)))
+        return json.loads(resp.content)
+
+    def test_payment_succeeds(self):
+        content = self.place_order(SUCCEEDS)
+        self.assertEqual(content["status"], "success")
+        self.assertEqual(content["intent_status"], "processing")
+        order = Order.objects.get(id=content["order_id"])
+        self.assertEqual(order.status, Order.PROCESSING)
+        job = PaymentJob.objects.get(order_id=order.id)
+        self.assertEqual(job.amount, 1325)
+        # Payment has not run yet
+        content = self.get_payment_status(order.id)
+        self.assertEqual(content["status"], "success")
+        self.assertEqual(content["payment_status"], PaymentJob.PENDING)
+        # Worker charges card
+        with FakeStripe():
+            self.assertEqual(process_payment_jobs(), 1)
+        order = Order.objects.get(id=order.id)
+        self.assertEqual(order.status, Order.ACTIVE)
+        self.assertEqual(order.stripe_payment_id, "pi_fake_1")
+        # Stripe fee is filled in by reconcile_stripe_fees
+        self.assertIsNone(order.stripe_fee)
+        content = self.get_payment_status(order.id)
+        self.assertEqual(content["status"], "success")
+        self.assertEqual(content["payment_status"], PaymentJob.COMPLETE)
+        self.assertEqual(content["intent_status"], "succeeded")
+        # Nothing left to run
+        self.assertEqual(process_payment_jobs(), 0)
+
+    def test_payment_requires_action(self):
+        order_id = self.place_order(REQUIRES_ACTION)["order_id"]
+        with FakeStripe():
+            process_payment_jobs()
+        order = Order.objects.get(id=order_id)
+        self.assertEqual(order.status, Order.PROCESSING)
+        self.assertEqual(order.stripe_payment_id, "pi_fake_1")
+        content = self.get_payment_status(order_id)
+        self.assertEqual(content["intent_status"], "requires_action")
+        self.assertEqual(content["client_secret"], "pi_fake_1_secret")
+
+    def test_card_declined(self):
+        order_id = self.place_order(DECLINED)["order_id"]
+        with FakeStripe():
+            process_payment_jobs()
+        self.assertFalse(Order.objects.filter(id=order_id).exists())
+        # Result is still available after order is deleted
+        content = self.get_payment_status(order_id)
+        self.assertEqual(content["payment_status"], PaymentJob.COMPLETE)
+        self.assertEqual(content["intent_status"], "card_error")
+        self.assertEqual(content["error"], "Your card was declined.")
+        # Error: order does not belong to customer
+        resp = self.client.get(
+            reverse('customer_get_payment_status', args=(order_id + 1,)))
+        self.assertEqual(json.loads(resp.content)["status"], "order_does_not_exist")
+
+    def test_stripe_api_error_is_retried(self):
+        order_id = self.place_order(SUCCEEDS)["order_id"]
+        with FakeStripe() as fake_stripe:
+            fake_stripe.fail_next(1)
+            process_payment_jobs()
+            job = PaymentJob.objects.get(order_id=order_id)
+            self.assertEqual(job.status, PaymentJob.PENDING)
+            self.assertEqual(job.attempts, 1)
+            # Job backs off before it is claimed again
+            self.assertEqual(process_payment_jobs(), 0)
+            PaymentJob.objects.filter(id=job.id).update(
+                available_time=timezone.now())
+            self.assertEqual(process_payment_jobs(), 1)
+            self.assertEqual(len(fake_stripe.payment_intents), 1)
+        self.assertEqual(Order.objects.get(id=order_id).status, Order.ACTIVE)
+
+    @override_settings(PAYMENT_JOB_MAX_ATTEMPTS=1)
+    def test_exhausted_job_fails_payment(self):
+        order_id = self.place_order(SUCCEEDS)["order_id"]
+        with FakeStripe() as fake_stripe:
+            fake_stripe.fail_next(1)
+            process_payment_jobs()
+        # Order is deleted like a declined one
+        self.assertFalse(Order.objects.filter(id=order_id).exists())
+        content = self.get_payment_status(order_id)
+        self.assertEqual(content["payment_status"], PaymentJob.COMPLETE)
+        self.assertEqual(content["status"], "payment_failed")
+
+    def test_unpaid_items_are_not_synced(self):
+        order_id = self.place_order(SUCCEEDS)["order_id"]
+        cursor = get_sync_changes(26, None)["cursor"]
+        server = APIClient()
+        server.force_authenticate(User.objects.get(email="seanlu99@gmail.com"))
+
+        def cooking_ids():
+            resp = server.get(reverse('server_get_order_items_to_cook'))
+            return [item["id"] for item in json.loads(resp.content)["order_items"]]
+        item_ids = list(OrderItem.objects.filter(order_id=order_id).order_by("id").values_list(
+            "id", flat=True))
+        self.assertFalse(set(item_ids) & set(cooking_ids()))
+        self.assertEqual(get_sync_changes(26, cursor)["order_items"], [])
+        self.assertFalse(set(item_ids) & {item["id"] for item in
+                                          get_sync_changes(26, None)["order_items"]})
+        with FakeStripe():
+            process_payment_jobs()
+        # Paid order's items reach servers
+        self.assertTrue(set(item_ids) <= set(cooking_ids()))
+        self.assertEqual([item["id"] for item in get_sync_changes(26, cursor)["order_items"]],
+                         item_ids)
+
+    def test_claim_payment_jobs(self):
+        order_id = self.place_order(SUCCEEDS)["order_id"]
+        job = claim_payment_jobs()[0]
+        self.assertEqual(job.status, PaymentJob.RUNNING)
+        # Running job is not claimed twice
+        self.assertEqual(claim_payment_jobs(), [])
+        # Job of a crashed worker is claimed again
+        PaymentJob.objects.filter(id=job.id).update(
+            claimed_time=timezone.now() - timedelta(minutes=10))
+        job = claim_payment_jobs()[0]
+        self.assertEqual(job.order_id, order_id)
+        self.assertEqual(job.attempts, 2)
+
+    def test_reclaimed_job_keeps_result(self):
+        order_id = self.place_order(SUCCEEDS)["order_id"]
+        job = claim_payment_jobs()[0]
+        with FakeStripe():
+            run_payment_job(job)
+        # Worker finalized order but crashed before completing job
+        PaymentJob.objects.filter(id=job.id).update(
+            status=PaymentJob.RUNNING, result=None,
+            claimed_time=timezone.now() - timedelta(minutes=10))
+        run_payment_job(claim_payment_jobs()[0])
+        content = self.get_payment_status(order_id)
+        self.assertEqual(content["status"], "success")
+        self.assertEqual(content["intent_status"], "succeeded")
+        self.assertEqual(content["payment_intent"], "pi_fake_1")
+        # Completed result is kept
+        PaymentJob.objects.filter(id=job.id).update(result={"status": "success", "kept": True})
+        run_payment_job(job)
+        self.assertTrue(self.get_payment_status(order_id)["kept"])
+
+    def test_job_created_with_order(self):
+        order_count = Order.objects.count()
+        with patch("swickapp.apis_customer.enqueue_order_payment", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.place_order(SUCCEEDS)
+        # Order is rolled back with its job
+        self.assertEqual(Order.objects.count(), order_count)
+
+    def test_immediate_backend(self):
+        order_id = self.place_order(SUCCEEDS)["order_id"]
+        with FakeStripe():
+            ImmediateBackend().enqueue(PaymentJob.objects.get(order_id=order_id))
+        self.assertEqual(Order.objects.get(id=order_id).status, Order.ACTIVE)
+
+    def test_run_payment_worker(self):
+        order_id = self.place_order(SUCCEEDS)["order_id"]
+        with FakeStripe():
+            call_command("run_payment_worker", "--once", stdout=StringIO())
+        self.assertEqual(Order.objects.get(id=order_id).status, Order.ACTIVE)
@@ -0,0 +1,58 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from swickapp.models import Order, OrderItemCustomization
+from swickapp.pricing import PricingError, create_order_items, price_order
+
+
+class PricingTest(TestCase):
+    fixtures = ['testdata.json']
+
+    def test_price_order(self):
+        order_items = [
+            {"meal_id": 17, "quantity": 2, "customizations": [
+                {"customization_id": 7, "options": [2]},
+                {"customization_id": 8, "options": [0, 1]}
+            ]},
+            {"meal_id": 19, "quantity": 1, "customizations": []}
+        ]
+        # One query for meals and one for customizations
+        with self.assertNumQueries(2):
+            priced_order = price_order(26, order_items)
+        self.assertEqual(len(priced_order.items), 2)
+        pizza, pizza_custs = priced_order.items[0]
+        self.assertEqual(pizza.meal_name, "Pizza")
+        self.assertEqual(pizza.total, Decimal("30.00"))
+        self.assertEqual(pizza.tax_category_name, "Default")
+        self.assertEqual(priced_order.items[1][0].tax_rate, Decimal("8.000"))
+        self.assertEqual(pizza_custs[0].options, ['16"'])
+        self.assertEqual(pizza_custs[1].price_additions,
+                         [Decimal("0.50"), Decimal("0.50")])
+        self.assertEqual(priced_order.subtotal, Decimal("37.50"))
+        # 6% on pizza and 8% on wine
+        self.assertEqual(priced_order.rounded_tax, Decimal("2.40"))
+        # Errors
+        with self.assertRaises(PricingError) as e:
+            price_order(26, [{"meal_id": 16, "quantity": 1, "customizations": []}])
+        self.assertEqual(e.exception.content, {"status": "meal_does_not_exist"})
+        with self.assertRaises(PricingError) as e:
+            price_order(26, [{"meal_id": 21, "quantity": 1, "customizations": []}])
+        self.assertEqual(e.exception.content,
+                         {"meal_name": "Sandwich", "status": "meal_disabled"})
+
+    def test_create_order_items(self):
+        order = Order.objects.create(restaurant_id=26, table=3)
+        priced_order = price_order(26, [
+            {"meal_id": 17, "quantity": 1, "customizations": [
+                {"customization_id": 7, "options": [0]}]},
+            {"meal_id": 18, "quantity": 1, "customizations": []}
+        ])
+        # Order items and customizations
+        with self.assertNumQueries(2):
+            order_items = create_order_items(order, priced_order)
+        self.assertEqual(order.order_item.count(), 2)
+        cust = OrderItemCustomization.objects.get(order_item=order_items[0])
+        self.assertEqual(cust.customization_name, "Size")
+        # Items are synced once order is paid
+        self.assertEqual([item.change_seq for item in order_items], [0, 0])
+        self.assertEqual(order.order_item.get(meal_name="Pizza").tax_rate, Decimal("6.000"))
@@ -1,23 +1,34 @@
 from unittest.mock import Mock, call, patch
 
 import pusher
-from django.test import TestCase
-from swickapp.models import Order, OrderItem, Request, Server
-from swickapp.pusher_events import (send_event_item_status_updated,
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.db import transaction
+from rest_framework.test import APITransactionTestCase
+from swickapp.event_dispatcher import EventDispatcher, get_event_dispatcher
+from swickapp.models import Order, OrderItem, Request, Server, User
+from swickapp.pusher_events import (batch_pusher_events,
+                                    get_pusher_client,
+                                    send_event_item_status_updated,
+                                    send_event_items_status_updated,
                                     send_event_order_placed,
                                     send_event_order_status_updated,
                                     send_event_request_deleted,
                                     send_event_request_made,
                                     send_event_restaurant_added,
                                     send_event_tip_added,
+                                    send_pusher_batch,
                                     get_customer_channel,
                                     get_restaurant_channel,
-                                    get_server_channel)
+                                    get_server_channel,
+                                    trigger_pusher_event)
 from swickapp.serializers import (OrderItemSerializer,
                                   OrderItemToCookSerializer,
                                   OrderItemToSendSerializer, OrderSerializer,
                                   RequestSerializer)
 
+from .fake_pusher import FakePusherServer
+
 
 @patch('swickapp.pusher_events.trigger_pusher_event')
 class PusherEventsTest(TestCase):
@@ -83,6 +94,23 @@ class PusherEventsTest(TestCase):
                 'order_id': 35, 'status': 'COMPLETE'}
         )
 
+    def test_send_event_items_status_updated(self, pusher_mock):
+        order = Order.objects.get(pk=35)
+        items = list(OrderItem.objects.filter(order=order).order_by("id"))
+        send_event_items_status_updated(order, items)
+        pusher_mock.assert_called_once_with(
+            ['private-customer-11', 'private-restaurant-26'],
+            'items-status-updated',
+            {'order_items': [
+                {'order_item': OrderItemToCookSerializer(items[0]).data,
+                 'id': 49, 'order_id': 35, 'status': 'COOKING'},
+                {'order_item': OrderItemToSendSerializer(items[1]).data,
+                 'id': 50, 'order_id': 35, 'status': 'SENDING'},
+                {'order_item': OrderItemSerializer(items[2]).data,
+                 'id': 51, 'order_id': 35, 'status': 'COMPLETE'},
+            ]}
+        )
+
     def test_send_event_tip_added(self, pusher_mock):
         order = Order.objects.get(pk=35)
         send_event_tip_added(order)
@@ -133,3 +161,99 @@ class PusherEventsTest(TestCase):
         self.assertEqual(customer_channel, "private-customer-22")
         self.assertEqual(restaurant_channel, "private-restaurant-221")
         self.assertEqual(server_channel, "private-server-9182")
+
+
+# Transactions are committed so events are sent
+class PusherClientTest(APITransactionTestCase):
+    fixtures = ['testdata.json']
+
+    def test_client_is_reused(self):
+        with FakePusherServer() as fake_pusher:
+            client = get_pusher_client()
+            trigger_pusher_event("private-customer-11", "order-placed", {"order": 1})
+            get_event_dispatcher().join(timeout=5)
+            trigger_pusher_event(["private-customer-11", "private-restaurant-26"],
+                                 "order-placed", {"order": 2})
+            self.assertIs(get_pusher_client(), client)
+        self.assertEqual(len(fake_pusher.requests), 2)
+        # Both events are sent over the same connection
+        self.assertEqual(fake_pusher.requests[0][2], fake_pusher.requests[1][2])
+        self.assertEqual(fake_pusher.events(), [
+            ("private-customer-11", "order-placed", {"order": 1}),
+            ("private-customer-11", "order-placed", {"order": 2}),
+            ("private-restaurant-26", "order-placed", {"order": 2}),
+        ])
+
+    @override_settings(PUSHER_BATCH_SIZE=2)
+    def test_batch_pusher_events(self):
+        with FakePusherServer() as fake_pusher:
+            with batch_pusher_events():
+                trigger_pusher_event(["private-customer-11", "private-restaurant-26"],
+                                     "request-made", {"request": 1})
+                with batch_pusher_events():
+                    trigger_pusher_event("private-restaurant-26",
+                                         "request-deleted", {"request_id": 1})
+                # Nothing is sent until outermost block exits
+                self.assertEqual(fake_pusher.requests, [])
+        # Three events are sent in two batches
+        self.assertEqual(len(fake_pusher.requests), 2)
+        self.assertEqual(fake_pusher.events(), [
+            ("private-customer-11", "request-made", {"request": 1}),
+            ("private-restaurant-26", "request-made", {"request": 1}),
+            ("private-restaurant-26", "request-deleted", {"request_id": 1}),
+        ])
+
+    @override_settings(PUSHER_BATCH_SIZE=2, EVENT_DISPATCHER_RETRY_DELAY=0)
+    @patch('swickapp.pusher_events.get_pusher_client')
+    def test_failed_batch_resends_remaining_chunks(self, client_mock):
+        trigger_batch = client_mock.return_value.trigger_batch
+        trigger_batch.side_effect = [None, ConnectionError("Pusher is down"), None, None]
+        events = [{"channel": "private-restaurant-26", "name": "request-made",
+                   "data": {"request": i}} for i in range(5)]
+        dispatcher = EventDispatcher(workers=1)
+        with self.assertLogs("swickapp.event_dispatcher", "WARNING"):
+            dispatcher.submit(send_pusher_batch, list(events))
+            dispatcher.join(timeout=5)
+        # Delivered first chunk is not sent again
+        self.assertEqual(trigger_batch.call_args_list, [
+            call(events[0:2]), call(events[2:4]), call(events[2:4]), call(events[4:5])
+        ])
+
+    def test_events_are_sent_after_commit(self):
+        with FakePusherServer() as fake_pusher:
+            with transaction.atomic():
+                trigger_pusher_event("private-restaurant-26", "request-deleted",
+                                     {"request_id": 1})
+                # Nothing is sent before commit
+                get_event_dispatcher().join(timeout=5)
+                self.assertEqual(fake_pusher.requests, [])
+            try:
+                with transaction.atomic():
+                    trigger_pusher_event("private-restaurant-26", "request-deleted",
+                                         {"request_id": 2})
+                    raise ValueError
+            except ValueError:
+                pass
+        # Event of rolled back transaction is dropped
+        self.assertEqual(fake_pusher.events(), [
+            ("private-restaurant-26", "request-deleted", {"request_id": 1})
+        ])
+
+    def test_events_of_request_are_batched(self):
+        self.client.force_authenticate(User.objects.get(email="seanlu99@gmail.com"))
+        with FakePusherServer() as fake_pusher:
+            # Item of complete order goes back to cooking
+            resp = self.client.post(reverse('server_update_order_item_status'), data={
+                "order_item_id": 52,
+                "status": OrderItem.COOKING
+            })
+            self.assertEqual(resp.status_code, 200)
+        # Item and order events go out in one call
+        self.assertEqual(len(fake_pusher.requests), 1)
+        events = [(channel, name) for channel, name, _ in fake_pusher.events()]
+        self.assertEqual(events, [
+            ("private-customer-11", "item-status-updated"),
+            ("private-customer-11", "order-status-updated"),
+            ("private-restaurant-26", "item-status-updated"),
+            ("private-restaurant-26", "order-status-updated"),
+        ])
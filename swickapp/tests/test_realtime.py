@@ -0,0 +1,194 @@
+import asyncio
+import json
+
+import pusher
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from swickapp.realtime import (NOTIFY_MAX_BYTES, WebSocketBackend,
+                               get_notify_payloads, sign_subscription)
+from swickapp.realtime_server import ChannelHub, Socket, websocket_application
+
+
+class WebSocketTestClient:
+    """
+    Drives websocket_application the way an ASGI server would
+    """
+
+    def __init__(self, path="/app/key"):
+        self.path = path
+        self.inbound = asyncio.Queue()
+        self.outbound = asyncio.Queue()
+
+    async def connect(self):
+        self.task = asyncio.ensure_future(websocket_application(
+            {"type": "websocket", "path": self.path}, self.inbound.get, self.outbound.put))
+        await self.inbound.put({"type": "websocket.connect"})
+        return await self.receive_raw()
+
+    async def receive_raw(self):
+        return await asyncio.wait_for(self.outbound.get(), 5)
+
+    async def receive(self):
+        message = json.loads((await self.receive_raw())["text"])
+        message["data"] = json.loads(message["data"])
+        return message
+
+    async def send(self, event, data):
+        await self.inbound.put({"type": "websocket.receive",
+                                "text": json.dumps({"event": event, "data": data})})
+
+    async def disconnect(self):
+        await self.inbound.put({"type": "websocket.disconnect"})
+        await asyncio.wait_for(self.task, 5)
+
+
+REALTIME_SETTINGS = {
+    "PUSHER_KEY": "key",
+    "PUSHER_SECRET": "secret",
+    "REALTIME_BACKEND": "swickapp.realtime.WebSocketBackend",
+}
+
+
+@override_settings(REALTIME_FANOUT="local", **REALTIME_SETTINGS)
+class WebSocketServerTest(SimpleTestCase):
+
+    def test_signature_matches_pusher(self):
+        client = pusher.Pusher(app_id="1", key="key", secret="secret")
+        self.assertEqual(WebSocketBackend().authenticate("private-customer-11", "123.456"),
+                         client.authenticate(channel="private-customer-11", socket_id="123.456"))
+        with self.assertRaises(ValueError):
+            sign_subscription("private-customer-11", "123")
+        with self.assertRaises(ValueError):
+            sign_subscription("presence-customer-11", "123.456")
+
+    def test_subscribe_and_receive(self):
+        async def run():
+            client = WebSocketTestClient()
+            await client.connect()
+            established = await client.receive()
+            self.assertEqual(established["event"], "pusher:connection_established")
+            socket_id = established["data"]["socket_id"]
+
+            # Subscription signed for another socket is refused
+            await client.send("pusher:subscribe", {
+                "channel": "private-restaurant-26",
+                "auth": sign_subscription("private-restaurant-26", "1.1")})
+            message = await client.receive()
+            self.assertEqual(message["event"], "pusher:error")
+            self.assertEqual(message["data"]["code"], 4009)
+
+            await client.send("pusher:subscribe", {
+                "channel": "private-restaurant-26",
+                "auth": sign_subscription("private-restaurant-26", socket_id)})
+            message = await client.receive()
+            self.assertEqual(message["event"], "pusher_internal:subscription_succeeded")
+            self.assertEqual(message["channel"], "private-restaurant-26")
+
+            WebSocketBackend().send_batch([
+                {"channel": "private-restaurant-29", "name": "request-made", "data": {"id": 1}},
+                {"channel": "private-restaurant-26", "name": "request-made", "data": {"id": 2}},
+            ])
+            message = await client.receive()
+            self.assertEqual(message, {"event": "request-made",
+                                       "channel": "private-restaurant-26",
+                                       "data": {"id": 2}})
+
+            await client.send("pusher:ping", {})
+            self.assertEqual((await client.receive())["event"], "pusher:pong")
+
+            await client.send("pusher:unsubscribe", {"channel": "private-restaurant-26"})
+            WebSocketBackend().send_batch([
+                {"channel": "private-restaurant-26", "name": "request-made", "data": {"id": 3}}])
+            await client.send("pusher:ping", {})
+            self.assertEqual((await client.receive())["event"], "pusher:pong")
+            await client.disconnect()
+
+        asyncio.run(run())
+
+    def test_invalid_message(self):
+        async def run():
+            client = WebSocketTestClient()
+            await client.connect()
+            await client.receive()
+            # Data that is not an object
+            for data in (["private-customer-11"], "5"):
+                await client.send("pusher:subscribe", data)
+                message = await client.receive()
+                self.assertEqual(message["event"], "pusher:error")
+                self.assertEqual(message["data"]["code"], 4200)
+            await client.disconnect()
+
+        asyncio.run(run())
+
+    def test_unknown_app_is_refused(self):
+        async def run():
+            client = WebSocketTestClient("/app/other")
+            message = await client.connect()
+            self.assertEqual(message, {"type": "websocket.close", "code": 4001})
+
+        asyncio.run(run())
+
+    @override_settings(REALTIME_SOCKET_MAX_QUEUE=2)
+    def test_slow_socket_is_closed(self):
+        async def run():
+            socket = Socket()
+            for i in range(3):
+                socket.deliver(str(i))
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+            await socket.write(send)
+            self.assertEqual(sent, [{"type": "websocket.close", "code": 4100}])
+
+        asyncio.run(run())
+
+    def test_notify_payloads(self):
+        events = [{"channel": "private-restaurant-26", "name": "request-made",
+                   "data": {"text": "x" * 1000}} for _ in range(20)]
+        events.append({"channel": "private-restaurant-26", "name": "order-placed",
+                       "data": {"text": "x" * NOTIFY_MAX_BYTES}})
+        with self.assertLogs("swickapp.realtime", "ERROR"):
+            payloads = get_notify_payloads(events)
+        self.assertEqual(len(payloads), 3)
+        self.assertTrue(all(len(payload.encode()) <= NOTIFY_MAX_BYTES for payload in payloads))
+        self.assertEqual(sum(len(json.loads(payload)) for payload in payloads), 20)
+
+
+@override_settings(REALTIME_FANOUT="postgres", **REALTIME_SETTINGS)
+class PostgresFanoutTest(TransactionTestCase):
+
+    def test_events_reach_listening_hub(self):
+        received = []
+
+        class FakeSocket:
+            def deliver(self, message):
+                received.append(json.loads(message))
+
+        def send_batch(events):
+            try:
+                WebSocketBackend().send_batch(events)
+            finally:
+                connection.close()
+
+        async def run():
+            loop = asyncio.get_event_loop()
+            hub = ChannelHub(loop)
+            hub.subscribe("private-customer-11", FakeSocket())
+            hub.start_listener()
+            try:
+                self.assertTrue(await loop.run_in_executor(None, hub.listening.wait, 5))
+                await loop.run_in_executor(None, send_batch, [
+                    {"channel": "private-customer-11", "name": "order-status-updated",
+                     "data": {"order_id": 35, "new_status": "Complete"}}])
+                for _ in range(50):
+                    if received:
+                        break
+                    await asyncio.sleep(0.1)
+            finally:
+                hub.stop()
+            self.assertEqual(received, [{"event": "order-status-updated",
+                                         "channel": "private-customer-11",
+                                         "data": json.dumps({"order_id": 35, "new_status": "Complete"})}])
+
+        asyncio.run(run())
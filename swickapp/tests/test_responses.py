@@ -0,0 +1,63 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from swickapp.responses import (FastJsonResponse, OrjsonEncoder,
+                                StdlibJsonEncoder, encode_json,
+                                load_json_encoder)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DATA = {
+    "total": Decimal("39.48"),
+    "order_time": datetime(2020, 9, 30, 18, 5, 1, 123456, tzinfo=timezone.utc),
+    "items": [{"id": 49, "name": "Pizza"}],
+    "status": "success"
+}
+
+
+class ResponsesTest(SimpleTestCase):
+
+    def test_stdlib_encoder(self):
+        content = json.loads(StdlibJsonEncoder().encode(DATA))
+        # Same formats as serializers
+        self.assertEqual(content["total"], "39.48")
+        self.assertEqual(content["order_time"], "2020-09-30T18:05:01Z")
+        self.assertEqual(content["items"], [{"id": 49, "name": "Pizza"}])
+        with self.assertRaises(TypeError):
+            StdlibJsonEncoder().encode({"value": object()})
+
+    @skipUnless(orjson, "orjson is not installed")
+    def test_orjson_encoder(self):
+        self.assertEqual(OrjsonEncoder().encode(DATA), StdlibJsonEncoder().encode(DATA))
+
+    @skipUnless(orjson is None, "orjson is installed")
+    def test_orjson_encoder_missing(self):
+        with self.assertRaises(ImproperlyConfigured):
+            OrjsonEncoder()
+
+    def test_fast_json_response(self):
+        resp = FastJsonResponse(DATA)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/json")
+        self.assertEqual(json.loads(resp.content)["total"], "39.48")
+        resp = FastJsonResponse({"status": "success"}, status=201)
+        self.assertEqual(resp.status_code, 201)
+
+    @override_settings(JSON_ENCODER="swickapp.tests.test_responses.UpperEncoder")
+    def test_json_encoder_setting(self):
+        self.assertEqual(encode_json({"status": "success"}), b'{"STATUS":"SUCCESS"}')
+        # Backend is created once
+        self.assertIs(load_json_encoder("swickapp.tests.test_responses.UpperEncoder"),
+                      load_json_encoder("swickapp.tests.test_responses.UpperEncoder"))
+
+
+class UpperEncoder(StdlibJsonEncoder):
+    def encode(self, data):
+        return super().encode(data).upper()
@@ -0,0 +1,61 @@
+from unittest.mock import patch
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from swickapp.forms import RestaurantForm
+from swickapp.metrics import get_metrics, reset_metrics
+from swickapp.models import Restaurant
+from swickapp.restaurant_cache import (clear_restaurant_cache,
+                                       get_restaurant_metadata,
+                                       get_stripe_acct_id)
+
+
+class RestaurantCacheTest(TestCase):
+    fixtures = ['testdata.json']
+
+    def setUp(self):
+        clear_restaurant_cache()
+        reset_metrics()
+
+    def test_get_restaurant_metadata(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_stripe_acct_id(26), "acct_1HYx8GHEFsYoAI3t")
+            # Cached lookups do not query database
+            self.assertEqual(get_stripe_acct_id("26"), "acct_1HYx8GHEFsYoAI3t")
+            self.assertEqual(get_restaurant_metadata(26).id, 26)
+        counters = get_metrics()["counters"]
+        self.assertEqual(counters["restaurant_cache.misses"], 1)
+        self.assertEqual(counters["restaurant_cache.hits"], 2)
+        # Error: restaurant does not exist
+        with self.assertRaises(Restaurant.DoesNotExist):
+            get_stripe_acct_id(1)
+
+    @override_settings(RESTAURANT_CACHE_TTL=60)
+    def test_ttl(self):
+        with patch("swickapp.restaurant_cache.time.monotonic", return_value=0):
+            get_stripe_acct_id(26)
+        with patch("swickapp.restaurant_cache.time.monotonic", return_value=30):
+            with self.assertNumQueries(0):
+                get_stripe_acct_id(26)
+        with patch("swickapp.restaurant_cache.time.monotonic", return_value=61):
+            with self.assertNumQueries(1):
+                get_stripe_acct_id(26)
+
+    def test_invalidated_by_restaurant_form(self):
+        restaurant = Restaurant.objects.get(id=26)
+        self.assertEqual(get_restaurant_metadata(26).name, restaurant.name)
+        Restaurant.objects.filter(id=26).update(name="New Name")
+        # Stale until restaurant is saved through form
+        self.assertEqual(get_restaurant_metadata(26).name, restaurant.name)
+        form = RestaurantForm({
+            'name': 'Sandwich Place',
+            'address': '1 S University Ave, Ann Arbor, MI 48104',
+            'timezone': 'US/Eastern',
+            'default_sales_tax': '6.250'
+        }, {'image': SimpleUploadedFile(
+            name='long-image.jpg',
+            content=open("./swickapp/tests/long-image.jpg", 'rb').read()
+        )}, instance=Restaurant.objects.get(id=26))
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(get_restaurant_metadata(26).name, "Sandwich Place")
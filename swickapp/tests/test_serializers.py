@@ -100,6 +100,27 @@ class SerializersTest(APITestCase):
         complete_items = data['complete_order_items']
         self.assertEqual(complete_items[0]['id'], 51)
 
+    def test_order_details_serializer_eager_loading(self):
+        def serialize():
+            order = OrderDetailsSerializer.setup_eager_loading(
+                Order.objects).get(id=35)
+            return OrderDetailsSerializer(order).data
+
+        # Order with customer, items and customizations
+        with self.assertNumQueries(3):
+            data = serialize()
+        self.assertEqual(data, OrderDetailsSerializer(Order.objects.get(id=35)).data)
+        # Query count does not grow with items and customizations
+        for status in (OrderItem.COOKING, OrderItem.SENDING, OrderItem.COMPLETE):
+            item = OrderItem.objects.create(order_id=35, restaurant_id=26, meal_name="Pizza",
+                                            meal_price=10, quantity=1, total=10, status=status)
+            OrderItemCustomization.objects.create(order_item=item, customization_name="Size",
+                                                  options=['12"'], price_additions=[0])
+        with self.assertNumQueries(3):
+            data = serialize()
+        self.assertEqual([len(data[key]) for key in ("cooking_order_items", "sending_order_items",
+                                                     "complete_order_items")], [2, 2, 2])
+
     def test_order_item_to_cook_serializer(self):
         item = OrderItem.objects.get(id=49)
         data = OrderItemToCookSerializer(item).data
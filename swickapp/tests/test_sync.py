@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from swickapp.models import (Order, Request, Restaurant, SyncCursor,
+                             SyncTombstone)
+from swickapp.sync import (delete_order, delete_requests, get_sync_changes,
+                           next_change_seq, prune_sync_tombstones)
+
+
+class SyncTest(TestCase):
+    fixtures = ['testdata.json']
+
+    def test_next_change_seq(self):
+        self.assertEqual(next_change_seq(26), 1)
+        self.assertEqual(next_change_seq(26, 3), 2)
+        self.assertEqual(next_change_seq(26), 5)
+        # Sequences are per restaurant
+        self.assertEqual(next_change_seq(29), 1)
+
+    def test_stale_restaurant_save(self):
+        # Restaurant loaded before changes, e.g. by the account form
+        restaurant = Restaurant.objects.get(id=26)
+        cursor = next_change_seq(26, 3) + 2
+        restaurant.name = "Renamed"
+        restaurant.save()
+        self.assertEqual(get_sync_changes(26, None)["cursor"], cursor)
+        self.assertEqual(next_change_seq(26), cursor + 1)
+
+    def test_delete_order(self):
+        cursor = next_change_seq(26)
+        order = Order.objects.get(id=35)
+        item_ids = list(order.order_item.order_by("id").values_list("id", flat=True))
+        delete_order(order)
+        changes = get_sync_changes(26, None)
+        self.assertNotIn(49, [item["id"] for item in changes["order_items"]])
+        # Servers with an older cursor drop deleted items
+        changes = get_sync_changes(26, cursor)
+        self.assertFalse(changes["reset"])
+        self.assertEqual(changes["order_items"], [])
+        self.assertEqual(sorted(changes["deleted_order_items"]), item_ids)
+        self.assertEqual(changes["cursor"], cursor + len(item_ids))
+
+    def test_prune_sync_tombstones(self):
+        next_change_seq(26)
+        delete_requests(26, Request.objects.filter(id=18))
+        delete_requests(26, Request.objects.filter(id=20))
+        SyncTombstone.objects.filter(object_id=18).update(
+            deleted_time=timezone.now() - timedelta(days=30))
+        self.assertEqual(prune_sync_tombstones(), 1)
+        self.assertEqual(SyncCursor.objects.get(restaurant_id=26).pruned_seq, 2)
+        # Cursor from before pruned tombstone gets full queues
+        self.assertTrue(get_sync_changes(26, 1)["reset"])
+        changes = get_sync_changes(26, 2)
+        self.assertFalse(changes["reset"])
+        self.assertEqual(changes["deleted_requests"], [20])
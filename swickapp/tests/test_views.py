@@ -7,6 +7,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.http import HttpResponseRedirect
 from django.test import TestCase
 from django.urls import reverse
+from swickapp.menu_snapshot import get_menu_version
 from swickapp.models import (Category, Customization, Meal, RequestOption,
                              Restaurant, Server, ServerRequest, TaxCategory,
                              User)
@@ -319,10 +320,12 @@ class ViewsTest(TestCase):
 
     def test_toggle_meal(self):
         # GET success: disable meal
+        menu_version = get_menu_version(26)
         resp = self.client.get(reverse('restaurant_toggle_meal', args=(17,)))
         self.assertRedirects(resp, reverse('restaurant_menu') + "#Entrees")
         meal = Meal.objects.get(id=17)
         self.assertFalse(meal.enabled)
+        self.assertGreater(get_menu_version(26), menu_version)
         # GET success: enable meal
         resp = self.client.get(reverse('restaurant_toggle_meal', args=(17,)))
         meal = Meal.objects.get(id=17)
@@ -338,7 +341,7 @@ class ViewsTest(TestCase):
         # GET success
         resp = self.client.get(reverse("restaurant_orders"))
         orders = resp.context["orders"]
-        self.assertFalse(orders.exists())
+        self.assertEqual(orders, [])
         # POST success
         resp = self.client.post(
             reverse('restaurant_orders'),
@@ -348,7 +351,9 @@ class ViewsTest(TestCase):
         orders = resp.context["orders"]
         self.assertEqual(orders[0].stripe_payment_id,
                          "pi_1HnHCqBnGfJIkyujV9C6UV1U")
-        self.assertEqual(orders.count(), 3)
+        self.assertEqual(len(orders), 3)
+        self.assertEqual(orders[0].item_count, 3)
+        self.assertIsNone(resp.context["next_cursor"])
 
     def test_view_order(self):
         # GET success
@@ -410,6 +415,10 @@ class ViewsTest(TestCase):
         self.assertEqual(total_tip, Decimal("11.81"))
         self.assertEqual(stripe_fees, Decimal("1.97"))
         self.assertEqual(revenue, Decimal("65.78"))
+        self.assertEqual(resp.context["pending_fee_count"], 1)
+        self.assertEqual([row["name"] for row in resp.context["tax_breakdown"]],
+                         ["Default", "Drinks"])
+        self.assertContains(resp, "Excludes fees of 1 order not yet reconciled")
         self.assertEqual(stripe_link, "https://dashboard.stripe.com")
 
     def test_add_tax_category(self):
@@ -39,7 +39,7 @@ class ViewsHelperTest(TestCase):
         orders = resp.context["orders"]
         self.assertEqual(resp.context["start_time_error"], "")
         self.assertEqual(resp.context["end_time_error"], "")
-        self.assertFalse(orders.exists())
+        self.assertEqual(orders, [])
         # Datetime range given
         resp = self.client.post(
             reverse('restaurant_orders'),
@@ -51,7 +51,7 @@ class ViewsHelperTest(TestCase):
         self.assertEqual(resp.context["end_time_error"], "")
         self.assertEqual(orders[0].stripe_payment_id,
                          "pi_1HnHCqBnGfJIkyujV9C6UV1U")
-        self.assertEqual(orders.count(), 3)
+        self.assertEqual(len(orders), 3)
         # Invalid datetime format given
         resp = self.client.post(
             reverse('restaurant_orders'),
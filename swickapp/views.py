@@ -2,11 +2,15 @@ from operator import itemgetter
 
 import stripe
 from bootstrap_modal_forms.generic import BSModalCreateView
+from django.conf import settings
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Prefetch
 from django.forms import formset_factory, modelformset_factory
-from django.http import Http404, JsonResponse
+from django.http import (Http404, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
@@ -15,13 +19,22 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import api_view
 
-from .forms import (CategoryForm, CustomizationForm, MealForm, RequestDemoForm,
-                    RequestForm, RestaurantForm, ServerRequestForm,
-                    TaxCategoryForm, TaxCategoryFormBase, UserForm,
-                    UserUpdateForm)
-from .models import (Category, Customization, Meal, Order, RequestOption,
-                     Restaurant, Server, ServerRequest, TaxCategory, User)
+from .authentication import invalidate_user_tokens
+from .channel_auth import invalidate_server_channels
+from .finance import get_finance_totals, get_tax_by_category
+from .forms import (CategoryForm, CustomizationForm, DateTimeRangeForm,
+                    MealForm, RequestDemoForm, RequestForm, RestaurantForm,
+                    ServerRequestForm, TaxCategoryForm, TaxCategoryFormBase,
+                    UserForm, UserUpdateForm)
+from .models import (Category, Customization, Meal, Order, OrderItem,
+                     Request, RequestOption, Restaurant, Server,
+                     ServerRequest, TaxCategory, User)
+from .menu_snapshot import bump_menu_version
+from .order_export import CONTENT_TYPES, export_orders
+from .order_history import get_order_history, get_order_page
 from .pusher_events import send_event_restaurant_added
+from .restaurant_cache import invalidate_restaurant_metadata
+from .sync import delete_requests
 from .views_helper import (create_default_request_options,
                            get_tax_categories_list,
                            initialize_datetime_range_orders)
@@ -117,6 +130,7 @@ def restaurant_sign_up(request):
                 raise Http404("Unable to create account. Please try again")
 
             new_restaurant.save()
+            invalidate_restaurant_metadata(new_restaurant.id)
 
             # Initialize default sales tax model for new restaurant
             default_tax_category = TaxCategory.objects.create(
@@ -198,6 +212,7 @@ def restaurant_add_category(request):
             category = category_form.save(commit=False)
             category.restaurant = request.user.restaurant
             category.save()
+            bump_menu_version(category.restaurant_id)
 
             # Redirect to category fragment identifier
             return redirect(reverse(restaurant_menu) + '#' + category.name)
@@ -221,6 +236,7 @@ def restaurant_edit_category(request, category_id):
 
         if category_form.is_valid():
             category_form.save()
+            bump_menu_version(category.restaurant_id)
             # Redirect to category fragment identifier
             return redirect(reverse(restaurant_menu) + '#' + category.name)
 
@@ -236,6 +252,7 @@ def restaurant_delete_category(request, category_id):
     if category.restaurant != request.user.restaurant:
         raise Http404()
     category.delete()
+    bump_menu_version(request.user.restaurant.id)
     return redirect(restaurant_menu)
 
 
@@ -267,6 +284,7 @@ def restaurant_add_meal(request, category_id):
                 new_customization = form.save(commit=False)
                 new_customization.meal = new_meal
                 new_customization.save()
+            bump_menu_version(category.restaurant_id)
             # Redirect to category fragment identifier
             return redirect(reverse(restaurant_menu) + '#' + category.name)
 
@@ -319,6 +337,7 @@ def restaurant_edit_meal(request, meal_id):
                 new_customization = form.save(commit=False)
                 new_customization.meal_id = meal_id
                 new_customization.save()
+            bump_menu_version(request.user.restaurant.id)
             # Redirect to category fragment identifier
             return redirect(reverse(restaurant_menu) + '#' + meal.category.name)
 
@@ -351,6 +370,7 @@ def restaurant_delete_meal(request, meal_id):
     if request.user.restaurant != meal.category.restaurant:
         raise Http404()
     meal.delete()
+    bump_menu_version(request.user.restaurant.id)
     # Redirect to category fragment identifier
     return redirect(reverse(restaurant_menu) + '#' + meal.category.name)
 
@@ -363,22 +383,99 @@ def restaurant_toggle_meal(request, meal_id):
         raise Http404()
     meal.enabled = not meal.enabled
     meal.save()
+    bump_menu_version(request.user.restaurant.id)
     # Redirect to category fragment identifier
     return redirect(reverse(restaurant_menu) + '#' + meal.category.name)
 
 
+# Stands for the rows of a streamed orders page in its rendered template
+ORDER_ROWS_MARKER = "<!--- Streamed order rows --->"
+
+
 @login_required(login_url='/main/')
 def restaurant_orders(request):
     data = initialize_datetime_range_orders(request)
-    return render(request, 'restaurant/orders.html', {"orders": data["orders_in_range"],
-                                                      "datetime_range_form": data["datetime_range_form"],
-                                                      "start_time_error": data["start_time_error"],
-                                                      "end_time_error": data["end_time_error"]})
+    context = {"datetime_range_form": data["datetime_range_form"],
+               "start_time_error": data["start_time_error"],
+               "end_time_error": data["end_time_error"]}
+    if data["start_time"] is None:
+        orders = Order.objects.none()
+    else:
+        orders = get_order_history(request.user.restaurant.id,
+                                   data["start_time"], data["end_time"])
+
+    # Whole range is streamed so memory does not grow with its size
+    if request.GET.get("all"):
+        return stream_orders_page(request, context, orders)
+
+    # Cursor is a query parameter, so each page has its own url
+    after = request.GET.get("after") or None
+    try:
+        page, next_cursor = get_order_page(orders, after, settings.ORDER_HISTORY_PAGE_SIZE)
+    except ValueError:
+        after = None
+        page, next_cursor = get_order_page(orders, None, settings.ORDER_HISTORY_PAGE_SIZE)
+    context.update({"orders": page, "next_cursor": next_cursor,
+                    "is_first_page": after is None})
+    return render(request, 'restaurant/orders.html', context)
+
+
+def stream_orders_page(request, context, orders):
+    """
+    Return streaming orders page with every order of orders
+    Rows are rendered in chunks of ORDER_HISTORY_CHUNK_SIZE orders read
+    with a server side cursor
+    """
+    page = render_to_string('restaurant/orders.html',
+                            dict(context, orders=[], streaming=True), request)
+    head, tail = page.split(ORDER_ROWS_MARKER)
+
+    def render_rows(chunk):
+        return render_to_string('restaurant/order_rows.html', {"orders": chunk})
+
+    def generate():
+        yield head
+        chunk = []
+        for order in orders.iterator(chunk_size=settings.ORDER_HISTORY_CHUNK_SIZE):
+            chunk.append(order)
+            if len(chunk) == settings.ORDER_HISTORY_CHUNK_SIZE:
+                yield render_rows(chunk)
+                chunk = []
+        if chunk:
+            yield render_rows(chunk)
+        yield tail
+
+    return StreamingHttpResponse(generate())
+
+
+@login_required(login_url='/main/')
+def restaurant_export_orders(request):
+    """
+    Stream restaurant's paid orders in range as a CSV or NDJSON download
+    query parameters: start_time, end_time (as in the orders page), format
+    """
+    datetime_range_form = DateTimeRangeForm(request.GET)
+    export_format = request.GET.get("format")
+    if not datetime_range_form.is_valid() or export_format not in CONTENT_TYPES:
+        return HttpResponseBadRequest()
+    response = StreamingHttpResponse(
+        export_orders(request.user.restaurant.id,
+                      datetime_range_form.cleaned_data["start_time"],
+                      datetime_range_form.cleaned_data["end_time"],
+                      export_format),
+        content_type=CONTENT_TYPES[export_format])
+    response["Content-Disposition"] = 'attachment; filename="orders.{format}"'.format(
+        format=export_format)
+    return response
 
 
 @login_required(login_url='/main/')
 def restaurant_view_order(request, order_id):
-    order = get_object_or_404(Order, id=order_id)
+    order = get_object_or_404(
+        Order.objects.select_related("customer__user").prefetch_related(
+            Prefetch("order_item", queryset=OrderItem.objects.order_by("id").prefetch_related(
+                "order_item_cust"))),
+        id=order_id)
     # Checks if requested order belongs to user's restaurant
     if request.user.restaurant != order.restaurant:
         raise Http404()
@@ -394,23 +491,15 @@ def restaurant_finances(request):
         restaurant=request.user.restaurant).exclude(name="Default").order_by("name")
     data = initialize_datetime_range_orders(request)
 
-    gross_revenue = 0
-    total_tax = 0
-    total_tip = 0
-    stripe_fees = 0
-
-    for order in data["orders_in_range"]:
-        try:
-            gross_revenue += order.total
-            total_tax += order.tax
-            total_tip += order.tip or 0
-            stripe_fees += order.stripe_fee
-        except TypeError:
-            # Critical Error: Catching TypeError means null field was accessed
-            # error would be raised by improper handling of dead orders
-            pass
-
-    revenue = gross_revenue - total_tax - total_tip - stripe_fees
+    if data["start_time"] is not None:
+        totals = get_finance_totals(request.user.restaurant.id,
+                                    data["start_time"], data["end_time"])
+        tax_breakdown = get_tax_by_category(request.user.restaurant.id,
+                                            data["start_time"], data["end_time"])
+    else:
+        totals = {"gross_revenue": 0, "total_tax": 0, "total_tip": 0,
+                  "stripe_fees": 0, "pending_fee_count": 0, "revenue": 0}
+        tax_breakdown = []
 
     # Create link for Stripe access
     stripe_url = "https://dashboard.stripe.com"
@@ -435,11 +524,13 @@ def restaurant_finances(request):
                                                         "datetime_range_form": data["datetime_range_form"],
                                                         "start_time_error": data["start_time_error"],
                                                         "end_time_error": data["end_time_error"],
-                                                        "gross_revenue": gross_revenue,
-                                                        "total_tax": total_tax,
-                                                        "total_tip": total_tip,
-                                                        "stripe_fees": stripe_fees,
-                                                        "revenue": revenue,
+                                                        "gross_revenue": totals["gross_revenue"],
+                                                        "total_tax": totals["total_tax"],
+                                                        "total_tip": totals["total_tip"],
+                                                        "stripe_fees": totals["stripe_fees"],
+                                                        "pending_fee_count": totals["pending_fee_count"],
+                                                        "revenue": totals["revenue"],
+                                                        "tax_breakdown": tax_breakdown,
                                                         "stripe_link": stripe_url})
 
 
@@ -480,6 +571,7 @@ def restaurant_edit_tax_category(request, id):
             if instance.name == "Default":
                 Restaurant.objects.filter(pk=request.user.restaurant.pk).update(
                     default_sales_tax=instance.tax)
+            bump_menu_version(request.user.restaurant.id)
             return redirect(restaurant_finances)
 
     return render(request, 'restaurant/edit_tax_category.html', {
@@ -500,6 +592,7 @@ def restaurant_delete_tax_category(request, id):
     coupled_meals.update(tax_category=TaxCategory.objects.get_or_create(
         restaurant=request.user.restaurant, name="Default")[0])
     tax_category_object.delete()
+    bump_menu_version(request.user.restaurant.id)
     return redirect(restaurant_finances)
 
 
@@ -551,6 +644,7 @@ def restaurant_add_request(request):
             request_object = request_form.save(commit=False)
             request_object.restaurant = request.user.restaurant
             request_object.save()
+            bump_menu_version(request_object.restaurant_id)
 
             return redirect(restaurant_requests)
 
@@ -574,6 +668,7 @@ def restaurant_edit_request(request, id):
 
         if request_form.is_valid():
             request_form.save()
+            bump_menu_version(request_object.restaurant_id)
             return redirect(restaurant_requests)
 
     return render(request, 'restaurant/edit_request.html', {
@@ -587,7 +682,12 @@ def restaurant_delete_request(request, id):
     request_object = get_object_or_404(RequestOption, id=id)
     if request_object.restaurant != request.user.restaurant:
         raise Http404()
-    request_object.delete()
+    # Requests of option are dropped from servers' queues
+    with transaction.atomic():
+        delete_requests(request_object.restaurant_id,
+                        Request.objects.filter(request_option=request_object))
+        request_object.delete()
+    bump_menu_version(request.user.restaurant.id)
     return redirect(restaurant_requests)
 
 
@@ -665,6 +765,8 @@ def restaurant_delete_server(request, id):
         raise Http404()
     server.restaurant = None
     server.save()
+    invalidate_user_tokens(server.user_id)
+    invalidate_server_channels(server.user_id)
     return redirect(restaurant_servers)
 
 
@@ -701,6 +803,7 @@ def restaurant_account(request):
         # INVARIANT: Default should only be destroyed (thus invalid) when restaurant is deleted:
         TaxCategory.objects.filter(restaurant=request.user.restaurant, name="Default").update(
             tax=request.user.restaurant.default_sales_tax)
+        bump_menu_version(request.user.restaurant.id)
 
     return render(request, 'restaurant/account.html', {
         "user_form": user_form,
@@ -718,6 +821,8 @@ def server_link_restaurant(request, token):
         server = Server.objects.get(user__email=server_request.email)
         server.restaurant = server_request.restaurant
         server.save()
+        invalidate_user_tokens(server.user_id)
+        invalidate_server_channels(server.user_id)
         server_request.delete()
         send_event_restaurant_added(server)
     except Server.DoesNotExist:
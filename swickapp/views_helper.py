@@ -16,6 +16,7 @@ def initialize_datetime_range_orders(request):
     """
     Initalizes datetime_range_form and orders queryset and
     returns map containing objects along with any error messages
+    start_time and end_time are None if the range is invalid
     """
     curr_day_start = localtime().replace(hour=0, minute=0, second=0, microsecond=0)
     curr_day_end = localtime().replace(
@@ -24,14 +25,20 @@ def initialize_datetime_range_orders(request):
                                                      'end_time': curr_day_end.strftime("%m/%d/%Y %I:%M%p")})
     start_time_error = ""
     end_time_error = ""
+    start_time = curr_day_start
+    end_time = curr_day_end
 
     orders_in_range = Order.objects.filter(
         restaurant=request.user.restaurant,
         order_time__range=(curr_day_start, curr_day_end)
     ).exclude(status=Order.PROCESSING).order_by("id")
-    if request.method == 'POST':
-        datetime_range_form = DateTimeRangeForm(request.POST)
+    # Range may also be given as query parameters, so pages can be linked
+    if request.method == 'POST' or "start_time" in request.GET:
+        datetime_range_form = DateTimeRangeForm(
+            request.POST if request.method == 'POST' else request.GET)
         if datetime_range_form.is_valid():
+            start_time = datetime_range_form.cleaned_data['start_time']
+            end_time = datetime_range_form.cleaned_data['end_time']
             orders_in_range = Order.objects.filter(
                 restaurant=request.user.restaurant,
                 order_time__range=(
@@ -45,9 +52,13 @@ def initialize_datetime_range_orders(request):
             if datetime_range_form.has_error("end_time", "invalid"):
                 end_time_error = datetime_range_form.errors["end_time"][0]
             orders_in_range = Order.objects.none()
+            start_time = None
+            end_time = None
 
     return {"datetime_range_form": datetime_range_form,
             "orders_in_range": orders_in_range,
+            "start_time": start_time,
+            "end_time": end_time,
             "start_time_error": start_time_error,
             "end_time_error": end_time_error}
 